@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,6 +27,8 @@ SECRET_KEY = 'django-insecure-v%08i6$a@ljgaj$uhxm1)*e#jb_k=!lzj5t655#__i_23lfps*
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = []
 
 
@@ -42,11 +46,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tracker.instrumentation.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'tracker.routers.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tracker.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,10 +62,18 @@ ROOT_URLCONF = 'sourcing_tracker.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to the instrumentation middleware
+        'BACKEND': 'tracker.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates stay in memory for the life of the process; runserver's
+            # autoreloader clears them when a template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -75,13 +90,101 @@ WSGI_APPLICATION = 'sourcing_tracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Applied to every new SQLite connection. WAL lets readers proceed while a write is
+# in progress, busy_timeout waits for locks instead of failing with "database is locked".
+# busy_timeout is the only lock wait setting: it overrides the driver's `timeout`.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 268435456,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Take the write lock when the transaction starts, avoiding read-to-write upgrade deadlocks
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# PostgreSQL production profile, enabled with TRACKER_DATABASE=postgres.
+# Set POSTGRES_REPLICA_HOST (or POSTGRES_REPLICA_NAME, e.g. a second local database
+# standing in for a replica) to send read-only traffic to a `replica` alias.
+if os.environ.get('TRACKER_DATABASE') == 'postgres':
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'sourcing_tracker'),
+        'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Persistent connections, verified before reuse after an idle period
+        'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if os.environ.get('POSTGRES_POOL_MAX_SIZE'):
+        # psycopg connection pool; Django requires CONN_MAX_AGE=0 when pooling
+        _postgres['CONN_MAX_AGE'] = 0
+        _postgres['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ['POSTGRES_POOL_MAX_SIZE']),
+            'timeout': 10,
+        }
+    DATABASES = {'default': _postgres}
+
+    if os.environ.get('POSTGRES_REPLICA_HOST') or os.environ.get('POSTGRES_REPLICA_NAME'):
+        DATABASES['replica'] = {
+            **_postgres,
+            'OPTIONS': {**_postgres['OPTIONS']},
+            'HOST': os.environ.get('POSTGRES_REPLICA_HOST', _postgres['HOST']),
+            'NAME': os.environ.get('POSTGRES_REPLICA_NAME', _postgres['NAME']),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# The test run always has a `replica` alias, mirroring `default`, so the routing
+# below is exercised without a real replica
+if TESTING and 'replica' not in DATABASES:
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['tracker.routers.PrimaryReplicaRouter']
+
+# Seconds after a write during which the same client keeps reading from the primary
+TRACKER_REPLICA_PIN_SECONDS = 5
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# `template_fragments` holds the {% cache %} blocks for partner cards and deal rows.
+# Keys include updated_at, so entries never need invalidating; stale ones expire after a day.
+# Memory of each worker process by default; set REDIS_URL to share one cache.
+if os.environ.get('REDIS_URL'):
+    _fragment_cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+else:
+    _fragment_cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'template_fragments': _fragment_cache,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -120,6 +223,20 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Outside DEBUG, collectstatic writes hashed names plus precompressed .gz/.br copies,
+# served by tracker.assets.serve_static with immutable cache headers
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'tracker.assets.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 # Media files (Uploads)
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -128,3 +245,61 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Tracker
+# NDJSON bulk ingest: rows committed per batch, and the bearer token callers must
+# send. Ingest answers 403 until a token is set.
+TRACKER_INGEST_BATCH_SIZE = 500
+TRACKER_INGEST_TOKEN = os.environ.get('TRACKER_INGEST_TOKEN')
+
+# Live dashboard updates. LocalEventBus serves a single worker process; use
+# tracker.events.DatabaseEventBus when running several workers.
+TRACKER_EVENT_BUS = 'tracker.events.LocalEventBus'
+TRACKER_EVENT_POLL_INTERVAL = 2
+
+# Per-request SQL/latency instrumentation, logged as JSON to tracker.instrumentation.
+# Set TRACKER_INSTRUMENTATION_SAMPLE_RATE=1 to log every request while developing.
+TRACKER_INSTRUMENTATION = {
+    'SAMPLE_RATE': float(os.environ.get('TRACKER_INSTRUMENTATION_SAMPLE_RATE', '0.05')),
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOW_REQUEST_MS': 1000,
+}
+
+# Staff can profile any request with ?_profile=1; results are written here
+TRACKER_PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Prometheus metrics at /metrics. With several worker processes, point
+# TRACKER_METRICS_DIR at a directory they share so the endpoint sums all of them.
+# Keep it local to the host: exited workers are recognised by pid.
+TRACKER_METRICS_DIR = os.environ.get('TRACKER_METRICS_DIR') or None
+TRACKER_METRICS_TOKEN = os.environ.get('TRACKER_METRICS_TOKEN') or None
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        # Only warnings (N+1 queries, slow requests) while the test suite runs
+        'tracker.instrumentation': {'handlers': ['console'], 'level': 'WARNING' if TESTING else 'INFO', 'propagate': False},
+        'tracker.exports': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Monthly partner statements from `manage.py generate_statements`, one directory per month
+TRACKER_STATEMENTS_DIR = BASE_DIR / 'statements'
+
+# Parquet snapshots for offline analysis from `manage.py snapshot_parquet`, one directory per table
+TRACKER_PARQUET_DIR = BASE_DIR / 'parquet'
+
+# Background exports run by `manage.py run_workers`: worker processes, how long an
+# identical request reuses a finished export, and when export files are deleted
+TRACKER_EXPORT_WORKERS = 2
+TRACKER_EXPORT_POLL_INTERVAL = 2
+TRACKER_EXPORT_CACHE_SECONDS = 600
+TRACKER_EXPORT_RETENTION_DAYS = 7
@@ -18,13 +18,16 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from tracker.assets import serve_static
+from tracker.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path(f"{settings.STATIC_URL.lstrip('/')}<path:path>", serve_static, name='static'),
     path('', include('tracker.urls')),
 ]
 
 # Serve media files during development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
 
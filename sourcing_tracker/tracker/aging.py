@@ -0,0 +1,159 @@
+"""
+Advance aging: how long the money making up each partner's balance has been held.
+
+Advances are matched first-in, first-out against refunds and deal cost deductions.
+Whatever is left of each advance is still part of the balance, and is bucketed by
+its age on the report date. The whole ledger is read once, sorted by partner and
+date (`statements.ledger_entries`), so the cost is linear in the number of entries.
+Deductions beyond the available advances are reported as overdrawn, and are
+settled by the partner's next advances.
+
+`manage.py snapshot_aging` stores the result nightly as an AgingSnapshot. The aging
+report reads that snapshot and only walks the ledger when asked for live figures.
+"""
+from collections import deque
+from datetime import date
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import Partner, AgingSnapshot
+from .statements import ledger_entries
+
+ZERO = Decimal('0.00')
+
+# (label, oldest age in days the bucket holds; None = no limit)
+BUCKETS = [('0-30', 30), ('31-60', 60), ('61-90', 90), ('90+', None)]
+BUCKET_LABELS = [label for label, _ in BUCKETS]
+
+
+def bucket_index(age_days):
+    for index, (_, limit) in enumerate(BUCKETS):
+        if limit is None or age_days <= limit:
+            return index
+
+
+class PartnerAging:
+    """One partner's unused advances split into age buckets."""
+
+    def __init__(self, partner_id, name, gst_number, buckets=None, overdrawn=ZERO, oldest=None):
+        self.partner_id = partner_id
+        self.name = name
+        self.gst_number = gst_number
+        self.buckets = buckets or [ZERO] * len(BUCKETS)
+        self.overdrawn = overdrawn
+        # Date of the oldest advance still (partly) unused
+        self.oldest = oldest
+
+    @property
+    def balance(self):
+        return sum(self.buckets, ZERO) - self.overdrawn
+
+    @property
+    def bucket_rows(self):
+        return list(zip(BUCKET_LABELS, self.buckets))
+
+    def to_dict(self):
+        return {
+            'partner_id': self.partner_id,
+            'name': self.name,
+            'gst_number': self.gst_number,
+            'buckets': [str(amount) for amount in self.buckets],
+            'overdrawn': str(self.overdrawn),
+            'oldest': self.oldest.isoformat() if self.oldest else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['partner_id'], data['name'], data['gst_number'],
+            buckets=[Decimal(amount) for amount in data['buckets']],
+            overdrawn=Decimal(data['overdrawn']),
+            oldest=date.fromisoformat(data['oldest']) if data['oldest'] else None,
+        )
+
+
+class AgingReport:
+    """Aging of every partner as of one date, with totals per bucket."""
+
+    def __init__(self, as_of, partners, generated_at=None):
+        self.as_of = as_of
+        self.partners = partners
+        self.generated_at = generated_at
+        self.totals = [sum(column, ZERO) for column in zip(*(p.buckets for p in partners))] or [ZERO] * len(BUCKETS)
+        self.overdrawn = sum((p.overdrawn for p in partners), ZERO)
+
+    @property
+    def balance(self):
+        return sum(self.totals, ZERO) - self.overdrawn
+
+    @property
+    def total_rows(self):
+        return list(zip(BUCKET_LABELS, self.totals))
+
+    def to_dict(self):
+        return {'buckets': BUCKET_LABELS, 'partners': [p.to_dict() for p in self.partners]}
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        partners = [PartnerAging.from_dict(row) for row in snapshot.data['partners']]
+        return cls(snapshot.as_of, partners, generated_at=snapshot.generated_at)
+
+
+def _aged(partner, lots, overdrawn, as_of):
+    buckets = [ZERO] * len(BUCKETS)
+    for day, remaining in lots:
+        buckets[bucket_index((as_of - day).days)] += remaining
+    return PartnerAging(
+        partner[0], partner[1], partner[2],
+        buckets=buckets, overdrawn=overdrawn, oldest=lots[0][0] if lots else None,
+    )
+
+
+def compute_aging(as_of=None):
+    """Walk the ledger through `as_of` (default today) once and age every partner's advances."""
+    as_of = as_of or timezone.localdate()
+    partners = {row[0]: row for row in Partner.objects.values_list('id', 'name', 'gst_number')}
+    results = {}
+    current_id, lots, overdrawn = None, deque(), ZERO
+
+    for partner_id, day, _, _, _, _, amount in ledger_entries(None, as_of):
+        if partner_id != current_id:
+            if current_id is not None:
+                results[current_id] = _aged(partners[current_id], lots, overdrawn, as_of)
+            current_id, lots, overdrawn = partner_id, deque(), ZERO
+        if amount >= 0:
+            # An advance first covers anything already overdrawn
+            settled = min(overdrawn, amount)
+            overdrawn -= settled
+            if amount > settled:
+                lots.append([day, amount - settled])
+            continue
+        needed = -amount
+        while needed and lots:
+            lot = lots[0]
+            used = min(lot[1], needed)
+            lot[1] -= used
+            needed -= used
+            if not lot[1]:
+                lots.popleft()
+        overdrawn += needed
+    if current_id is not None:
+        results[current_id] = _aged(partners[current_id], lots, overdrawn, as_of)
+
+    rows = [results.get(pk) or PartnerAging(*row) for pk, row in partners.items()]
+    rows.sort(key=lambda row: (row.name.lower(), row.partner_id))
+    return AgingReport(as_of, rows, generated_at=timezone.now())
+
+
+def save_snapshot(report):
+    """Store (or replace) the snapshot for the report's date."""
+    snapshot, _ = AgingSnapshot.objects.update_or_create(
+        as_of=report.as_of,
+        defaults={
+            'generated_at': report.generated_at,
+            'partner_count': len(report.partners),
+            'data': report.to_dict(),
+        },
+    )
+    return snapshot
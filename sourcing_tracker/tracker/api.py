@@ -0,0 +1,330 @@
+"""
+Read-only JSON API for the downstream accounting sync.
+
+Every list endpoint supports:
+- cursor pagination (`cursor`, `limit`), ordered by (updated_at, id)
+- sparse field selection (`fields=id,amount,date`)
+- the ledger's partner/date filters
+- incremental sync (`updated_since=<ISO datetime>`); a deal counts as updated when
+  one of its items is
+- conditional GET via ETag / Last-Modified
+
+Rows a fiscal-year close moves into the archive leave the lists without a deletion.
+api/archived/transactions/ and api/archived/deals/ list them as tombstones (id,
+fiscal year, archive time) with the same `updated_since` and cursor parameters; a
+deal's items go with it.
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from django.db.models import Count, Max, Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+
+from .filters import apply_ledger_filters
+from .models import Partner, Transaction, Deal, DealItem, ArchivedTransaction, ArchivedDeal, FiscalYearClose
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Public field name -> ORM lookup used in the values() projection
+PARTNER_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'gst_number': 'gst_number',
+    'contact_info': 'contact_info',
+    'current_balance': 'current_balance',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+TRANSACTION_FIELDS = {
+    'id': 'id',
+    'partner': 'partner_id',
+    'partner_name': 'partner__name',
+    'partner_gst_number': 'partner__gst_number',
+    'transaction_type': 'transaction_type',
+    'amount': 'amount',
+    'date': 'date',
+    'evidence_file': 'evidence_file',
+    'notes': 'notes',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+DEAL_FIELDS = {
+    'id': 'id',
+    'reference': 'reference',
+    'partner': 'partner_id',
+    'partner_name': 'partner__name',
+    'client_name': 'client_name',
+    'status': 'status',
+    'actual_cost': 'actual_cost',
+    'estimated_cost': 'estimated_cost',
+    'commission_percent': 'commission_percent',
+    'item_name': 'item_name',
+    'quantity': 'quantity',
+    'vendor_invoice': 'vendor_invoice',
+    'tracking_id': 'tracking_id',
+    'courier_partner': 'courier_partner',
+    'cost_deducted': 'cost_deducted',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'items': None,
+}
+
+DEAL_ITEM_FIELDS = ['id', 'deal_id', 'item_name', 'quantity', 'item_price', 'commission_per_item', 'created_at']
+
+
+class APIError(Exception):
+    """Raised for invalid query parameters; rendered as a 400 response."""
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _page_size(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise APIError('limit must be an integer.')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _selected_fields(request, available):
+    """Return the public field names requested via `fields`, or all of them."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(available)
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise APIError(f"Unknown field(s): {', '.join(unknown)}.")
+    return fields
+
+
+def _since(request):
+    value = request.GET.get('updated_since')
+    if not value:
+        return None
+    since = parse_datetime(value)
+    if since is None:
+        raise APIError('updated_since must be an ISO 8601 datetime.')
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def _updated_since(request, queryset, related=()):
+    """Rows updated after `updated_since`, or with a row in one of the `related` lookups that was."""
+    since = _since(request)
+    if since is None:
+        return queryset
+    condition = Q(updated_at__gt=since)
+    for lookup in related:
+        condition |= Q(**{f'{lookup}__updated_at__gt': since})
+    queryset = queryset.filter(condition)
+    return queryset.distinct() if related else queryset
+
+
+def encode_cursor(*keys):
+    """Opaque cursor for a keyset position, (updated_at, id) by default."""
+    payload = json.dumps([key.isoformat() if hasattr(key, 'isoformat') else key for key in keys]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor, types=(datetime.fromisoformat, int)):
+    """The keys of an encode_cursor() cursor, each parsed by the matching entry of `types`."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        keys = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(keys) != len(types):
+            raise ValueError(cursor)
+        return tuple(parse(key) for parse, key in zip(types, keys))
+    except (ValueError, TypeError):
+        raise APIError('Invalid cursor.')
+
+
+async def _paginate(request, queryset, paths):
+    """
+    Keyset-paginate a queryset on (updated_at, id) and project it with values().
+    Returns (rows, next_cursor).
+    """
+    cursor = request.GET.get('cursor')
+    if cursor:
+        updated_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+
+    limit = _page_size(request)
+    columns = list(dict.fromkeys(list(paths) + ['updated_at', 'id']))
+    rows = [row async for row in queryset.order_by('updated_at', 'id').values(*columns)[:limit + 1]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['updated_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def _project(rows, fields, mapping):
+    """Rename ORM lookups to public field names and drop unrequested columns."""
+    return [
+        {name: row[mapping[name]] for name in fields if mapping[name] is not None}
+        for row in rows
+    ]
+
+
+async def _validators(request, queryset, history_models, stamp='updated_at'):
+    """
+    Compute (etag, last_modified) for a filtered queryset.
+    Deletions only show up in the history tables, so their latest entry is folded in.
+    """
+    stats = await queryset.order_by().aaggregate(last=Max(stamp), count=Count('id'))
+    stamps = [stats['last']]
+    for history_model in history_models:
+        stamps.append((await history_model.objects.aaggregate(last=Max('history_date')))['last'])
+    stamps = [stamp for stamp in stamps if stamp is not None]
+    last_modified = max(stamps) if stamps else None
+
+    key = '|'.join([
+        request.path,
+        request.GET.urlencode(),
+        str(stats['count']),
+        *[stamp.isoformat() for stamp in stamps],
+    ])
+    etag = hashlib.md5(key.encode()).hexdigest()
+    return etag, last_modified
+
+
+async def _respond(request, queryset, history_models, build, stamp='updated_at'):
+    """Answer 304 when the client's validators match, otherwise build the JSON payload."""
+    etag, last_modified = await _validators(request, queryset, history_models, stamp)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=f'"{etag}"', last_modified=timestamp)
+    if response is None:
+        response = JsonResponse(await build())
+    response.headers['ETag'] = f'"{etag}"'
+    if timestamp is not None:
+        response.headers['Last-Modified'] = http_date(timestamp)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _payload(rows, next_cursor):
+    return {'results': rows, 'next_cursor': next_cursor}
+
+
+@require_GET
+async def partner_list(request):
+    """List partners with their current balances."""
+    try:
+        fields = _selected_fields(request, PARTNER_FIELDS)
+        partners = _updated_since(request, Partner.objects.all())
+
+        async def build():
+            rows, next_cursor = await _paginate(request, partners, [PARTNER_FIELDS[name] for name in fields])
+            return _payload(_project(rows, fields, PARTNER_FIELDS), next_cursor)
+
+        return await _respond(request, partners, [Partner.history.model], build)
+    except APIError as exc:
+        return _error(str(exc))
+
+
+@require_GET
+async def transaction_list(request):
+    """List transactions, filtered like the ledger page."""
+    try:
+        fields = _selected_fields(request, TRANSACTION_FIELDS)
+        transactions, *_ = apply_ledger_filters(request.GET, Transaction.objects.all())
+        transactions = _updated_since(request, transactions)
+
+        async def build():
+            rows, next_cursor = await _paginate(request, transactions, [TRANSACTION_FIELDS[name] for name in fields])
+            return _payload(_project(rows, fields, TRANSACTION_FIELDS), next_cursor)
+
+        return await _respond(request, transactions, [Transaction.history.model], build)
+    except APIError as exc:
+        return _error(str(exc))
+
+
+@require_GET
+async def deal_list(request):
+    """List deals with their items, filtered by partner, status and creation date."""
+    try:
+        fields = _selected_fields(request, DEAL_FIELDS)
+        deals, *_ = apply_ledger_filters(request.GET, Deal.objects.all(), date_field='created_at__date')
+        status = request.GET.get('status')
+        if status:
+            deals = deals.filter(status__in=status.split(','))
+        deals = _updated_since(request, deals, related=['items'])
+
+        async def build():
+            paths = [DEAL_FIELDS[name] for name in fields if DEAL_FIELDS[name] is not None]
+            rows, next_cursor = await _paginate(request, deals, paths)
+            results = _project(rows, fields, DEAL_FIELDS)
+            if 'items' in fields:
+                items_by_deal = {row['id']: [] for row in rows}
+                items = DealItem.objects.filter(deal_id__in=items_by_deal).order_by('deal_id', 'created_at', 'id')
+                async for item in items.values(*DEAL_ITEM_FIELDS):
+                    items_by_deal[item['deal_id']].append(item)
+                for row, result in zip(rows, results):
+                    result['items'] = items_by_deal[row['id']]
+            return _payload(results, next_cursor)
+
+        return await _respond(request, deals, [Deal.history.model, DealItem.history.model], build)
+    except APIError as exc:
+        return _error(str(exc))
+
+
+async def _archived_list(request, archive_model):
+    """
+    Tombstones of rows archived by fiscal-year closes after `updated_since`,
+    keyset-paginated on id.
+    """
+    try:
+        since = _since(request)
+        closes = FiscalYearClose.objects.all()
+        if since is not None:
+            closes = closes.filter(closed_at__gt=since)
+        archived = archive_model.objects.filter(fiscal_year__in=closes.values('fiscal_year'))
+        cursor = request.GET.get('cursor')
+
+        async def build():
+            archived_at = dict([row async for row in closes.values_list('fiscal_year', 'closed_at')])
+            rows = archived
+            if cursor:
+                _, pk = decode_cursor(cursor)
+                rows = rows.filter(id__gt=pk)
+            limit = _page_size(request)
+            rows = [row async for row in rows.order_by('id').values('id', 'fiscal_year')[:limit + 1]]
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(archived_at[rows[-1]['fiscal_year']], rows[-1]['id'])
+            for row in rows:
+                row['archived_at'] = archived_at[row['fiscal_year']]
+            return _payload(rows, next_cursor)
+
+        return await _respond(request, closes, [], build, stamp='closed_at')
+    except APIError as exc:
+        return _error(str(exc))
+
+
+@require_GET
+async def archived_transaction_list(request):
+    """List transactions moved into the archive by fiscal-year closes."""
+    return await _archived_list(request, ArchivedTransaction)
+
+
+@require_GET
+async def archived_deal_list(request):
+    """List deals moved into the archive by fiscal-year closes; their items went with them."""
+    return await _archived_list(request, ArchivedDeal)
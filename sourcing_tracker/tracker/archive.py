@@ -0,0 +1,205 @@
+"""
+Fiscal-year close and archive reads.
+
+Closing FY N (1 April N - 31 March N+1) moves every transaction dated on or before
+31 March N+1, and every delivered or returned deal created by then, out of the hot
+tables into the Archived* tables, together with their history rows. Each partner's
+opening balance for FY N+1 is recorded at the same time.
+
+Views call `reaches_archive()` with their date filter parameters to decide whether
+archived rows must be merged into the result.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import rollups
+from .filters import resolve_date_range
+from .models import (
+    Partner, Transaction, Deal, DealItem,
+    FiscalYearClose, OpeningBalance,
+    ArchivedTransaction, ArchivedDeal, ArchivedDealItem, ArchivedHistoryRecord,
+)
+
+CLOSED_DEAL_STATUSES = ['DELIVERED', 'RETURNED']
+BATCH_SIZE = 1000
+
+# Hot model -> (archive model, ArchivedHistoryRecord.model label)
+ARCHIVES = {
+    Transaction: (ArchivedTransaction, 'transaction'),
+    Deal: (ArchivedDeal, 'deal'),
+    DealItem: (ArchivedDealItem, 'dealitem'),
+}
+
+
+class FiscalYearError(Exception):
+    """Raised when a fiscal year cannot be closed."""
+
+
+def fiscal_year_for(day):
+    """Return the starting calendar year of the fiscal year containing `day`."""
+    return day.year if day.month >= 4 else day.year - 1
+
+
+def fiscal_year_bounds(fiscal_year):
+    return date(fiscal_year, 4, 1), date(fiscal_year + 1, 3, 31)
+
+
+def closed_through():
+    """Return the last date covered by a closed fiscal year, or None."""
+    return FiscalYearClose.objects.order_by('-fiscal_year').values_list('end_date', flat=True).first()
+
+
+async def aclosed_through():
+    return await FiscalYearClose.objects.order_by('-fiscal_year').values_list('end_date', flat=True).afirst()
+
+
+def reaches_archive(params, closed_through):
+    """True when the ledger date filter in `params` (none = all time) overlaps a closed year."""
+    _, start, _ = resolve_date_range(params)
+    return closed_through is not None and (start is None or start <= closed_through)
+
+
+def _concrete_values(instance_values, model):
+    names = {field.attname for field in model._meta.concrete_fields}
+    return {key: value for key, value in instance_values.items() if key in names}
+
+
+def _transaction_fiscal_year(row):
+    return {'fiscal_year': fiscal_year_for(row['date'])}
+
+
+def _deal_fiscal_year(row):
+    return {'fiscal_year': fiscal_year_for(timezone.localtime(row['created_at']).date())}
+
+
+def _archive_rows(queryset, hot_model, extra=None):
+    """Copy a batch of hot rows into the archive table; returns their ids."""
+    archive_model, _ = ARCHIVES[hot_model]
+    rows = list(queryset.values(*[field.attname for field in hot_model._meta.concrete_fields]))
+    archive_model.objects.bulk_create([
+        archive_model(**_concrete_values(row, archive_model), **(extra(row) if extra else {}))
+        for row in rows
+    ])
+    return [row['id'] for row in rows]
+
+
+def _archive_history(hot_model, ids, since):
+    """Move the history rows of archived objects into ArchivedHistoryRecord."""
+    history_model = hot_model.history.model
+    _, label = ARCHIVES[hot_model]
+    meta_fields = {'history_id', 'history_date', 'history_type', 'history_user_id', 'history_change_reason'}
+    history = history_model.objects.filter(id__in=ids)
+    # Deleting the hot rows records a '-' entry; that is the archive move, not a real deletion
+    history.filter(history_type='-', history_date__gte=since).delete()
+
+    records = [
+        ArchivedHistoryRecord(
+            model=label,
+            object_id=row['id'],
+            history_id=row['history_id'],
+            history_date=row['history_date'],
+            history_type=row['history_type'],
+            history_user_id=row['history_user_id'],
+            history_change_reason=row['history_change_reason'],
+            data={key: value for key, value in row.items() if key not in meta_fields},
+        )
+        for row in history.values()
+    ]
+    ArchivedHistoryRecord.objects.bulk_create(records, batch_size=BATCH_SIZE)
+    history.delete()
+    return len(records)
+
+
+def _batches(queryset):
+    ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def _opening_balances(fiscal_year_end):
+    """
+    Balance of every partner at the end of the closing year: the current balance
+    minus everything that moved it after that date.
+    """
+    later = defaultdict(Decimal)
+    flows = (
+        Transaction.objects.filter(date__gt=fiscal_year_end)
+        .values('partner_id', 'transaction_type').annotate(total=Sum('amount')).order_by()
+    )
+    for row in flows:
+        sign = 1 if row['transaction_type'] == 'ADVANCE_RECEIVED' else -1
+        later[row['partner_id']] += sign * row['total']
+    costs = (
+        Deal.objects.filter(created_at__date__gt=fiscal_year_end, cost_deducted=True)
+        .values('partner_id').annotate(total=Sum('actual_cost')).order_by()
+    )
+    for row in costs:
+        later[row['partner_id']] -= row['total'] or Decimal('0.00')
+
+    return {
+        partner_id: balance - later[partner_id]
+        for partner_id, balance in Partner.objects.values_list('id', 'current_balance')
+    }
+
+
+def close_fiscal_year(fiscal_year, dry_run=False):
+    """
+    Close `fiscal_year` and archive everything settled on or before its last day.
+    Returns the FiscalYearClose (unsaved when dry_run is set).
+    """
+    start_date, end_date = fiscal_year_bounds(fiscal_year)
+    if end_date >= timezone.localdate():
+        raise FiscalYearError(f'FY {fiscal_year}-{(fiscal_year + 1) % 100:02d} has not ended yet.')
+    latest = FiscalYearClose.objects.order_by('-fiscal_year').first()
+    if latest and latest.fiscal_year >= fiscal_year:
+        raise FiscalYearError(f'FY {latest.label} is already closed; years must be closed in order.')
+
+    transactions = Transaction.objects.filter(date__lte=end_date)
+    deals = Deal.objects.filter(created_at__date__lte=end_date, status__in=CLOSED_DEAL_STATUSES)
+    items = DealItem.objects.filter(deal__in=deals)
+    close = FiscalYearClose(
+        fiscal_year=fiscal_year,
+        start_date=start_date,
+        end_date=end_date,
+        transactions_archived=transactions.count(),
+        deals_archived=deals.count(),
+        deal_items_archived=items.count(),
+    )
+    if dry_run:
+        return close
+
+    # Archived rows still count in the analytics rollups; moving them is not a deletion
+    with transaction.atomic(), rollups.suspended():
+        started = timezone.now()
+        close.save()
+        OpeningBalance.objects.bulk_create([
+            OpeningBalance(partner_id=partner_id, fiscal_year=fiscal_year + 1, amount=amount, fiscal_year_close=close)
+            for partner_id, amount in _opening_balances(end_date).items()
+        ])
+
+        history_archived = 0
+        for ids in _batches(deals):
+            _archive_rows(Deal.objects.filter(pk__in=ids), Deal, _deal_fiscal_year)
+            item_ids = _archive_rows(DealItem.objects.filter(deal_id__in=ids), DealItem)
+            DealItem.objects.filter(pk__in=item_ids).delete()
+            Deal.objects.filter(pk__in=ids).delete()
+            history_archived += _archive_history(DealItem, item_ids, started)
+            history_archived += _archive_history(Deal, ids, started)
+
+        for ids in _batches(transactions):
+            _archive_rows(Transaction.objects.filter(pk__in=ids), Transaction, _transaction_fiscal_year)
+            Transaction.objects.filter(pk__in=ids).delete()
+            history_archived += _archive_history(Transaction, ids, started)
+
+        close.history_archived = history_archived
+        close.save(update_fields=['history_archived'])
+    return close
+
+
+def partner_has_archive(partner):
+    return partner.archived_transactions.exists() or partner.archived_deals.exists()
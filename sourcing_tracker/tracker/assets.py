@@ -0,0 +1,182 @@
+"""
+Static assets: the vendored front-end libraries, a precompressing manifest
+storage and a static file view with far-future caching.
+
+Bootstrap, Bootstrap Icons and the Inter font are served from the app's own
+static files (fetched with `manage.py fetch_vendor_assets` and committed) so pages
+render without reaching a CDN. When DEBUG is off, collectstatic writes hashed file
+names plus .gz (and, with the optional brotli package, .br) siblings, and
+`serve_static` sends the best variant the client accepts with an immutable
+Cache-Control header. A front proxy can serve STATIC_ROOT the same way instead.
+"""
+import functools
+import gzip
+import mimetypes
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.contrib.staticfiles.views import serve as finders_serve
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+BOOTSTRAP_VERSION = '5.3.3'
+BOOTSTRAP_ICONS_VERSION = '1.11.3'
+INTER_VERSION = '4.0'
+
+# The libraries are taken from PyPI distributions that ship them unmodified: PyPI
+# files never change once uploaded and the same index serves the app's dependencies
+_PYPI = 'https://files.pythonhosted.org/packages'
+_BOOTSTRAP_DIST = (
+    f'{_PYPI}/12/3a/3971e2a28ae9076be3ecf99086b7ceef12111920b03fc095d749eab30714/'
+    f'django_bootstrap_static-{BOOTSTRAP_VERSION}-py3-none-any.whl'
+)
+_ICONS_DIST = (
+    f'{_PYPI}/47/da/94034724f4315bd07960afb1c8e56af129bdd831716cc04d296e80f393c5/'
+    f'django_js_lib_bootstrap_icons-{BOOTSTRAP_ICONS_VERSION}.0-py2.py3-none-any.whl'
+)
+_INTER_DIST = (  # django-unfold 1.0.0 vendors Inter 4.0
+    f'{_PYPI}/83/01/ff45afd0a3ab6031101a74e4745c40d03978fd149a7a66466b7436a8c8ee/'
+    'django_unfold-1.0.0-py3-none-any.whl'
+)
+
+# Static path (under tracker/static/) -> (pinned distribution, file in it, sha256 of that file)
+VENDOR_ASSETS = {
+    'tracker/vendor/bootstrap/bootstrap.min.css': (
+        _BOOTSTRAP_DIST, 'bootstrap/static/bootstrap/css/bootstrap.min.css',
+        '3c8f27e6009ccfd710a905e6dcf12d0ee3c6f2ac7da05b0572d3e0d12e736fc8',
+    ),
+    'tracker/vendor/bootstrap/bootstrap.bundle.min.js': (
+        _BOOTSTRAP_DIST, 'bootstrap/static/bootstrap/js/bootstrap.bundle.min.js',
+        '0833b2e9c3a26c258476c46266e6877fc75218625162e0460be9a3a098a61c6c',
+    ),
+    'tracker/vendor/bootstrap-icons/bootstrap-icons.min.css': (
+        _ICONS_DIST, 'js_lib_bootstrap_icons/static/bootstrap-icons/font/bootstrap-icons.min.css',
+        'f643d6fe7e679f9de3e16311600c5ef5cd6b098f7a3a8828fcc29255d2b33e62',
+    ),
+    'tracker/vendor/bootstrap-icons/fonts/bootstrap-icons.woff2': (
+        _ICONS_DIST, 'js_lib_bootstrap_icons/static/bootstrap-icons/font/fonts/bootstrap-icons.woff2',
+        '476adf42b40325098fcfa8b36ab3e769186bb4f6ce6a249753e2e1a9c22bf99e',
+    ),
+    'tracker/vendor/bootstrap-icons/fonts/bootstrap-icons.woff': (
+        _ICONS_DIST, 'js_lib_bootstrap_icons/static/bootstrap-icons/font/fonts/bootstrap-icons.woff',
+        'bb1de989b83970f6f4e54de1cd974c5cba55b73582da5e1b225a6d0edf029483',
+    ),
+    **{
+        f'tracker/vendor/inter/Inter-{style}.woff2': (
+            _INTER_DIST, f'unfold/static/unfold/fonts/inter/Inter-{style}.woff2', sha256,
+        )
+        for style, sha256 in (
+            ('Regular', 'e06f6b1bc553aaea4e4668023ed0ab0a147129c3107f511bc7d03d361b0ae085'),
+            ('Medium', '0ff3e94614e1493eb556314fd247ae6c4a85a7783b4cc86be539940cf83f2a48'),
+            ('SemiBold', '5cb7103e4e605989afebc03d989c79201e54b21b5183db33981f70db9178a301'),
+            ('Bold', 'fa888127b6da015b65569f0351f3b5c391ad928904951f1c20e9f8462a8d95ea'),
+        )
+    },
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=3600'
+
+# Preferred first
+PRECOMPRESSED = (('.br', 'br'), ('.gz', 'gzip'))
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz and .br siblings of text assets."""
+
+    compress_extensions = (
+        '.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ttf', '.otf', '.eot', '.ico',
+    )
+    min_compress_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.update(filter(None, (name, hashed_name)))
+            yield name, hashed_name, processed
+        if not dry_run:
+            for name in sorted(names):
+                self._compress(name)
+
+    def _compress(self, name):
+        if not name.endswith(self.compress_extensions):
+            return
+        with self.open(name) as fh:
+            data = fh.read()
+        if len(data) < self.min_compress_size:
+            return
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data)))
+        for suffix, compressed in variants:
+            # Not worth a second request path when it barely shrinks
+            if len(compressed) >= len(data) * 0.95:
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
+
+
+@functools.cache
+def _hashed_names():
+    """File names from the collectstatic manifest; their content never changes."""
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.partition(';')
+        quality = params.replace(' ', '').removeprefix('q=')
+        if params and quality.strip('0.') == '':
+            continue  # q=0: explicitly refused
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+@require_safe
+def serve_static(request, path):
+    """Serve a file from STATIC_ROOT, precompressed when possible; app directories in DEBUG."""
+    if settings.DEBUG:
+        return finders_serve(request, path, insecure=True)
+    try:
+        fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404
+    if not fullpath.is_file() or fullpath.suffix in ('.gz', '.br'):
+        raise Http404
+
+    mtime = fullpath.stat().st_mtime
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), mtime):
+        return HttpResponseNotModified()
+
+    served, content_encoding = fullpath, None
+    accepted = _accepted_encodings(request)
+    for suffix, coding in PRECOMPRESSED:
+        variant = fullpath.with_name(fullpath.name + suffix)
+        if coding in accepted and variant.is_file():
+            served, content_encoding = variant, coding
+            break
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    response = FileResponse(
+        served.open('rb'), content_type=content_type or 'application/octet-stream', filename=fullpath.name,
+    )
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    response['Vary'] = 'Accept-Encoding'
+    response['Last-Modified'] = http_date(mtime)
+    response['Cache-Control'] = IMMUTABLE if path in _hashed_names() else REVALIDATE
+    return response
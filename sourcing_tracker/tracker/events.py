@@ -0,0 +1,117 @@
+"""
+Lightweight event bus for live dashboard updates.
+
+Signals publish the ids of partners whose balance or deal count changed, once the
+surrounding database transaction commits. The dashboard's Server-Sent Events stream
+subscribes to the bus and pushes fresh values for just those partners.
+
+Two backends are available, chosen with the TRACKER_EVENT_BUS setting:
+- LocalEventBus: in-memory fan-out, for a single worker process.
+- DatabaseEventBus: writes PartnerEvent rows that every process polls, for
+  deployments with several worker processes.
+"""
+import asyncio
+import itertools
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import PartnerEvent
+
+
+class LocalEventBus:
+    """Fan events out to subscribers living in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+
+    def publish(self, partner_ids):
+        event = (next(self._ids), set(partner_ids))
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            loop, queue = subscriber
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's event loop has closed without unsubscribing
+                with self._lock:
+                    self._subscribers.discard(subscriber)
+
+    async def subscribe(self, last_event_id=None, timeout=None):
+        """Yield (event_id, partner_ids) as events arrive; yields None on timeout."""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+
+class DatabaseEventBus:
+    """Share events between processes through the PartnerEvent table."""
+
+    # Events older than this many rows behind the newest one are pruned
+    RETENTION = 5000
+    # Prune once the ids have moved this far since this process last pruned; ids
+    # skipped by other publishers or rolled-back inserts cannot postpone it
+    PRUNE_EVERY = 500
+
+    def __init__(self):
+        self._pruned_at = 0
+
+    def publish(self, partner_ids):
+        events = PartnerEvent.objects.bulk_create([PartnerEvent(partner_id=pk) for pk in set(partner_ids)])
+        newest = max((event.pk for event in events if event.pk), default=0)
+        if newest - self._pruned_at >= self.PRUNE_EVERY:
+            self._pruned_at = newest
+            PartnerEvent.objects.filter(pk__lte=newest - self.RETENTION).delete()
+
+    async def subscribe(self, last_event_id=None, timeout=None):
+        """Poll for new PartnerEvent rows; yields None when a poll finds nothing."""
+        interval = getattr(settings, 'TRACKER_EVENT_POLL_INTERVAL', 2)
+        if last_event_id is None:
+            newest = await PartnerEvent.objects.order_by('-pk').values_list('pk', flat=True).afirst()
+            last_event_id = newest or 0
+
+        idle = 0
+        while True:
+            rows = [row async for row in PartnerEvent.objects.filter(pk__gt=last_event_id).values_list('pk', 'partner_id')]
+            if rows:
+                idle = 0
+                last_event_id = rows[-1][0]
+                yield last_event_id, {partner_id for _, partner_id in rows}
+            else:
+                idle += interval
+                if timeout is not None and idle >= timeout:
+                    idle = 0
+                    yield None
+            await asyncio.sleep(interval)
+
+
+_bus = None
+
+
+def get_event_bus():
+    global _bus
+    if _bus is None:
+        backend = getattr(settings, 'TRACKER_EVENT_BUS', 'tracker.events.LocalEventBus')
+        _bus = import_string(backend)()
+    return _bus
+
+
+def publish_partner_change(*partner_ids):
+    """Publish partner changes once the current transaction commits."""
+    partner_ids = {pk for pk in partner_ids if pk is not None}
+    if partner_ids:
+        transaction.on_commit(lambda: get_event_bus().publish(partner_ids))
@@ -0,0 +1,435 @@
+"""
+Background exports.
+
+A request submits an ExportJob and returns at once; `manage.py run_workers` runs
+worker processes that claim queued jobs oldest first, write the file to a temporary
+file while reporting progress on the job, and save it to media storage under
+exports/<job id>/. The exports page polls the jobs and links the finished files.
+
+Submitting an export that is already queued or running returns that job. A finished
+one is reused while it is fresh: done within TRACKER_EXPORT_CACHE_SECONDS, with no
+partner, ledger or deal change since it started (see `data_version`).
+
+The row builders here are shared with the streaming export views.
+"""
+import csv
+import hashlib
+import io
+import logging
+import os
+import socket
+import tempfile
+import time
+import zipfile
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections
+from django.db.models import Count, ExpressionWrapper, F, Max, Sum
+from django.http import QueryDict
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import metrics, rollups, statements, xlsx
+from .archive import closed_through, reaches_archive
+from .fields import MoneyField
+from .filters import apply_ledger_filters, resolve_date_range
+from .models import (
+    Partner, Transaction, Deal, DealItem, ArchivedTransaction, ArchivedDeal, ArchivedDealItem,
+    FiscalYearClose, ExportJob,
+)
+
+logger = logging.getLogger('tracker.exports')
+
+# Seconds between progress writes, and without one before a running job counts as abandoned
+PROGRESS_INTERVAL = 1
+STALE_AFTER = 300
+
+CHUNK_SIZE = 2000
+
+LEDGER_COLUMNS = ['date', 'created_at', 'partner__name', 'partner__gst_number', 'transaction_type', 'amount', 'notes']
+LEDGER_CSV_HEADER = ['Date', 'Partner', 'GST Number', 'Transaction Type', 'Amount', 'Notes']
+LEDGER_SHEET = [
+    ('Date', 12), ('Partner', 30), ('GST Number', 18), ('Transaction Type', 18),
+    ('Amount', 14), ('Notes', 50), ('Recorded At', 18),
+]
+DEAL_SHEET = [
+    ('Reference', 14), ('Partner', 30), ('GST Number', 18), ('Client', 24), ('Status', 14),
+    ('Created', 12), ('Items', 8), ('Quantity', 10), ('Items Total', 14), ('Commission', 14),
+    ('Actual Cost', 14), ('Cost Deducted', 14), ('Tracking ID', 20), ('Courier', 18),
+]
+ITEM_SHEET = [
+    ('Deal', 14), ('Partner', 30), ('Item', 40), ('Quantity', 10), ('Unit Price', 14),
+    ('Line Total', 14), ('Commission / Item', 16), ('Commission', 14),
+]
+
+TYPE_LABELS = dict(Transaction.TRANSACTION_TYPES)
+STATUS_LABELS = dict(Deal.STATUS_CHOICES)
+
+
+def ledger_rows(params, closed):
+    """Ledger rows matching the ledger filters in `params`, newest first, with closed years from the archive."""
+    transactions, *_ = apply_ledger_filters(params, Transaction.objects.all())
+    rows = transactions.values(*LEDGER_COLUMNS)
+    if reaches_archive(params, closed):
+        # Closed fiscal years live in the archive table; read both in one ordered query
+        archived, *_ = apply_ledger_filters(params, ArchivedTransaction.objects.all())
+        rows = rows.order_by().union(archived.values(*LEDGER_COLUMNS).order_by(), all=True).order_by('-date', '-created_at')
+    return rows
+
+
+def ledger_csv_row(row):
+    transaction_type = row['transaction_type']
+    return [
+        row['date'].strftime('%Y-%m-%d'),
+        row['partner__name'],
+        row['partner__gst_number'],
+        TYPE_LABELS.get(transaction_type, transaction_type),
+        f"{'+' if transaction_type == 'ADVANCE_RECEIVED' else '-'}{row['amount']}",
+        row['notes'] or '',
+    ]
+
+
+def ledger_cells(row):
+    transaction_type = row['transaction_type']
+    return [
+        row['date'],
+        row['partner__name'],
+        row['partner__gst_number'],
+        TYPE_LABELS.get(transaction_type, transaction_type),
+        row['amount'] if transaction_type == 'ADVANCE_RECEIVED' else -row['amount'],
+        row['notes'],
+        row['created_at'],
+    ]
+
+
+def deal_rows(params, deals, items):
+    """Deal and deal item rows matching the partner, date (creation day) and status filters in `params`."""
+    deals, *_ = apply_ledger_filters(params, deals, date_field='created_at__date')
+    items, *_ = apply_ledger_filters(
+        {key: params.get(key, '') for key in ('date_filter', 'start_date', 'end_date')},
+        items, date_field='deal__created_at__date',
+    )
+    partner_id = params.get('partner')
+    if partner_id and partner_id.isdigit():
+        items = items.filter(deal__partner_id=partner_id)
+    statuses = [status for status in params.getlist('status') if status in STATUS_LABELS]
+    if statuses:
+        deals = deals.filter(status__in=statuses)
+        items = items.filter(deal__status__in=statuses)
+
+    line_total = ExpressionWrapper(Sum(F('items__item_price') * F('items__quantity')), output_field=MoneyField())
+    commission = ExpressionWrapper(Sum(F('items__commission_per_item') * F('items__quantity')), output_field=MoneyField())
+    deals = deals.order_by('-created_at', '-id').values(
+        'reference', 'partner__name', 'partner__gst_number', 'client_name', 'status', 'created_at',
+        'actual_cost', 'cost_deducted', 'tracking_id', 'courier_partner',
+    ).annotate(
+        item_count=Count('items'), total_quantity=Sum('items__quantity'),
+        items_total=line_total, commission=commission,
+    )
+    items = items.order_by('-deal__created_at', '-deal_id', 'created_at', 'id').values(
+        'deal__reference', 'deal__partner__name', 'item_name', 'quantity', 'item_price', 'commission_per_item',
+    )
+    return deals, items
+
+
+def deal_sources(params, closed):
+    """(deals, items) row pairs, hot first; archived deals all predate the hot ones, so they simply follow."""
+    sources = [deal_rows(params, Deal.objects.all(), DealItem.objects.all())]
+    if reaches_archive(params, closed):
+        sources.append(deal_rows(params, ArchivedDeal.objects.all(), ArchivedDealItem.objects.all()))
+    return sources
+
+
+def deal_cells(row):
+    return [
+        row['reference'], row['partner__name'], row['partner__gst_number'], row['client_name'],
+        STATUS_LABELS.get(row['status'], row['status']), rollups.local_day(row['created_at']),
+        row['item_count'], row['total_quantity'], row['items_total'], row['commission'],
+        row['actual_cost'], 'Yes' if row['cost_deducted'] else 'No',
+        row['tracking_id'], row['courier_partner'],
+    ]
+
+
+def item_cells(row):
+    return [
+        row['deal__reference'], row['deal__partner__name'], row['item_name'], row['quantity'],
+        row['item_price'], row['item_price'] * row['quantity'],
+        row['commission_per_item'], row['commission_per_item'] * row['quantity'],
+    ]
+
+
+def export_filename(prefix, params):
+    _, start, end = resolve_date_range(params)
+    if start and end:
+        return f'{prefix}_{start}_to_{end}'
+    return f'{prefix}_export_{timezone.localdate():%Y%m%d}'
+
+
+# Job writers: each writes the export to the binary file `fh` and returns its file name
+
+class Progress:
+    """Records a job's progress (and heartbeat) at most once every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, job):
+        self.job_id = job.pk
+        self.done = 0
+        self.written_at = 0
+
+    def start(self, total):
+        ExportJob.objects.filter(pk=self.job_id).update(total=total, progress=0, heartbeat_at=timezone.now())
+        self.written_at = time.monotonic()
+
+    def advance(self, count=1):
+        self.done += count
+        if time.monotonic() - self.written_at >= PROGRESS_INTERVAL:
+            ExportJob.objects.filter(pk=self.job_id).update(progress=self.done, heartbeat_at=timezone.now())
+            self.written_at = time.monotonic()
+
+
+def write_ledger_csv(params, fh, progress):
+    rows = ledger_rows(params, closed_through())
+    progress.start(rows.count())
+    text = io.TextIOWrapper(fh, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(LEDGER_CSV_HEADER)
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        writer.writerow(ledger_csv_row(row))
+        progress.advance()
+    text.flush()
+    text.detach()
+    metrics.EXPORT_ROWS.inc(progress.done, export='ledger_csv_job')
+    return f"{export_filename('ledger', params)}.csv"
+
+
+def write_ledger_xlsx(params, fh, progress):
+    rows = ledger_rows(params, closed_through())
+    progress.start(rows.count())
+    book = xlsx.StreamingWorkbook()
+    fh.write(book.start_sheet('Ledger', LEDGER_SHEET))
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        fh.write(book.write_row(ledger_cells(row)))
+        progress.advance()
+    fh.write(book.close())
+    metrics.EXPORT_ROWS.inc(progress.done, export='ledger_xlsx_job')
+    return f"{export_filename('ledger', params)}.xlsx"
+
+
+def write_deals_xlsx(params, fh, progress):
+    sources = deal_sources(params, closed_through())
+    progress.start(sum(deals.count() + items.count() for deals, items in sources))
+    book = xlsx.StreamingWorkbook()
+    fh.write(book.start_sheet('Deals', DEAL_SHEET))
+    for deals, _ in sources:
+        for row in deals.iterator(chunk_size=CHUNK_SIZE):
+            fh.write(book.write_row(deal_cells(row)))
+            progress.advance()
+    fh.write(book.start_sheet('Items', ITEM_SHEET))
+    for _, items in sources:
+        for row in items.iterator(chunk_size=CHUNK_SIZE):
+            fh.write(book.write_row(item_cells(row)))
+            progress.advance()
+    fh.write(book.close())
+    metrics.EXPORT_ROWS.inc(progress.done, export='deals_xlsx_job')
+    return f"{export_filename('deals', params)}.xlsx"
+
+
+def write_statements(params, fh, progress):
+    year, month = map(int, params['period'].split('-'))
+    start, end = statements.month_bounds(year, month)
+    built = statements.build_statements(start, end)
+    progress.start(len(built))
+    formats = params.getlist('format')
+    with tempfile.TemporaryDirectory() as directory, zipfile.ZipFile(fh, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for statement in built:
+            for _, files in statements.render_statements([statement], directory, formats):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    bundle.write(path, name)
+                    os.remove(path)
+            progress.advance()
+    return f"statements_{params['period']}.zip"
+
+
+def write_invoices(params, fh, progress):
+    deals, *_ = apply_ledger_filters(
+        params, Deal.objects.filter(status='DELIVERED'), date_field='updated_at__date'
+    )
+    progress.start(deals.count())
+    deals = deals.select_related('partner').prefetch_related('items').order_by('updated_at', 'id')
+    with zipfile.ZipFile(fh, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for deal in deals.iterator(chunk_size=500):
+            html = render_to_string('tracker/commission_invoice.html', {
+                'deal': deal, 'commission_amount': deal.commission_amount,
+            })
+            bundle.writestr(f'{deal.reference}.html', html)
+            progress.advance()
+    return f"{export_filename('invoices', params)}.zip"
+
+
+def _ledger_params(data):
+    params = {}
+    partner_id = data.get('partner')
+    if partner_id and partner_id.isdigit():
+        params['partner'] = partner_id
+    # Relative filters are resolved, so "this month" is never answered from last month's file
+    _, start, end = resolve_date_range(data)
+    if start and end:
+        params.update(date_filter='custom', start_date=start.isoformat(), end_date=end.isoformat())
+    return params
+
+
+def _deal_params(data):
+    params = _ledger_params(data)
+    statuses = sorted({status for status in data.getlist('status') if status in STATUS_LABELS})
+    if statuses:
+        params['status'] = statuses
+    return params
+
+
+def _statement_params(data):
+    period = data.get('period', '')
+    try:
+        year, month = map(int, period.split('-'))
+        statements.month_bounds(year, month)
+    except ValueError:
+        raise ValueError('Choose the statement month as YYYY-MM.')
+    formats = sorted(set(data.getlist('format')) & set(statements.WRITERS)) or ['csv']
+    if 'pdf' in formats and statements.A4 is None:
+        raise ValueError('PDF statements need the reportlab package.')
+    return {'period': f'{year:04d}-{month:02d}', 'format': formats}
+
+
+# kind -> (parameter cleaner, writer)
+KINDS = {
+    'ledger_csv': (_ledger_params, write_ledger_csv),
+    'ledger_xlsx': (_ledger_params, write_ledger_xlsx),
+    'deals_xlsx': (_deal_params, write_deals_xlsx),
+    'statements': (_statement_params, write_statements),
+    'invoices': (_ledger_params, write_invoices),
+}
+
+
+def _query(params):
+    return QueryDict(urlencode(params, doseq=True))
+
+
+def job_key(kind, params):
+    return hashlib.sha256(f'{kind}?{urlencode(sorted(params.items()), doseq=True)}'.encode()).hexdigest()
+
+
+def data_version():
+    """Row count and latest change of everything an export reads; differs once any of it changes."""
+    parts = []
+    for model, field in (
+        (Partner, 'updated_at'), (Transaction, 'updated_at'), (Deal, 'updated_at'),
+        (DealItem, 'updated_at'), (FiscalYearClose, 'closed_at'),
+    ):
+        row = model.objects.order_by().aggregate(count=Count('pk'), latest=Max(field))
+        latest = row['latest'].timestamp() if row['latest'] else 0
+        parts.append(f"{model._meta.label_lower}:{row['count']}:{latest}")
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def submit(kind, data):
+    """
+    Queue an export of `kind` for the request parameters in `data` (a QueryDict).
+    Returns (job, reused); raises ValueError for an unknown kind or invalid parameters.
+    """
+    if kind not in KINDS:
+        raise ValueError('Unknown export.')
+    params = KINDS[kind][0](data)
+    key = job_key(kind, params)
+    pending = ExportJob.objects.filter(key=key, status__in=['QUEUED', 'RUNNING']).order_by('created_at').first()
+    if pending:
+        return pending, True
+    cache_seconds = getattr(settings, 'TRACKER_EXPORT_CACHE_SECONDS', 600)
+    done = ExportJob.objects.filter(
+        key=key, status='DONE', finished_at__gte=timezone.now() - timedelta(seconds=cache_seconds),
+    ).order_by('-finished_at').first()
+    if done and done.data_version == data_version():
+        return done, True
+    return ExportJob.objects.create(kind=kind, params=params, key=key), False
+
+
+def claim_job(worker):
+    """Mark the oldest queued job as running for `worker` and return it, or None."""
+    queued = ExportJob.objects.filter(status='QUEUED').order_by('created_at', 'id').values_list('pk', flat=True)
+    for job_id in queued[:10]:
+        now = timezone.now()
+        # Another worker may claim the same row first; only one UPDATE matches
+        if ExportJob.objects.filter(pk=job_id, status='QUEUED').update(
+            status='RUNNING', worker=worker, started_at=now, heartbeat_at=now,
+        ):
+            return ExportJob.objects.get(pk=job_id)
+    return None
+
+
+def requeue_stale():
+    """Queue running jobs again whose worker stopped reporting, e.g. after it was killed."""
+    cutoff = timezone.now() - timedelta(seconds=STALE_AFTER)
+    return ExportJob.objects.filter(status='RUNNING', heartbeat_at__lt=cutoff).update(
+        status='QUEUED', worker='', progress=0,
+    )
+
+
+def run_job(job):
+    """Write the job's file to media storage and mark it done (or failed, with the error)."""
+    _, writer = KINDS[job.kind]
+    version = data_version()
+    progress = Progress(job)
+    try:
+        with tempfile.TemporaryFile() as fh:
+            filename = writer(_query(job.params), fh, progress)
+            fh.seek(0)
+            job.result.save(f'{job.pk}/{filename}', File(fh), save=False)
+    except Exception as exc:
+        logger.exception('Export job %s (%s) failed', job.pk, job.kind)
+        ExportJob.objects.filter(pk=job.pk).update(status='FAILED', error=str(exc), finished_at=timezone.now())
+        metrics.EXPORT_JOBS.inc(kind=job.kind, status='failed')
+        return False
+    ExportJob.objects.filter(pk=job.pk).update(
+        status='DONE', result=job.result.name, progress=progress.done, total=progress.done,
+        data_version=version, error='', finished_at=timezone.now(),
+    )
+    metrics.EXPORT_JOBS.inc(kind=job.kind, status='done')
+    return True
+
+
+def purge_expired():
+    """Delete finished jobs older than TRACKER_EXPORT_RETENTION_DAYS, with their files."""
+    days = getattr(settings, 'TRACKER_EXPORT_RETENTION_DAYS', 7)
+    expired = ExportJob.objects.filter(
+        status__in=['DONE', 'FAILED'], finished_at__lt=timezone.now() - timedelta(days=days),
+    )
+    count = 0
+    for job in expired.iterator():
+        if job.result:
+            job.result.delete(save=False)
+        job.delete()
+        count += 1
+    return count
+
+
+def worker_name(number):
+    return f'{socket.gethostname()}:{os.getpid()}:{number}'
+
+
+def work(number, stop, poll_interval, once=False):
+    """Worker loop: run queued jobs until `stop` is set (or, with `once`, the queue is empty)."""
+    import django
+    django.setup()
+    name = worker_name(number)
+    while not stop.is_set():
+        requeue_stale()
+        job = claim_job(name)
+        if job is None:
+            if once:
+                break
+            stop.wait(poll_interval)
+            continue
+        logger.info('%s running export job %s (%s)', name, job.pk, job.kind)
+        run_job(job)
+    connections.close_all()
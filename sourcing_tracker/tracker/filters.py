@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from django.utils import timezone
+
+
+def resolve_date_range(params):
+    """
+    Resolve the ledger date filter parameters into a date range.
+    Returns (date_filter, start, end) where start/end are dates or None.
+    """
+    date_filter = params.get('date_filter', '')
+    today = timezone.now().date()
+
+    if date_filter == 'this_month':
+        return date_filter, today.replace(day=1), today
+    if date_filter == 'last_month':
+        last_day_last_month = today.replace(day=1) - timedelta(days=1)
+        return date_filter, last_day_last_month.replace(day=1), last_day_last_month
+    if date_filter == 'last_3_months':
+        return date_filter, today - timedelta(days=90), today
+    if date_filter == 'custom':
+        try:
+            start = datetime.strptime(params.get('start_date', ''), '%Y-%m-%d').date()
+            end = datetime.strptime(params.get('end_date', ''), '%Y-%m-%d').date()
+            return date_filter, start, end
+        except ValueError:
+            pass
+    return date_filter, None, None
+
+
+def apply_ledger_filters(params, transactions, date_field='date'):
+    """
+    Apply the ledger's partner and date filters to a queryset.
+    Returns (queryset, date_filter, start_date, end_date) with dates formatted for the filter form.
+    """
+    partner_id = params.get('partner')
+    if partner_id and str(partner_id).isdigit():
+        transactions = transactions.filter(partner_id=partner_id)
+
+    date_filter, start, end = resolve_date_range(params)
+    start_date = params.get('start_date', '')
+    end_date = params.get('end_date', '')
+    if start and end:
+        transactions = transactions.filter(**{f'{date_field}__gte': start, f'{date_field}__lte': end})
+        start_date = start.strftime('%Y-%m-%d')
+        end_date = end.strftime('%Y-%m-%d')
+
+    return transactions, date_filter, start_date, end_date
@@ -1,9 +1,45 @@
+from decimal import Decimal
 from django import forms
 from django.forms import inlineformset_factory
+from django.urls import reverse_lazy
 from django.utils import timezone
 from .models import Partner, Transaction, Deal, DealItem
 
 
+class PartnerTypeaheadSelect(forms.Select):
+    """
+    Select for picking a partner that only renders the chosen option.
+    The remaining options are fetched on demand from the partner search endpoint.
+    """
+    
+    def __init__(self, attrs=None):
+        default_attrs = {
+            'class': 'form-select',
+            'data-partner-typeahead': reverse_lazy('partner_search'),
+        }
+        if attrs:
+            default_attrs.update(attrs)
+        super().__init__(default_attrs)
+
+
+class PartnerTypeaheadMixin:
+    """Limit the partner choices rendered by a form to the selected partner."""
+    
+    def limit_partner_choices(self):
+        field = self.fields['partner']
+        if self.is_bound:
+            value = self.data.get(self.add_prefix('partner'))
+        else:
+            value = self.initial.get('partner')
+        if isinstance(value, Partner):
+            value = value.pk
+        
+        choices = [('', field.empty_label)]
+        if value and str(value).isdigit():
+            choices += [(partner.pk, str(partner)) for partner in Partner.objects.filter(pk=value)]
+        field.widget.choices = choices
+
+
 class PartnerForm(forms.ModelForm):
     """Form for creating and updating Partners."""
     
@@ -17,14 +53,14 @@ class PartnerForm(forms.ModelForm):
         }
 
 
-class TransactionForm(forms.ModelForm):
+class TransactionForm(PartnerTypeaheadMixin, forms.ModelForm):
     """Form for creating Transactions (Advances/Refunds)."""
     
     class Meta:
         model = Transaction
         fields = ['partner', 'amount', 'transaction_type', 'date', 'evidence_file', 'notes']
         widgets = {
-            'partner': forms.Select(attrs={'class': 'form-select'}),
+            'partner': PartnerTypeaheadSelect(),
             'amount': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'placeholder': 'Amount'}),
             'transaction_type': forms.Select(attrs={'class': 'form-select'}),
             'date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
@@ -34,22 +70,27 @@ class TransactionForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.limit_partner_choices()
         if not self.initial.get('date'):
             self.initial['date'] = timezone.now().date()
 
 
-class DealForm(forms.ModelForm):
+class DealForm(PartnerTypeaheadMixin, forms.ModelForm):
     """Form for creating new Deals (header-level info only)."""
     
     class Meta:
         model = Deal
         fields = ['partner', 'client_name', 'vendor_invoice', 'status']
         widgets = {
-            'partner': forms.Select(attrs={'class': 'form-select'}),
+            'partner': PartnerTypeaheadSelect(),
             'client_name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'End Client Name'}),
             'vendor_invoice': forms.FileInput(attrs={'class': 'form-control'}),
             'status': forms.Select(attrs={'class': 'form-select'}),
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limit_partner_choices()
 
 
 class DealItemForm(forms.ModelForm):
@@ -93,14 +134,14 @@ DealItemFormSet = inlineformset_factory(
 )
 
 
-class QuickAdvanceForm(forms.ModelForm):
+class QuickAdvanceForm(PartnerTypeaheadMixin, forms.ModelForm):
     """Simplified form for quick advance entry from dashboard."""
     
     class Meta:
         model = Transaction
         fields = ['partner', 'amount', 'date', 'evidence_file']
         widgets = {
-            'partner': forms.Select(attrs={'class': 'form-select'}),
+            'partner': PartnerTypeaheadSelect(),
             'amount': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'placeholder': 'Amount'}),
             'date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'evidence_file': forms.FileInput(attrs={'class': 'form-control'}),
@@ -108,6 +149,7 @@ class QuickAdvanceForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.limit_partner_choices()
         if not self.initial.get('date'):
             self.initial['date'] = timezone.now().date()
     
@@ -134,3 +176,35 @@ class DealStatusUpdateForm(forms.ModelForm):
             'status': forms.Select(attrs={'class': 'form-select'}),
         }
 
+
+
+class IngestTransactionForm(forms.Form):
+    """Validates one transaction line of the NDJSON bulk ingest."""
+    
+    partner = forms.CharField(max_length=15, help_text="Partner id or GST number")
+    transaction_type = forms.ChoiceField(choices=Transaction.TRANSACTION_TYPES)
+    amount = forms.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    date = forms.DateField()
+    notes = forms.CharField(required=False)
+
+
+class IngestDealForm(forms.Form):
+    """Validates the header of one deal line of the NDJSON bulk ingest."""
+    
+    partner = forms.CharField(max_length=15, help_text="Partner id or GST number")
+    client_name = forms.CharField(max_length=200, required=False)
+
+
+class IngestDealItemForm(forms.ModelForm):
+    """Validates one item of an ingested deal."""
+    
+    class Meta:
+        model = DealItem
+        fields = ['item_name', 'quantity', 'item_price', 'commission_per_item']
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['commission_per_item'].required = False
+    
+    def clean_commission_per_item(self):
+        return self.cleaned_data.get('commission_per_item') or Decimal('0.00')
@@ -0,0 +1,267 @@
+"""
+NDJSON bulk ingest of transactions and deals pushed by partners' ERP systems.
+
+The request body is read one line at a time and each line is validated on its own.
+Valid lines are committed in batches with bulk inserts, and partner balances are
+updated once per partner per batch. A result line is streamed back for every input
+line, followed by a summary line.
+
+Line formats:
+    {"type": "transaction", "partner": "<id or GST>", "transaction_type": "ADVANCE_RECEIVED",
+     "amount": "1500.00", "date": "2025-04-01", "notes": "..."}
+    {"type": "deal", "partner": "<id or GST>", "client_name": "...",
+     "items": [{"item_name": "...", "quantity": 2, "item_price": "100.00", "commission_per_item": "5.00"}]}
+"""
+import hmac
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F, Q, Value
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from simple_history.utils import bulk_create_with_history
+
+from . import metrics, rollups
+from .events import publish_partner_change
+from .fields import MoneyField
+from .forms import IngestTransactionForm, IngestDealForm, IngestDealItemForm
+from .models import Partner, Transaction, Deal, DealItem, generate_reference
+
+DEFAULT_BATCH_SIZE = 500
+CHANGE_REASON = 'Bulk ingest'
+MAX_BATCH_SIZE = 5000
+
+
+def _batch_size(request):
+    default = getattr(settings, 'TRACKER_INGEST_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    try:
+        size = int(request.GET.get('batch_size', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, MAX_BATCH_SIZE))
+
+
+def _authorized(request):
+    """Require the TRACKER_INGEST_TOKEN bearer token; ingest is closed while none is configured."""
+    token = getattr(settings, 'TRACKER_INGEST_TOKEN', None)
+    if not token:
+        return False
+    header = request.headers.get('Authorization', '')
+    return header.startswith('Bearer ') and hmac.compare_digest(header[7:], token)
+
+
+def _result(line_no, status, **extra):
+    return json.dumps({'line': line_no, 'status': status, **extra}) + '\n'
+
+
+def _validate(record):
+    """
+    Validate one decoded line.
+    Returns (kind, cleaned_data, items) or raises ValueError with form errors.
+    """
+    if not isinstance(record, dict):
+        raise ValueError({'__all__': ['Each line must be a JSON object.']})
+
+    kind = record.get('type')
+    if kind == 'transaction':
+        form = IngestTransactionForm(record)
+        if not form.is_valid():
+            raise ValueError(form.errors.get_json_data())
+        return kind, form.cleaned_data, []
+
+    if kind == 'deal':
+        form = IngestDealForm(record)
+        if not form.is_valid():
+            raise ValueError(form.errors.get_json_data())
+        raw_items = record.get('items')
+        if not isinstance(raw_items, list) or not raw_items:
+            raise ValueError({'items': ['At least one item is required.']})
+        items = []
+        for index, raw_item in enumerate(raw_items):
+            item_form = IngestDealItemForm(raw_item if isinstance(raw_item, dict) else {})
+            if not item_form.is_valid():
+                raise ValueError({f'items[{index}]': item_form.errors.get_json_data()})
+            items.append(item_form.cleaned_data)
+        return kind, form.cleaned_data, items
+
+    raise ValueError({'type': ["Must be 'transaction' or 'deal'."]})
+
+
+def _resolve_partners(batch):
+    """Map each partner reference (id or GST number) used in a batch to a partner id."""
+    refs = {cleaned['partner'].strip() for _, _, cleaned, _ in batch}
+    ids = [int(ref) for ref in refs if ref.isdigit()]
+    gst_numbers = [ref.upper() for ref in refs]
+    resolved = {}
+    for pk, gst_number in Partner.objects.filter(Q(pk__in=ids) | Q(gst_number__in=gst_numbers)).values_list('pk', 'gst_number'):
+        resolved[str(pk)] = pk
+        resolved[gst_number.upper()] = pk
+    return {ref: resolved.get(ref) or resolved.get(ref.upper()) for ref in refs}
+
+
+def _assign_unique_references(deals):
+    """Regenerate deal references that collide within the batch or with existing deals."""
+    while True:
+        seen = set()
+        for deal in deals:
+            while deal.reference in seen:
+                deal.reference = generate_reference()
+            seen.add(deal.reference)
+        taken = set(Deal.objects.filter(reference__in=seen).values_list('reference', flat=True))
+        if not taken:
+            return
+        for deal in deals:
+            if deal.reference in taken:
+                deal.reference = generate_reference()
+
+
+def _apply_rollups(transactions, deals, items):
+    """Add a batch's bulk-inserted rows to the analytics rollups."""
+    deltas = rollups.Deltas()
+    for txn in transactions:
+        deltas.add_transaction(txn.partner_id, txn.date, txn.transaction_type, txn.amount)
+    deal_keys = {}
+    for deal in deals:
+        deal_keys[deal.pk] = (deal.partner_id, rollups.local_day(deal.created_at))
+        deltas.add(*deal_keys[deal.pk], deal_count=1)
+    for item in items:
+        deltas.add(*deal_keys[item.deal_id], commission=item.commission_total)
+    deltas.apply()
+
+
+def _commit_batch(batch):
+    """Bulk insert one batch of validated lines and stream their results."""
+    partner_ids = _resolve_partners(batch)
+    results = []
+    pending = []
+    for line_no, kind, cleaned, items in batch:
+        partner_id = partner_ids.get(cleaned['partner'].strip())
+        if partner_id is None:
+            results.append((line_no, _result(line_no, 'error', errors={'partner': ['Unknown partner.']})))
+        else:
+            pending.append((line_no, kind, cleaned, items, partner_id))
+
+    transactions = []
+    deals = []
+    deal_items = []
+    balance_deltas = defaultdict(Decimal)
+    for line_no, kind, cleaned, items, partner_id in pending:
+        if kind == 'transaction':
+            transactions.append(Transaction(
+                partner_id=partner_id,
+                transaction_type=cleaned['transaction_type'],
+                amount=cleaned['amount'],
+                date=cleaned['date'],
+                notes=cleaned['notes'],
+            ))
+            if cleaned['transaction_type'] == 'ADVANCE_RECEIVED':
+                balance_deltas[partner_id] += cleaned['amount']
+            else:
+                balance_deltas[partner_id] -= cleaned['amount']
+        else:
+            deal = Deal(partner_id=partner_id, client_name=cleaned['client_name'], status='SOURCING')
+            deals.append(deal)
+            deal_items.append((deal, items))
+
+    try:
+        with transaction.atomic():
+            if transactions:
+                bulk_create_with_history(transactions, Transaction)
+            if deals:
+                _assign_unique_references(deals)
+                bulk_create_with_history(deals, Deal)
+                items = [DealItem(deal_id=deal.pk, **data) for deal, item_data in deal_items for data in item_data]
+                bulk_create_with_history(items, DealItem)
+            # Signals do not fire for bulk inserts, so apply the balance effect here
+            # and record the partners' history rows that partner.save() would have
+            now = timezone.now()
+            changed = [partner_id for partner_id, delta in balance_deltas.items() if delta]
+            for partner_id in changed:
+                Partner.objects.filter(pk=partner_id).update(
+                    current_balance=F('current_balance') + Value(balance_deltas[partner_id], output_field=MoneyField()),
+                    updated_at=now,
+                )
+            if changed:
+                Partner.history.bulk_history_create(
+                    Partner.objects.filter(pk__in=changed), update=True,
+                    default_change_reason=CHANGE_REASON, default_date=now,
+                )
+            _apply_rollups(transactions, deals, items if deals else [])
+            publish_partner_change(*balance_deltas, *(deal.partner_id for deal in deals))
+    except DatabaseError as exc:
+        for line_no, *_ in pending:
+            results.append((line_no, _result(line_no, 'error', errors={'__all__': [f'Batch failed: {exc}']})))
+        return [line for _, line in sorted(results)], 0
+
+    for txn in transactions:
+        metrics.TRANSACTIONS_CREATED.inc_on_commit(type=txn.transaction_type)
+    metrics.BALANCE_UPDATES.inc_on_commit(sum(1 for delta in balance_deltas.values() if delta), source='ingest')
+    for _ in deals:
+        metrics.DEAL_STATUS_TRANSITIONS.inc_on_commit(**{'from': 'NEW', 'to': 'SOURCING'})
+
+    created = iter(transactions)
+    created_deals = iter(deals)
+    for line_no, kind, *_ in pending:
+        if kind == 'transaction':
+            results.append((line_no, _result(line_no, 'created', type=kind, id=next(created).pk)))
+        else:
+            deal = next(created_deals)
+            results.append((line_no, _result(line_no, 'created', type=kind, id=deal.pk, reference=deal.reference)))
+    return [line for _, line in sorted(results)], len(pending)
+
+
+def _ingest(lines, batch_size):
+    """Generator yielding NDJSON result lines while consuming the request body."""
+    batch = []
+    created = errors = 0
+    line_no = 0
+
+    def flush():
+        nonlocal batch, created, errors
+        results, committed = _commit_batch(batch)
+        created += committed
+        errors += len(batch) - committed
+        batch = []
+        return results
+
+    for line_no, raw in enumerate(lines, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            kind, cleaned, items = _validate(json.loads(raw))
+        except ValueError as exc:
+            errors += 1
+            detail = exc.args[0] if exc.args and isinstance(exc.args[0], dict) else {'__all__': ['Invalid JSON.']}
+            yield _result(line_no, 'error', errors=detail)
+            continue
+
+        batch.append((line_no, kind, cleaned, items))
+        if len(batch) >= batch_size:
+            yield from flush()
+
+    if batch:
+        yield from flush()
+    yield json.dumps({'summary': {'lines': line_no, 'created': created, 'errors': errors}}) + '\n'
+
+
+@csrf_exempt
+@require_POST
+def bulk_ingest(request):
+    """
+    Stream-ingest NDJSON transactions and deals, answering with one NDJSON result per line.
+    Requires `Authorization: Bearer <TRACKER_INGEST_TOKEN>`.
+    """
+    if not getattr(settings, 'TRACKER_INGEST_TOKEN', None):
+        return JsonResponse({'error': 'Ingest is disabled; set TRACKER_INGEST_TOKEN to enable it.'}, status=403)
+    if not _authorized(request):
+        return JsonResponse({'error': 'Invalid or missing token.'}, status=401)
+
+    response = StreamingHttpResponse(_ingest(request, _batch_size(request)), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-store'
+    return response
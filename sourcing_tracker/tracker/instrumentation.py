@@ -0,0 +1,202 @@
+"""
+Per-request SQL and latency instrumentation.
+
+RequestInstrumentationMiddleware samples a fraction of requests and, for each one,
+logs a JSON record to the `tracker.instrumentation` logger with:
+- the view name, method, status and total duration
+- query count and total SQL time
+- template render time (needs the InstrumentedDjangoTemplates backend)
+- duplicate-query fingerprints: the same SQL run repeatedly with different params
+
+A warning is logged when a fingerprint repeats more than N_PLUS_ONE_THRESHOLD times.
+Configured with the TRACKER_INSTRUMENTATION setting; SAMPLE_RATE 0 turns the log off.
+Every request, sampled or not, still feeds latency and query count into tracker.metrics.
+Queries run while a streaming response is being consumed are not counted.
+"""
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates
+
+from . import metrics
+
+logger = logging.getLogger('tracker.instrumentation')
+
+DEFAULTS = {
+    'SAMPLE_RATE': 1.0,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOW_REQUEST_MS': 1000,
+    'TOP_DUPLICATES': 5,
+}
+
+_stats = ContextVar('tracker_request_stats', default=None)
+
+# Collapse IN (%s, %s, ...) lists so batches of different sizes share a fingerprint
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TRACKER_INSTRUMENTATION', {})}
+
+
+def fingerprint(sql):
+    return _PLACEHOLDER_LIST.sub('(%s, ...)', ' '.join(sql.split()))
+
+
+class RequestStats:
+    """Counters collected for one request; query fingerprints only when `detailed`."""
+
+    def __init__(self, detailed=True):
+        self.detailed = detailed
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.fingerprints = Counter()
+
+    def add(self, other):
+        """Fold the counters of stats collected for part of this request into these."""
+        self.query_count += other.query_count
+        self.sql_time += other.sql_time
+        self.render_time += other.render_time
+        if self.detailed:
+            self.fingerprints.update(other.fingerprints)
+
+    def duplicates(self):
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > 1]
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sql_time += time.perf_counter() - start
+        stats.query_count += 1
+        if stats.detailed:
+            stats.fingerprints[fingerprint(sql)] += 1
+
+
+def _install_wrapper(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class _TimedTemplate:
+    """Wraps a backend template and adds its render time to the current request's stats."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        stats = _stats.get()
+        if stats is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.render_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates report render time to the instrumentation middleware."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+class RequestInstrumentationMiddleware:
+    """Log query counts, SQL/render time and duplicate queries for a sample of requests."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        connection_created.connect(_install_wrapper, dispatch_uid='tracker_instrumentation')
+        for connection in connections.all(initialized_only=True):
+            _install_wrapper(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        rate = self.config['SAMPLE_RATE']
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def _observe(self, request, response, stats, duration):
+        """Feed every request into the metrics registry; log the sampled ones."""
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        metrics.REQUEST_DURATION.observe(duration, view=view, method=request.method)
+        metrics.REQUEST_QUERIES.observe(stats.query_count, view=view)
+        if stats.detailed:
+            self._report(request, response, stats, duration)
+
+    def _report(self, request, response, stats, duration):
+        threshold = self.config['N_PLUS_ONE_THRESHOLD']
+        duplicates = stats.duplicates()
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'view': match.view_name if match else None,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'query_count': stats.query_count,
+            'sql_ms': round(stats.sql_time * 1000, 2),
+            'render_ms': round(stats.render_time * 1000, 2),
+            'duplicate_queries': [
+                {'sql': sql, 'count': count}
+                for sql, count in duplicates[:self.config['TOP_DUPLICATES']]
+            ],
+        }
+        n_plus_one = [item for item in record['duplicate_queries'] if item['count'] > threshold]
+        if n_plus_one:
+            logger.warning(json.dumps({**record, 'event': 'n_plus_one', 'threshold': threshold}))
+        elif record['duration_ms'] >= self.config['SLOW_REQUEST_MS']:
+            logger.warning(json.dumps({**record, 'event': 'slow_request'}))
+        else:
+            logger.info(json.dumps({**record, 'event': 'request'}))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats(detailed=self._sampled())
+        token = _stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        self._observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats(detailed=self._sampled())
+        token = _stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _stats.reset(token)
+        self._observe(request, response, stats, time.perf_counter() - start)
+        return response
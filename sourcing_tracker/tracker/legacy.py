@@ -0,0 +1,153 @@
+"""
+Conversion of legacy single-item deals into DealItems.
+
+Deals from before deal items carry their one item on the deal itself: item_name,
+quantity, estimated and actual cost and a commission percentage. `manage.py
+migrate_legacy_deals` gives each such deal (no items, a non-blank item_name) one
+DealItem. Its commission is what Deal.commission_amount gave for the deal,
+rounded to the paisa: a percentage of the actual cost, and nothing while the deal
+has none. An estimate only sets the item's price.
+
+Deals are converted in batches in id order. Each batch is one short transaction
+that locks its deals, checks again that they still have no items, bulk inserts
+the items (with history), checks that every partner's commission on the new items
+matches what the legacy fields gave (rolling the batch back if not) and adds it
+to the rollups. The same transaction moves the MigrationCheckpoint past the batch,
+so the command is safe while the site is live and an interrupted run resumes
+where it stopped.
+
+The legacy fields stay on the deal; actual_cost still drives the balance
+deduction. Once `legacy_deals()` is empty everywhere, the legacy branch of
+Deal.commission_amount and the deal templates can go.
+"""
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Exists, ExpressionWrapper, F, OuterRef, Sum
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
+
+from . import rollups
+from .fields import MoneyField
+from .models import Deal, DealItem, MigrationCheckpoint
+
+CHECKPOINT = 'legacy_deal_items'
+CHANGE_REASON = 'Converted from legacy deal fields'
+PAISE = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+LEGACY_FIELDS = ['id', 'partner_id', 'created_at', 'item_name', 'quantity',
+                 'estimated_cost', 'actual_cost', 'commission_percent']
+
+
+class CommissionMismatch(Exception):
+    """The items of a batch don't carry the commission of their legacy deals."""
+
+
+def legacy_deals():
+    """Deals whose item still lives in the legacy fields."""
+    return Deal.objects.exclude(item_name='').filter(~Exists(DealItem.objects.filter(deal=OuterRef('pk'))))
+
+
+def _divides(amount, quantity):
+    return not (amount * 100) % quantity
+
+
+def legacy_commission(deal):
+    """Deal.commission_amount of a legacy deal, rounded to the paisa."""
+    if not (deal.actual_cost and deal.commission_percent):
+        return ZERO
+    return (deal.actual_cost * deal.commission_percent / 100).quantize(PAISE, rounding=ROUND_HALF_UP)
+
+
+def legacy_item(deal):
+    """
+    The DealItem equivalent to a legacy deal. Its cost is the actual cost, or the
+    estimate while there is none, and its commission legacy_commission(): zero until
+    there is an actual cost. When the per-unit amounts would need fractions of a
+    paisa the item becomes one line of the whole quantity, so the totals are exact.
+    """
+    cost = deal.actual_cost if deal.actual_cost is not None else (deal.estimated_cost or ZERO)
+    commission = legacy_commission(deal)
+    name, quantity = deal.item_name, deal.quantity or 1
+    if quantity > 1 and not (_divides(cost, quantity) and _divides(commission, quantity)):
+        name, quantity = f'{name} (x{quantity})', 1
+    return DealItem(
+        deal_id=deal.pk,
+        item_name=name[:300],
+        quantity=quantity,
+        item_price=cost / quantity,
+        commission_per_item=commission / quantity,
+    )
+
+
+def get_checkpoint(restart=False):
+    checkpoint, created = MigrationCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    if restart and not created:
+        MigrationCheckpoint.objects.filter(pk=checkpoint.pk).update(
+            last_id=0, processed=0, converted=0, started_at=timezone.now(), finished_at=None,
+        )
+        checkpoint.refresh_from_db()
+    return checkpoint
+
+
+def _check_commission(deals):
+    """Raise CommissionMismatch unless each partner's new items carry its legacy commission."""
+    expected = defaultdict(lambda: ZERO)
+    for deal in deals:
+        expected[deal.partner_id] += legacy_commission(deal)
+    stored = dict(
+        DealItem.objects.filter(deal_id__in=[deal.pk for deal in deals])
+        .values_list('deal__partner_id')
+        .annotate(total=ExpressionWrapper(Sum(F('commission_per_item') * F('quantity')), output_field=MoneyField()))
+    )
+    wrong = {pk: (total, stored.get(pk, ZERO)) for pk, total in expected.items() if stored.get(pk, ZERO) != total}
+    if wrong:
+        raise CommissionMismatch(
+            'Commission changed for partner(s) ' + ', '.join(
+                f'{pk} ({before} -> {after})' for pk, (before, after) in sorted(wrong.items())
+            )
+        )
+
+
+def convert_batch(checkpoint, batch_size):
+    """
+    Convert the next `batch_size` legacy deals after the checkpoint and advance it.
+    Returns (deals looked at, deals converted), or None when none are left. Raises
+    CommissionMismatch, with nothing written, if the items would change a partner's
+    commission.
+    """
+    with transaction.atomic():
+        deals = list(
+            legacy_deals().filter(pk__gt=checkpoint.last_id).order_by('pk')
+            .select_for_update().only(*LEGACY_FIELDS)[:batch_size]
+        )
+        if not deals:
+            return None
+        # Items added since the select (by a deal edit) win over the legacy fields
+        taken = set(DealItem.objects.filter(deal_id__in=[deal.pk for deal in deals]).values_list('deal_id', flat=True))
+        converting = [deal for deal in deals if deal.pk not in taken]
+        items = [legacy_item(deal) for deal in converting]
+        if items:
+            bulk_create_with_history(items, DealItem, default_change_reason=CHANGE_REASON)
+            _check_commission(converting)
+            # bulk_create skips the item signals that keep the API's updated_since current
+            Deal.objects.filter(pk__in=[deal.pk for deal in converting]).update(updated_at=timezone.now())
+            if not rollups.is_suspended():
+                deltas = rollups.Deltas()
+                for deal, item in zip(converting, items):
+                    deltas.add(deal.partner_id, rollups.local_day(deal.created_at), commission=item.commission_total)
+                deltas.apply()
+        checkpoint.last_id = deals[-1].pk
+        MigrationCheckpoint.objects.filter(pk=checkpoint.pk).update(
+            last_id=checkpoint.last_id,
+            processed=F('processed') + len(deals),
+            converted=F('converted') + len(items),
+            updated_at=timezone.now(),
+        )
+    return len(deals), len(items)
+
+
+def finish(checkpoint):
+    MigrationCheckpoint.objects.filter(pk=checkpoint.pk).update(finished_at=timezone.now())
@@ -0,0 +1,188 @@
+"""
+Seeded synthetic data for benchmarks.
+
+`generate()` bulk-creates partners, transactions, deals and deal items with their
+history rows, and sets partner balances and the analytics rollups to match what
+the signals would have produced. The same seed and options always produce the same data set.
+"""
+import random
+import string
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
+
+from .models import (
+    Partner, Transaction, Deal, DealItem, PartnerEvent,
+    normalize_partner_name, FiscalYearClose, OpeningBalance,
+    ArchivedTransaction, ArchivedDeal, ArchivedDealItem, ArchivedHistoryRecord,
+    DailyPartnerRollup, MonthlyPartnerRollup,
+)
+from . import rollups
+
+STATUS_ORDER = [status for status, _ in Deal.STATUS_CHOICES]
+
+DEFAULT_STATUS_WEIGHTS = {
+    'SOURCING': 15, 'BOOKED': 10, 'IN_WAREHOUSE': 10, 'SHIPPED': 10, 'DELIVERED': 50, 'RETURNED': 5,
+}
+DEFAULT_ITEM_WEIGHTS = {0: 10, 1: 40, 2: 25, 3: 15, 5: 10}
+
+ITEM_NAMES = [
+    'Copper wire 2.5mm', 'MCB 32A', 'LED panel 18W', 'PVC conduit 25mm', 'Distribution board',
+    'Ceiling fan', 'Exhaust fan', 'Modular switch', 'Armoured cable 4C', 'Junction box',
+]
+CLIENT_NAMES = ['Sri Sai Builders', 'Apex Interiors', 'Nova Infra', 'Greenfield Homes', 'Metro Constructions']
+
+BATCH_SIZE = 2000
+
+
+def parse_weights(value, cast=str):
+    """Parse 'KEY:WEIGHT,KEY:WEIGHT' into a dict."""
+    weights = {}
+    for part in value.split(','):
+        key, _, weight = part.partition(':')
+        weights[cast(key.strip())] = int(weight or 1)
+    return weights
+
+
+def _gst_number(rng, index):
+    letters = ''
+    for _ in range(5):
+        index, remainder = divmod(index, 26)
+        letters += string.ascii_uppercase[remainder]
+    return f"{rng.randint(1, 37):02d}{letters}{rng.randint(0, 9999):04d}{rng.choice(string.ascii_uppercase)}1Z{rng.randint(0, 9)}"
+
+
+def _money(rng, low, high):
+    return Decimal(rng.randint(low * 100, high * 100)).scaleb(-2)
+
+
+@contextmanager
+def _explicit_timestamps(*models):
+    """Let bulk_create keep the backdated created_at/updated_at values we assign."""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def generate(partners=50, transactions=10000, deals=2000, days=730, seed=1,
+             status_weights=None, item_weights=None):
+    """Create the data set and return a dict of row counts."""
+    rng = random.Random(seed)
+    status_weights = status_weights or DEFAULT_STATUS_WEIGHTS
+    item_weights = item_weights or DEFAULT_ITEM_WEIGHTS
+    now = timezone.now()
+
+    def moment():
+        return now - timedelta(days=rng.random() * days)
+
+    with transaction.atomic(), _explicit_timestamps(Transaction, Deal):
+        names = [f"Partner {index + 1:04d}" for index in range(partners)]
+        # bulk_create skips Partner.save(), which is what fills search_name
+        partner_objs = bulk_create_with_history([
+            Partner(name=name, search_name=normalize_partner_name(name), gst_number=_gst_number(rng, index),
+                    contact_info=f"+91 9{rng.randint(0, 999999999):09d}")
+            for index, name in enumerate(names)
+        ], Partner, batch_size=BATCH_SIZE)
+        partner_ids = [partner.pk for partner in partner_objs]
+        balances = defaultdict(Decimal)
+
+        txn_objs = []
+        for _ in range(transactions):
+            created_at = moment()
+            txn = Transaction(
+                partner_id=rng.choice(partner_ids),
+                transaction_type='ADVANCE_RECEIVED' if rng.random() < 0.85 else 'REFUND_GIVEN',
+                amount=_money(rng, 500, 250000),
+                date=timezone.localtime(created_at).date(),
+                notes=rng.choice(['', '', 'NEFT', 'UPI', 'Cheque']),
+            )
+            txn.created_at = txn.updated_at = created_at
+            balances[txn.partner_id] += txn.amount if txn.transaction_type == 'ADVANCE_RECEIVED' else -txn.amount
+            txn_objs.append(txn)
+        txn_objs = bulk_create_with_history(txn_objs, Transaction, batch_size=BATCH_SIZE)
+
+        statuses, status_w = zip(*status_weights.items())
+        item_counts, item_w = zip(*item_weights.items())
+        deal_objs, item_plan = [], []
+        for index in range(deals):
+            created_at = moment()
+            status = rng.choices(statuses, status_w)[0]
+            deal = Deal(
+                reference=f"DEAL-{timezone.localtime(created_at):%Y%m%d}-{index:05X}",
+                partner_id=rng.choice(partner_ids),
+                client_name=rng.choice(CLIENT_NAMES),
+                status=status,
+                estimated_cost=_money(rng, 1000, 200000),
+            )
+            if STATUS_ORDER.index(status) >= STATUS_ORDER.index('BOOKED'):
+                deal.actual_cost = _money(rng, 1000, 200000)
+                deal.cost_deducted = True
+                balances[deal.partner_id] -= deal.actual_cost
+            if STATUS_ORDER.index(status) >= STATUS_ORDER.index('SHIPPED'):
+                deal.tracking_id = f"TRK{rng.randint(0, 10 ** 9):09d}"
+                deal.courier_partner = rng.choice(['Blue Dart', 'DTDC', 'Delhivery'])
+            deal.created_at = deal.updated_at = created_at
+            deal_objs.append(deal)
+            item_plan.append(rng.choices(item_counts, item_w)[0])
+        deal_objs = bulk_create_with_history(deal_objs, Deal, batch_size=BATCH_SIZE)
+
+        # One '~' history row per status the deal passed through on the way
+        progress = []
+        for deal in deal_objs:
+            for status in STATUS_ORDER[1:STATUS_ORDER.index(deal.status)]:
+                step = Deal(**{field.attname: getattr(deal, field.attname) for field in Deal._meta.concrete_fields})
+                step.status = status
+                progress.append(step)
+        Deal.history.bulk_history_create(progress, update=True, batch_size=BATCH_SIZE)
+
+        items = [
+            DealItem(
+                deal=deal,
+                item_name=rng.choice(ITEM_NAMES),
+                quantity=rng.randint(1, 50),
+                item_price=_money(rng, 50, 20000),
+                commission_per_item=_money(rng, 0, 500),
+            )
+            for deal, count in zip(deal_objs, item_plan)
+            for _ in range(count)
+        ]
+        bulk_create_with_history(items, DealItem, batch_size=BATCH_SIZE)
+
+        for partner in partner_objs:
+            partner.current_balance = balances[partner.pk]
+        Partner.objects.bulk_update(partner_objs, ['current_balance'], batch_size=BATCH_SIZE)
+        rollups.rebuild()
+
+    return {
+        'partners': len(partner_objs),
+        'transactions': len(txn_objs),
+        'deals': len(deal_objs),
+        'deal_items': len(items),
+        'deal_history_updates': len(progress),
+    }
+
+
+def flush():
+    """Delete all tracker data, archives and history."""
+    with transaction.atomic(), rollups.suspended():
+        for model in (ArchivedHistoryRecord, ArchivedDealItem, ArchivedDeal, ArchivedTransaction,
+                      OpeningBalance, FiscalYearClose, PartnerEvent, DailyPartnerRollup, MonthlyPartnerRollup):
+            model.objects.all().delete()
+        for model in (DealItem, Deal, Transaction, Partner):
+            model.objects.all().delete()
+            # After the rows, so the '-' entries their deletion recorded go too
+            model.history.all().delete()
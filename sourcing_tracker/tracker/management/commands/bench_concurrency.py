@@ -0,0 +1,104 @@
+"""
+Measure concurrent read throughput of a running tracker deployment.
+
+Run the same code under both entry points, then point this command at each:
+
+    uvicorn sourcing_tracker.asgi:application --port 8001 --workers 1
+    gunicorn sourcing_tracker.wsgi:application --bind :8002 --workers 1 --threads 8
+
+    python manage.py bench_concurrency --target asgi=http://127.0.0.1:8001 \
+        --target wsgi=http://127.0.0.1:8002 --concurrency 64 --requests 2000
+"""
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ['/', '/ledger/', '/logistics/', '/ledger/export/', '/api/transactions/']
+
+
+def _fetch(url, timeout):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            size = len(response.read())
+            status = response.status
+    except urllib.error.HTTPError as exc:
+        size, status = 0, exc.code
+    except (urllib.error.URLError, TimeoutError, ConnectionError):
+        size, status = 0, None
+    return time.perf_counter() - started, status, size
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent throughput of running ASGI/WSGI servers for the read-heavy views.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True,
+            help='name=base_url of a running server, e.g. asgi=http://127.0.0.1:8001 (repeatable)',
+        )
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request (repeatable)')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per path')
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, base_url = target.partition('=')
+            if not sep or not base_url:
+                raise CommandError(f'Invalid --target "{target}", expected name=base_url.')
+            targets.append((name, base_url.rstrip('/')))
+
+        paths = options['paths'] or DEFAULT_PATHS
+        results = []
+        for name, base_url in targets:
+            for path in paths:
+                result = self._run(name, base_url + path, options)
+                result['path'] = path
+                results.append(result)
+                self.stdout.write(
+                    f"{name:<8} {path:<24} {result['throughput']:>9.1f} req/s  "
+                    f"p50 {result['p50_ms']:>8.1f} ms  p95 {result['p95_ms']:>8.1f} ms  "
+                    f"errors {result['errors']}"
+                )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
+
+    def _run(self, name, url, options):
+        total = options['requests']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            samples = list(pool.map(lambda _: _fetch(url, options['timeout']), range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency for latency, status, _ in samples if status == 200]
+        return {
+            'target': name,
+            'url': url,
+            'requests': total,
+            'concurrency': options['concurrency'],
+            'errors': total - len(latencies),
+            'throughput': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': _percentile(latencies, 50) * 1000,
+            'p95_ms': _percentile(latencies, 95) * 1000,
+            'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+            'bytes': sum(size for _, _, size in samples),
+        }
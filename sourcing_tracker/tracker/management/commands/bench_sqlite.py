@@ -0,0 +1,146 @@
+"""
+Concurrent read/write benchmark for the SQLite connection profile.
+
+Runs the same mixed workload against a scratch database twice: once with SQLite's
+defaults (rollback journal, deferred transactions) and once with the tuned profile
+from settings.SQLITE_PRAGMAS plus BEGIN IMMEDIATE. Writers mimic the balance signal:
+read the partner balance, insert a transaction, update the balance.
+
+    python manage.py bench_sqlite --writers 4 --readers 8 --seconds 10
+"""
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+PROFILES = {
+    'default': {'pragmas': {}, 'begin': 'BEGIN'},
+    'tuned': {'pragmas': settings.SQLITE_PRAGMAS, 'begin': 'BEGIN IMMEDIATE'},
+}
+
+
+def _connect(path, profile):
+    # The driver's default 5s lock wait, unless the pragmas set busy_timeout
+    conn = sqlite3.connect(path, isolation_level=None)
+    for name, value in profile['pragmas'].items():
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+def _seed(path, partners, rows):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.executescript('''
+        CREATE TABLE partner (id INTEGER PRIMARY KEY, balance INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE txn (id INTEGER PRIMARY KEY, partner_id INTEGER NOT NULL, amount INTEGER NOT NULL, date TEXT NOT NULL);
+        CREATE INDEX txn_partner ON txn (partner_id, date);
+    ''')
+    conn.execute('BEGIN')
+    conn.executemany('INSERT INTO partner (id) VALUES (?)', [(pk,) for pk in range(1, partners + 1)])
+    conn.executemany(
+        'INSERT INTO txn (partner_id, amount, date) VALUES (?, ?, ?)',
+        ((random.randint(1, partners), random.randint(100, 100000), f'2025-{random.randint(1, 12):02d}-01') for _ in range(rows)),
+    )
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def _writer(path, profile, partners, deadline, results):
+    conn = _connect(path, profile)
+    ops = errors = 0
+    while time.monotonic() < deadline:
+        partner_id = random.randint(1, partners)
+        amount = random.randint(100, 100000)
+        try:
+            conn.execute(profile['begin'])
+            (balance,) = conn.execute('SELECT balance FROM partner WHERE id = ?', (partner_id,)).fetchone()
+            conn.execute('INSERT INTO txn (partner_id, amount, date) VALUES (?, ?, date())', (partner_id, amount))
+            conn.execute('UPDATE partner SET balance = ? WHERE id = ?', (balance + amount, partner_id))
+            conn.execute('COMMIT')
+            ops += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    results.put(('write', ops, errors))
+
+
+def _reader(path, profile, partners, deadline, results):
+    conn = _connect(path, profile)
+    ops = errors = 0
+    while time.monotonic() < deadline:
+        try:
+            conn.execute(
+                'SELECT COUNT(*), SUM(amount) FROM txn WHERE partner_id = ? AND date >= ?',
+                (random.randint(1, partners), '2025-06-01'),
+            ).fetchone()
+            conn.execute('SELECT SUM(balance) FROM partner').fetchone()
+            ops += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(('read', ops, errors))
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent read/write throughput of default SQLite settings against the tuned profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=10.0)
+        parser.add_argument('--partners', type=int, default=500)
+        parser.add_argument('--rows', type=int, default=200000, help='Transactions seeded before the run')
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, profile in PROFILES.items():
+            results[name] = self._run(profile, options)
+            stats = results[name]
+            self.stdout.write(
+                f"{name:<8} writes {stats['writes_per_sec']:>9.1f}/s ({stats['write_errors']} locked)  "
+                f"reads {stats['reads_per_sec']:>9.1f}/s ({stats['read_errors']} locked)"
+            )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
+
+    def _run(self, profile, options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            _seed(path, options['partners'], options['rows'])
+            if profile['pragmas'].get('journal_mode'):
+                _connect(path, profile).close()
+
+            results = multiprocessing.Queue()
+            deadline = time.monotonic() + options['seconds']
+            workers = [
+                multiprocessing.Process(target=_writer, args=(path, profile, options['partners'], deadline, results))
+                for _ in range(options['writers'])
+            ] + [
+                multiprocessing.Process(target=_reader, args=(path, profile, options['partners'], deadline, results))
+                for _ in range(options['readers'])
+            ]
+            for worker in workers:
+                worker.start()
+            totals = {'write': [0, 0], 'read': [0, 0]}
+            for _ in workers:
+                kind, ops, errors = results.get()
+                totals[kind][0] += ops
+                totals[kind][1] += errors
+            for worker in workers:
+                worker.join()
+
+        return {
+            'writes_per_sec': totals['write'][0] / options['seconds'],
+            'write_errors': totals['write'][1],
+            'reads_per_sec': totals['read'][0] / options['seconds'],
+            'read_errors': totals['read'][1],
+        }
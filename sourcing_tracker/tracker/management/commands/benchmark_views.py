@@ -0,0 +1,194 @@
+"""
+End-to-end benchmark of the tracker views through the Django test client.
+
+For each dataset size a throwaway test database is created, filled with
+generate_load_data's seeded generator, and every view is requested repeatedly.
+Reports p50/p95 latency, query count and peak Python memory per view, and can
+write the results as JSON and compare them with a previous run.
+
+    python manage.py benchmark_views --sizes small,medium --iterations 10 --json before.json
+    python manage.py benchmark_views --sizes small,medium --json after.json --compare before.json
+"""
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+import warnings
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, reset_queries
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from tracker.loadgen import generate
+from tracker.models import Partner, Deal
+
+SIZES = {
+    'small': {'partners': 10, 'transactions': 1000, 'deals': 200},
+    'medium': {'partners': 50, 'transactions': 5000, 'deals': 1000},
+    'large': {'partners': 200, 'transactions': 20000, 'deals': 5000},
+}
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _cases():
+    """(name, url) pairs for the views under test, using ids from the current data set."""
+    partner_id = Partner.objects.order_by('pk').values_list('pk', flat=True).first()
+    deal_id = Deal.objects.filter(status='DELIVERED').order_by('pk').values_list('pk', flat=True).first()
+    cases = [
+        ('dashboard', reverse('dashboard')),
+        ('ledger', reverse('ledger')),
+        ('ledger_this_month', reverse('ledger') + '?date_filter=this_month'),
+        ('ledger_partner', reverse('ledger') + f'?partner={partner_id}'),
+        ('export_ledger_csv', reverse('export_ledger_csv')),
+        ('procurement', reverse('procurement')),
+        ('logistics', reverse('logistics')),
+    ]
+    if deal_id:
+        cases.append(('commission_invoice', reverse('commission_invoice', args=[deal_id])))
+    return cases
+
+
+def _request(client, url):
+    response = client.get(url)
+    # Streaming responses only do their work while being consumed
+    if response.streaming:
+        b''.join(response)
+    return response
+
+
+def _measure(client, url, iterations, warmup):
+    for _ in range(warmup):
+        _request(client, url)
+
+    timings = []
+    # The query log is a bounded deque that data generation has already filled
+    reset_queries()
+    with ExitStack() as stack:
+        # Every alias, so reads routed to a replica are counted too
+        captures = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        start = time.perf_counter()
+        response = _request(client, url)
+        timings.append(time.perf_counter() - start)
+    # Count now: every later request resets the query logs the captures slice
+    query_count = sum(len(queries) for queries in captures)
+    for _ in range(iterations - 1):
+        start = time.perf_counter()
+        _request(client, url)
+        timings.append(time.perf_counter() - start)
+
+    # Separate pass: tracemalloc slows everything down, so keep it out of the timings
+    tracemalloc.start()
+    try:
+        _request(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'p50_ms': round(_percentile(timings, 50) * 1000, 2),
+        'p95_ms': round(_percentile(timings, 95) * 1000, 2),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+        'queries': query_count,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every tracker view at several dataset sizes and report latency, queries and memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium', help=f"Comma-separated presets: {', '.join(SIZES)}.")
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--view', action='append', dest='views', help='Only run this view (repeatable).')
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+        parser.add_argument('--compare', help='Print the change against a previous JSON results file.')
+
+    def handle(self, *args, **options):
+        # The test client consumes async streaming views synchronously; that is expected here
+        warnings.filterwarnings('ignore', message='StreamingHttpResponse must consume asynchronous iterators')
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in SIZES]
+        if unknown:
+            raise CommandError(f"Unknown size(s): {', '.join(unknown)}. Choose from {', '.join(SIZES)}.")
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as fh:
+                baseline = json.load(fh)
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'seed': options['seed'],
+            'iterations': options['iterations'],
+            'sizes': {},
+        }
+        for size in sizes:
+            report['sizes'][size] = self._run_size(size, options)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"Wrote {options['json_path']}")
+        if baseline:
+            self._compare(baseline, report)
+
+    def _run_size(self, size, options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            rows = generate(seed=options['seed'], **SIZES[size])
+            # Keep instrumentation logging out of the measurements
+            with override_settings(TRACKER_INSTRUMENTATION={'SAMPLE_RATE': 0},
+                                   ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                client = Client()
+                results = {}
+                for name, url in _cases():
+                    if options['views'] and name not in options['views']:
+                        continue
+                    results[name] = _measure(client, url, options['iterations'], options['warmup'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{size}: " + ', '.join(f'{count} {name.replace("_", " ")}' for name, count in rows.items())
+        ))
+        self.stdout.write(f"  {'view':<22}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'peak KB':>11}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"  {name:<22}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['queries']:>9}{result['peak_kb']:>11}"
+            )
+        return {'rows': rows, 'views': results}
+
+    def _compare(self, baseline, report):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Change against {baseline.get('created_at', 'baseline')}"))
+        for size, current in report['sizes'].items():
+            previous = baseline.get('sizes', {}).get(size)
+            if not previous:
+                continue
+            self.stdout.write(f'{size}:')
+            for name, result in current['views'].items():
+                before = previous['views'].get(name)
+                if not before:
+                    continue
+                change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+                self.stdout.write(
+                    f"  {name:<22}p50 {before['p50_ms']} -> {result['p50_ms']} ms ({change:+.1f}%), "
+                    f"queries {before['queries']} -> {result['queries']}"
+                )
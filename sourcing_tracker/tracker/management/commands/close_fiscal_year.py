@@ -0,0 +1,33 @@
+"""
+Close an Indian fiscal year and archive its settled rows.
+
+    python manage.py close_fiscal_year 2024            # closes FY 2024-25
+    python manage.py close_fiscal_year 2024 --dry-run  # only report what would move
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.archive import FiscalYearError, close_fiscal_year
+
+
+class Command(BaseCommand):
+    help = 'Close a fiscal year: record opening balances and archive its transactions and settled deals.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fiscal_year', type=int, help='Starting calendar year, e.g. 2024 for FY 2024-25.')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be archived without changing anything.')
+
+    def handle(self, *args, **options):
+        try:
+            close = close_fiscal_year(options['fiscal_year'], dry_run=options['dry_run'])
+        except FiscalYearError as exc:
+            raise CommandError(str(exc))
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(
+            f'{verb} {close.transactions_archived} transactions, {close.deals_archived} deals and '
+            f'{close.deal_items_archived} deal items through {close.end_date}.'
+        )
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Closed FY {close.label}; moved {close.history_archived} history rows.'
+            ))
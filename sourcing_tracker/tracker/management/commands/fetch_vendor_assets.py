@@ -0,0 +1,62 @@
+"""
+Extract the pinned front-end libraries into tracker/static/tracker/vendor/.
+
+    python manage.py fetch_vendor_assets          # only the missing files
+    python manage.py fetch_vendor_assets --force  # re-extract everything
+
+Each file is taken from the PyPI distribution listed in tracker.assets.VENDOR_ASSETS
+and must match the sha256 recorded there. Commit the extracted files with the app,
+and run this again after changing a version in tracker.assets. sourceMappingURL
+comments are stripped because the .map files are not vendored and
+ManifestStaticFilesStorage refuses references to missing files.
+"""
+import hashlib
+import io
+import re
+import urllib.request
+import zipfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.assets import VENDOR_ASSETS
+
+STATIC_DIR = Path(__file__).resolve().parents[2] / 'static'
+SOURCE_MAP = re.compile(rb'\n?(/\*# sourceMappingURL=[^*]*\*/|//# sourceMappingURL=\S*)\s*$')
+
+
+class Command(BaseCommand):
+    help = 'Extract Bootstrap, Bootstrap Icons and Inter into the static files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Extract files that already exist too.')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        archives = {}
+        fetched = 0
+        for name, (url, member, sha256) in VENDOR_ASSETS.items():
+            path = STATIC_DIR / name
+            if path.exists() and not options['force']:
+                continue
+            if url not in archives:
+                try:
+                    with urllib.request.urlopen(url, timeout=options['timeout']) as response:
+                        archives[url] = zipfile.ZipFile(io.BytesIO(response.read()))
+                except (OSError, zipfile.BadZipFile) as exc:
+                    raise CommandError(f'Could not download {url}: {exc}')
+            try:
+                data = archives[url].read(member)
+            except KeyError:
+                raise CommandError(f'{member} is not in {url}')
+            if hashlib.sha256(data).hexdigest() != sha256:
+                raise CommandError(f'{member} from {url} does not match its pinned sha256.')
+            if path.suffix in ('.css', '.js'):
+                data = SOURCE_MAP.sub(b'\n', data)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            fetched += 1
+            self.stdout.write(f'{name}  {len(data) / 1024:.1f} KB  sha256 {hashlib.sha256(data).hexdigest()}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Fetched {fetched} file(s); {len(VENDOR_ASSETS) - fetched} already present.'
+        ))
@@ -0,0 +1,62 @@
+"""
+Bulk-create a realistic, seeded data set for benchmarking.
+
+    python manage.py generate_load_data --partners 50 --transactions 10000 --deals 2000 --seed 1
+    python manage.py generate_load_data --flush --statuses DELIVERED:70,SHIPPED:30 --items-per-deal 1:50,3:50
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.loadgen import DEFAULT_ITEM_WEIGHTS, DEFAULT_STATUS_WEIGHTS, STATUS_ORDER, flush, generate, parse_weights
+from tracker.models import Partner
+
+
+def _format_weights(weights):
+    return ','.join(f'{key}:{weight}' for key, weight in weights.items())
+
+
+class Command(BaseCommand):
+    help = 'Generate seeded partners, transactions, deals, deal items and history rows for benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partners', type=int, default=50)
+        parser.add_argument('--transactions', type=int, default=10000)
+        parser.add_argument('--deals', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=730, help='Spread dates over this many past days.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--statuses', default=_format_weights(DEFAULT_STATUS_WEIGHTS),
+            help='Deal status distribution as STATUS:WEIGHT pairs.',
+        )
+        parser.add_argument(
+            '--items-per-deal', default=_format_weights(DEFAULT_ITEM_WEIGHTS),
+            help='Items-per-deal distribution as COUNT:WEIGHT pairs.',
+        )
+        parser.add_argument('--flush', action='store_true', help='Delete all existing tracker data first.')
+
+    def handle(self, *args, **options):
+        try:
+            statuses = parse_weights(options['statuses'])
+            items_per_deal = parse_weights(options['items_per_deal'], int)
+        except ValueError as exc:
+            raise CommandError(f'Invalid distribution: {exc}')
+        unknown = set(statuses) - set(STATUS_ORDER)
+        if unknown:
+            raise CommandError(f"Unknown deal status(es): {', '.join(sorted(unknown))}.")
+
+        if options['flush']:
+            flush()
+        elif Partner.objects.exists():
+            raise CommandError('The database already has partners; pass --flush to replace them.')
+
+        counts = generate(
+            partners=options['partners'],
+            transactions=options['transactions'],
+            deals=options['deals'],
+            days=options['days'],
+            seed=options['seed'],
+            status_weights=statuses,
+            item_weights=items_per_deal,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Created ' + ', '.join(f'{count} {name.replace("_", " ")}' for name, count in counts.items()) + '.'
+        ))
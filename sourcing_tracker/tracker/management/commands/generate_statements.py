@@ -0,0 +1,108 @@
+"""
+Generate every partner's monthly statement as CSV (and PDF with reportlab installed).
+
+    python manage.py generate_statements 2025-03                   # CSV, all CPUs
+    python manage.py generate_statements 2025-03 --format csv,pdf --workers 4
+    python manage.py generate_statements 2025-03 --force           # replace an earlier run
+
+Statements are built in this process from a few queries, then rendered by a pool of
+worker processes into TRACKER_STATEMENTS_DIR/<YYYY-MM>/, with an index.csv of
+every partner's totals. The directory only appears once all files are written.
+"""
+import csv
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from tracker import statements as engine
+
+PERIOD = re.compile(r'^(\d{4})-(\d{2})$')
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = 'Write monthly statements (opening balance, entries, running and closing balance) for all partners.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('period', help='Month to report, as YYYY-MM.')
+        parser.add_argument('--format', default='csv', help='Comma-separated formats: csv, pdf.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Rendering processes; 0 renders in this process.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Statements per worker task.')
+        parser.add_argument('--output', help='Base directory (default: TRACKER_STATEMENTS_DIR).')
+        parser.add_argument('--include-inactive', action='store_true',
+                            help='Also write statements for partners with no entries and a zero balance.')
+        parser.add_argument('--force', action='store_true', help='Replace statements already generated for the period.')
+
+    def handle(self, *args, **options):
+        match = PERIOD.match(options['period'])
+        if not match or not 1 <= int(match[2]) <= 12:
+            raise CommandError('Period must be YYYY-MM, e.g. 2025-03.')
+        formats = [fmt.strip() for fmt in options['format'].split(',') if fmt.strip()]
+        unknown = set(formats) - set(engine.WRITERS)
+        if not formats or unknown:
+            raise CommandError(f"Unknown format(s): {', '.join(sorted(unknown)) or '(none)'}; use csv and/or pdf.")
+        if 'pdf' in formats and engine.A4 is None:
+            raise CommandError('PDF statements need the reportlab package (pip install reportlab).')
+
+        base = engine.statements_dir() if not options['output'] else Path(options['output'])
+        target = base / options['period']
+        if target.exists() and not options['force']:
+            raise CommandError(f'{target} already exists; use --force to replace it.')
+
+        started = time.perf_counter()
+        start, end = engine.month_bounds(int(match[1]), int(match[2]))
+        statements = engine.build_statements(start, end, include_inactive=options['include_inactive'])
+        built = time.perf_counter()
+
+        partial = base / f'.{options["period"]}.partial'
+        shutil.rmtree(partial, ignore_errors=True)
+        partial.mkdir(parents=True)
+        written = dict(self._render(statements, partial, formats, options['workers'], options['batch_size']))
+        self._write_index(statements, written, partial / 'index.csv')
+
+        if target.exists():
+            shutil.rmtree(target)
+        partial.rename(target)
+        finished = time.perf_counter()
+        self.stdout.write(
+            f'Built {len(statements)} statements in {built - started:.1f}s; '
+            f'rendered {sum(len(files) for files in written.values())} files in {finished - built:.1f}s.'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Statements for {start:%B %Y} written to {target}'))
+
+    def _render(self, statements, directory, formats, workers, batch_size):
+        batches = list(_batches(statements, max(1, batch_size)))
+        if workers <= 0 or len(batches) <= 1:
+            for batch in batches:
+                yield from engine.render_statements(batch, directory, formats)
+            return
+        # Workers must not inherit this process's open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            futures = [pool.submit(engine.render_statements, batch, directory, formats) for batch in batches]
+            for future in futures:
+                yield from future.result()
+
+    def _write_index(self, statements, written, path):
+        with open(path, 'w', newline='', encoding='utf-8') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(['Partner', 'GST Number', 'Opening', 'Credits', 'Debits', 'Closing', 'Entries', 'Files'])
+            for statement in statements:
+                writer.writerow([
+                    statement.name, statement.gst_number,
+                    engine.format_amount(statement.opening), engine.format_amount(statement.credits),
+                    engine.format_amount(statement.debits), engine.format_amount(statement.closing),
+                    len(statement.lines), ' '.join(written.get(statement.partner_id, [])),
+                ])
@@ -0,0 +1,69 @@
+"""
+Convert legacy single-item deals into DealItems, in resumable batches.
+
+    python manage.py migrate_legacy_deals --dry-run          # count and preview
+    python manage.py migrate_legacy_deals                    # run (or resume) to the end
+    python manage.py migrate_legacy_deals --max-batches 20   # stop after 20 batches
+    python manage.py migrate_legacy_deals --restart          # scan again from the first deal
+
+Batches are short transactions separated by --pause seconds, so the site keeps
+working while it runs. Progress is kept in the legacy_deal_items MigrationCheckpoint;
+see tracker.legacy.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import legacy
+
+
+class Command(BaseCommand):
+    help = 'Give every legacy deal (item in the deal fields) an equivalent DealItem.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Deals per batch transaction.')
+        parser.add_argument('--pause', type=float, default=0.2, help='Seconds to wait between batches.')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches; run again to resume.')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the first deal.')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would be converted without writing.')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            return self._preview()
+
+        checkpoint = legacy.get_checkpoint(restart=options['restart'])
+        if checkpoint.last_id:
+            self.stdout.write(f'Resuming after deal id {checkpoint.last_id} ({checkpoint.converted} converted so far).')
+        started = time.perf_counter()
+        batches = processed = converted = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            try:
+                result = legacy.convert_batch(checkpoint, max(1, options['batch_size']))
+            except legacy.CommissionMismatch as exc:
+                raise CommandError(f'Batch after deal id {checkpoint.last_id} rolled back: {exc}')
+            if result is None:
+                legacy.finish(checkpoint)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Converted {converted} legacy deals ({processed} checked) in {time.perf_counter() - started:.1f}s; '
+                    f'none left.'
+                ))
+                return
+            batches += 1
+            processed += result[0]
+            converted += result[1]
+            self.stdout.write(f'Batch {batches}: {result[1]}/{result[0]} converted, through deal id {checkpoint.last_id}')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.WARNING(
+            f'Stopped after {batches} batches ({converted} converted); run again to resume after deal id {checkpoint.last_id}.'
+        ))
+
+    def _preview(self):
+        deals = legacy.legacy_deals().order_by('pk').only(*legacy.LEGACY_FIELDS, 'reference')
+        self.stdout.write(f'{deals.count()} legacy deals to convert.')
+        for deal in deals[:10]:
+            item = legacy.legacy_item(deal)
+            self.stdout.write(
+                f'  {deal.reference}: {item.item_name} x{item.quantity} @ {item.item_price}, '
+                f'commission {item.commission_per_item}/item'
+            )
@@ -0,0 +1,62 @@
+"""
+Run background export workers.
+
+    python manage.py run_workers                 # TRACKER_EXPORT_WORKERS processes, until stopped
+    python manage.py run_workers --workers 4
+    python manage.py run_workers --once          # run what is queued, then exit (e.g. from cron)
+
+Each worker process claims queued ExportJobs oldest first and writes their files to
+media storage. On SIGINT/SIGTERM the workers finish the job in hand and exit; a
+worker killed mid-job leaves a running job that is queued again after
+tracker.exports.STALE_AFTER seconds without progress.
+"""
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tracker import exports
+
+
+class Command(BaseCommand):
+    help = 'Run worker processes that write queued background exports.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'TRACKER_EXPORT_WORKERS', 2),
+                            help='Worker processes; 0 runs jobs in this process.')
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'TRACKER_EXPORT_POLL_INTERVAL', 2),
+                            help='Seconds an idle worker waits before checking the queue again.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        purged = exports.purge_expired()
+        if purged:
+            self.stdout.write(f'Deleted {purged} expired export(s).')
+
+        stop = multiprocessing.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        workers = options['workers']
+        if workers <= 0:
+            exports.work(0, stop, options['poll_interval'], once=options['once'])
+            return
+
+        # Workers must not inherit this process's open database connections
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=exports.work, args=(number, stop, options['poll_interval'], options['once']),
+                name=f'export-worker-{number}',
+            )
+            for number in range(1, workers + 1)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f'Started {workers} export worker(s).')
+        for process in processes:
+            process.join()
+        self.stdout.write(self.style.SUCCESS('Export workers stopped.'))
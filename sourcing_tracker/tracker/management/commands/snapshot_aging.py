@@ -0,0 +1,40 @@
+"""
+Store the advance aging snapshot read by the aging report. Run nightly, e.g. from cron:
+
+    15 0 * * *  python manage.py snapshot_aging                    # as of yesterday
+    python manage.py snapshot_aging --date 2025-03-31               # any past date
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from tracker.aging import compute_aging, save_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Compute FIFO advance aging for every partner and store it as a snapshot.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Report date as YYYY-MM-DD (default: yesterday, the last full day).')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['date']:
+            try:
+                as_of = parse_date(options['date'])
+            except ValueError:
+                as_of = None
+            if as_of is None:
+                raise CommandError('Date must be YYYY-MM-DD.')
+            if as_of > today:
+                raise CommandError('Cannot age advances as of a future date.')
+        else:
+            as_of = today - timedelta(days=1)
+
+        report = compute_aging(as_of)
+        save_snapshot(report)
+        buckets = ', '.join(f'{label}: {amount:.2f}' for label, amount in report.total_rows)
+        self.stdout.write(f'{len(report.partners)} partners; {buckets}; overdrawn {report.overdrawn:.2f}')
+        self.stdout.write(self.style.SUCCESS(f'Saved aging snapshot as of {as_of}.'))
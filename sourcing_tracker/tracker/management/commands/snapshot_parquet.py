@@ -0,0 +1,47 @@
+"""
+Write the tracker's tables to typed, compressed Parquet files for offline analysis.
+
+    python manage.py snapshot_parquet                   # full snapshot of all tables
+    python manage.py snapshot_parquet --incremental     # only rows changed since the last run
+    python manage.py snapshot_parquet --history --compression snappy
+
+Needs the pyarrow package. Files go to TRACKER_PARQUET_DIR/<table>/; see
+tracker.parquet for what an incremental snapshot includes.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import parquet
+
+
+class Command(BaseCommand):
+    help = 'Snapshot partners, transactions, deals and deal items (optionally history) to Parquet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Append only rows changed since the previous snapshot (full if there is none).')
+        parser.add_argument('--history', action='store_true', help='Also write the change history tables.')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Rows read and written per row group.')
+        parser.add_argument('--compression', choices=parquet.COMPRESSIONS, default='zstd')
+        parser.add_argument('--output', help='Directory (default: TRACKER_PARQUET_DIR).')
+
+    def handle(self, *args, **options):
+        if parquet.pa is None:
+            raise CommandError('Parquet snapshots need the pyarrow package (pip install pyarrow).')
+        directory = options['output'] or parquet.parquet_dir()
+        incremental = options['incremental'] and parquet.read_manifest(directory) is not None
+        if options['incremental'] and not incremental:
+            self.stdout.write('No previous snapshot found; writing a full one.')
+
+        started = time.perf_counter()
+        written = parquet.snapshot(
+            directory, incremental=incremental, history=options['history'],
+            batch_size=max(1, options['batch_size']), compression=options['compression'],
+        )
+        for name, rows in written.items():
+            self.stdout.write(f'  {name}: {rows} rows')
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Incremental' if incremental else 'Full'} snapshot of {sum(written.values())} rows "
+            f'written to {directory} in {time.perf_counter() - started:.1f}s'
+        ))
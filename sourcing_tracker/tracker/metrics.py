@@ -0,0 +1,338 @@
+"""
+In-process metrics registry exposed in the Prometheus text format at /metrics.
+
+Each worker process keeps its own counters and histograms in memory and, when
+TRACKER_METRICS_DIR is set, periodically snapshots them to `<dir>/<pid>-<start time>.json`. The
+/metrics view sums the snapshots of every process (including ones that have exited,
+so counters never go backwards), which makes the numbers correct under gunicorn or
+uvicorn with several workers. Without TRACKER_METRICS_DIR only the serving process
+is reported.
+
+At most every COMPACT_INTERVAL seconds a scrape folds the snapshots of processes
+that are no longer running into `<dir>/exited.json`, so the directory doesn't grow
+with every worker restart. Liveness is checked by pid, so the directory must not be
+shared between hosts.
+
+Counters of database changes are incremented with inc_on_commit, so a rolled back
+transaction isn't counted:
+
+    from tracker import metrics
+    metrics.TRANSACTIONS_CREATED.inc_on_commit(type='ADVANCE_RECEIVED')
+    metrics.REQUEST_DURATION.observe(0.12, view='ledger', method='GET')
+"""
+import atexit
+import errno
+import hmac
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+FLUSH_INTERVAL = 5.0
+COMPACT_INTERVAL = 60.0
+EXITED = 'exited.json'
+
+_lock = threading.Lock()
+_registry = {}
+_last_flush = 0.0
+_last_compact = 0.0
+_snapshot_name = None
+_snapshot_pid = None
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        _registry[name] = self
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        _maybe_flush()
+
+    def inc_on_commit(self, amount=1, using=None, **labels):
+        """inc() once the current transaction commits (right away outside one)."""
+        transaction.on_commit(lambda: self.inc(amount, **labels), using=using)
+
+    def snapshot(self):
+        return [[list(map(list, key)), value] for key, value in self.values.items()]
+
+    @staticmethod
+    def merge(total, samples):
+        for key, value in samples:
+            key = tuple(map(tuple, key))
+            total[key] = total.get(key, 0) + value
+
+    def render(self, merged):
+        for key, value in sorted(merged.items()):
+            yield f'{self.name}{_format_labels(key)} {_format_value(value)}'
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.values = {}
+        _registry[name] = self
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with _lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+        _maybe_flush()
+
+    def snapshot(self):
+        return [[list(map(list, key)), series] for key, series in self.values.items()]
+
+    @staticmethod
+    def merge(total, samples):
+        for key, series in samples:
+            key = tuple(map(tuple, key))
+            current = total.setdefault(key, {'counts': [0] * len(series['counts']), 'sum': 0.0, 'count': 0})
+            current['counts'] = [a + b for a, b in zip(current['counts'], series['counts'])]
+            current['sum'] += series['sum']
+            current['count'] += series['count']
+
+    def render(self, merged):
+        for key, series in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                yield f'{self.name}_bucket{_format_labels(key + (("le", _format_value(bound)),))} {cumulative}'
+            yield f'{self.name}_bucket{_format_labels(key + (("le", "+Inf"),))} {series["count"]}'
+            yield f'{self.name}_sum{_format_labels(key)} {_format_value(series["sum"])}'
+            yield f'{self.name}_count{_format_labels(key)} {series["count"]}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in key) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+# Request cycle
+REQUEST_DURATION = Histogram('tracker_request_duration_seconds', 'Request latency by view.')
+REQUEST_QUERIES = Histogram('tracker_request_queries', 'SQL queries per request by view.', buckets=QUERY_BUCKETS)
+
+# Business events
+TRANSACTIONS_CREATED = Counter('tracker_transactions_created_total', 'Transactions created, by type.')
+BALANCE_UPDATES = Counter('tracker_balance_updates_total', 'Partner balance updates applied, by source.')
+DEAL_STATUS_TRANSITIONS = Counter('tracker_deal_status_transitions_total', 'Deal status changes.')
+EXPORT_ROWS = Counter('tracker_export_rows_total', 'Rows streamed by exports, by export.')
+EXPORT_JOBS = Counter('tracker_export_jobs_total', 'Background export jobs finished, by kind and status.')
+# Only counts what serve_media sends, i.e. with DEBUG on; in production the web server serves media
+MEDIA_BYTES = Counter('tracker_media_bytes_served_total', 'Bytes of uploaded media served by Django (DEBUG only), by folder.')
+
+
+def _metrics_dir():
+    path = getattr(settings, 'TRACKER_METRICS_DIR', None)
+    return Path(path) if path else None
+
+
+def _snapshot():
+    with _lock:
+        return {name: metric.snapshot() for name, metric in _registry.items()}
+
+
+def _process_name():
+    """pid plus start time, so a recycled pid never overwrites a dead worker's totals."""
+    global _snapshot_name, _snapshot_pid
+    if _snapshot_pid != os.getpid():
+        _snapshot_pid = os.getpid()
+        _snapshot_name = f'{_snapshot_pid}-{int(time.time())}'
+    return _snapshot_name
+
+
+def flush():
+    """Write this process's metrics to TRACKER_METRICS_DIR (atomically)."""
+    global _last_flush
+    directory = _metrics_dir()
+    if directory is None:
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{_process_name()}.json'
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(_snapshot()))
+    os.replace(tmp, path)
+    _last_flush = time.monotonic()
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+atexit.register(lambda: _metrics_dir() and flush())
+
+
+def _pid_alive(pid):
+    if os.name != 'posix':
+        return True  # os.kill would terminate the process on Windows; never fold there
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshots(directory):
+    """
+    {file name: snapshot} for every process file and exited.json, leaving out the
+    files that exited.json already includes. Also returns that set of files.
+    """
+    snapshots = {}
+    folded = set()
+    for path in directory.glob('*.json'):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # being replaced right now; picked up on the next scrape
+        if path.name == EXITED:
+            folded.update(data['folded'])
+            data = data['metrics']
+        snapshots[path.name] = data
+    return {name: data for name, data in snapshots.items() if name not in folded}, folded
+
+
+def _merge(snapshots):
+    merged = {name: {} for name in _registry}
+    for snapshot in snapshots:
+        for name, samples in snapshot.items():
+            if name in _registry:
+                _registry[name].merge(merged[name], samples)
+    return merged
+
+
+def _write_exited(directory, totals, folded):
+    path = directory / EXITED
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps({'folded': folded, 'metrics': totals}))
+    os.replace(tmp, path)
+
+
+def _unlink(path):
+    try:
+        path.unlink()
+    except OSError as exc:
+        if exc.errno != errno.ENOENT:
+            raise
+
+
+def compact(directory):
+    """
+    Fold the snapshots of processes that are no longer running into exited.json and
+    delete them. exited.json names the files it includes until they are gone, so a
+    crash between writing it and deleting them can't count them twice. Returns the
+    number of files folded, or None when another process is compacting.
+    """
+    lock = directory / 'compact.lock'
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        try:
+            if time.time() - lock.stat().st_mtime > COMPACT_INTERVAL:
+                lock.unlink()  # left behind by a process that died while compacting
+        except OSError:
+            pass
+        return None
+    try:
+        snapshots, folded = _read_snapshots(directory)
+        for name in folded:
+            _unlink(directory / name)
+        dead = [
+            name for name in snapshots
+            if name != EXITED and not _pid_alive(int(name.split('-', 1)[0]))
+        ]
+        totals = snapshots.get(EXITED, {})
+        if dead:
+            merged = _merge([totals, *(snapshots[name] for name in dead)])
+            totals = {name: [[list(map(list, key)), value] for key, value in samples.items()]
+                      for name, samples in merged.items()}
+            _write_exited(directory, totals, dead)
+            for name in dead:
+                _unlink(directory / name)
+        if dead or folded:
+            _write_exited(directory, totals, [])
+        return len(dead)
+    finally:
+        _unlink(lock)
+
+
+def collect():
+    """Merge the snapshots of every process into {metric name: merged samples}."""
+    global _last_compact
+    directory = _metrics_dir()
+    if directory is None:
+        return _merge([_snapshot()])
+    flush()
+    if time.monotonic() - _last_compact >= COMPACT_INTERVAL:
+        _last_compact = time.monotonic()
+        try:
+            compact(directory)
+        except (OSError, ValueError):
+            pass  # tried again on a later scrape
+    snapshots, _ = _read_snapshots(directory)
+    return _merge(snapshots.values())
+
+
+def render_metrics():
+    lines = []
+    for name, samples in collect().items():
+        metric = _registry[name]
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        lines.extend(metric.render(samples))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; requires TRACKER_METRICS_TOKEN as a bearer token when set."""
+    token = getattr(settings, 'TRACKER_METRICS_TOKEN', None)
+    if token:
+        header = request.headers.get('Authorization', '')
+        if not (header.startswith('Bearer ') and hmac.compare_digest(header[7:], token)):
+            return HttpResponseForbidden('Invalid metrics token.')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
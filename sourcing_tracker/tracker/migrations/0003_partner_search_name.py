@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:54
+
+import tracker.models
+from django.db import migrations, models
+
+
+def populate_search_name(apps, schema_editor):
+    """Fill the normalized search name for existing partners."""
+    Partner = apps.get_model('tracker', 'Partner')
+    for partner in Partner.objects.only('pk', 'name'):
+        partner.search_name = tracker.models.normalize_partner_name(partner.name)
+        partner.save(update_fields=['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0002_deal_reference_historicaldeal_reference_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalpartner',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='partner',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(populate_search_name, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='deal',
+            name='reference',
+            field=models.CharField(default=tracker.models.generate_reference, editable=False, max_length=20, unique=True, verbose_name='Reference'),
+        ),
+        migrations.AlterField(
+            model_name='historicaldeal',
+            name='reference',
+            field=models.CharField(db_index=True, default=tracker.models.generate_reference, editable=False, max_length=20, verbose_name='Reference'),
+        ),
+    ]
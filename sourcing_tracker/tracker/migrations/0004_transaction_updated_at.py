@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:20
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    """Existing transactions were last changed when they were created."""
+    Transaction = apps.get_model('tracker', 'Transaction')
+    Transaction.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0003_partner_search_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltransaction',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, db_index=True, default=django.utils.timezone.now, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='deal',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='historicaldeal',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='historicalpartner',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='partner',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:04
+
+import django.core.validators
+import tracker.fields
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Round
+
+MONEY_FIELDS = {
+    'Partner': ['current_balance'],
+    'Transaction': ['amount'],
+    'Deal': ['estimated_cost', 'actual_cost'],
+    'DealItem': ['item_price', 'commission_per_item'],
+}
+
+
+def _scale(apps, factor):
+    for model_name, fields in MONEY_FIELDS.items():
+        for name in (model_name, f'Historical{model_name}'):
+            model = apps.get_model('tracker', name)
+            model.objects.update(**{field: Round(F(field) * factor) if factor > 1 else F(field) * factor for field in fields})
+
+
+def _widened(nullable=()):
+    """
+    Every money column as a DecimalField(20, 2): wide enough for the paise values of
+    the largest (12, 2) and (10, 2) amounts. Numeric to bigint casts round on
+    PostgreSQL, so the columns can't become integers until the values are whole.
+    """
+    return [
+        migrations.AlterField(
+            model_name=name.lower(),
+            name=field,
+            field=models.DecimalField(decimal_places=2, max_digits=20, null=field in nullable, blank=field in nullable),
+        )
+        for model_name, fields in MONEY_FIELDS.items()
+        for name in (model_name, f'Historical{model_name}')
+        for field in fields
+    ]
+
+
+def rupees_to_paise(apps, schema_editor):
+    _scale(apps, 100)
+
+
+def paise_to_rupees(apps, schema_editor):
+    _scale(apps, Decimal('0.01'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_partnerevent'),
+    ]
+
+    operations = [
+        # Widen, scale while the columns are still decimal, then change the type once the
+        # values are whole numbers. In reverse the same steps undo each other in turn.
+        *_widened(nullable=('estimated_cost', 'actual_cost')),
+        migrations.RunPython(rupees_to_paise, paise_to_rupees),
+        migrations.AlterField(
+            model_name='deal',
+            name='actual_cost',
+            field=tracker.fields.MoneyField(blank=True, null=True, verbose_name='Actual Cost'),
+        ),
+        migrations.AlterField(
+            model_name='deal',
+            name='estimated_cost',
+            field=tracker.fields.MoneyField(blank=True, null=True, verbose_name='Estimated Cost'),
+        ),
+        migrations.AlterField(
+            model_name='dealitem',
+            name='commission_per_item',
+            field=tracker.fields.MoneyField(default=Decimal('0.00'), max_digits=10, verbose_name='Commission per Item'),
+        ),
+        migrations.AlterField(
+            model_name='dealitem',
+            name='item_price',
+            field=tracker.fields.MoneyField(verbose_name='Item Price (per unit)'),
+        ),
+        migrations.AlterField(
+            model_name='historicaldeal',
+            name='actual_cost',
+            field=tracker.fields.MoneyField(blank=True, null=True, verbose_name='Actual Cost'),
+        ),
+        migrations.AlterField(
+            model_name='historicaldeal',
+            name='estimated_cost',
+            field=tracker.fields.MoneyField(blank=True, null=True, verbose_name='Estimated Cost'),
+        ),
+        migrations.AlterField(
+            model_name='historicaldealitem',
+            name='commission_per_item',
+            field=tracker.fields.MoneyField(default=Decimal('0.00'), max_digits=10, verbose_name='Commission per Item'),
+        ),
+        migrations.AlterField(
+            model_name='historicaldealitem',
+            name='item_price',
+            field=tracker.fields.MoneyField(verbose_name='Item Price (per unit)'),
+        ),
+        migrations.AlterField(
+            model_name='historicalpartner',
+            name='current_balance',
+            field=tracker.fields.MoneyField(default=Decimal('0.00'), verbose_name='Current Balance'),
+        ),
+        migrations.AlterField(
+            model_name='historicaltransaction',
+            name='amount',
+            field=tracker.fields.MoneyField(validators=[django.core.validators.MinValueValidator(Decimal('0.01'))]),
+        ),
+        migrations.AlterField(
+            model_name='partner',
+            name='current_balance',
+            field=tracker.fields.MoneyField(default=Decimal('0.00'), verbose_name='Current Balance'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=tracker.fields.MoneyField(validators=[django.core.validators.MinValueValidator(Decimal('0.01'))]),
+        ),
+    ]
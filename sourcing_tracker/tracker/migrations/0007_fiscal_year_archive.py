@@ -0,0 +1,124 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:08
+
+import django.core.serializers.json
+import django.db.models.deletion
+import tracker.fields
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0006_money_in_paise'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FiscalYearClose',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fiscal_year', models.PositiveIntegerField(unique=True)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('transactions_archived', models.PositiveIntegerField(default=0)),
+                ('deals_archived', models.PositiveIntegerField(default=0)),
+                ('deal_items_archived', models.PositiveIntegerField(default=0)),
+                ('history_archived', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-fiscal_year'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedDeal',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('reference', models.CharField(max_length=20, unique=True, verbose_name='Reference')),
+                ('item_name', models.CharField(blank=True, max_length=300, verbose_name='Item Name')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('estimated_cost', tracker.fields.MoneyField(blank=True, null=True, verbose_name='Estimated Cost')),
+                ('actual_cost', tracker.fields.MoneyField(blank=True, null=True, verbose_name='Actual Cost')),
+                ('commission_percent', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5, verbose_name='Commission %')),
+                ('vendor_invoice', models.FileField(blank=True, null=True, upload_to='vendor_invoices/', verbose_name='Vendor Invoice')),
+                ('client_name', models.CharField(blank=True, max_length=200, verbose_name='End Client Name')),
+                ('tracking_id', models.CharField(blank=True, max_length=100, verbose_name='Tracking ID')),
+                ('courier_partner', models.CharField(blank=True, max_length=100, verbose_name='Courier Partner')),
+                ('status', models.CharField(choices=[('SOURCING', 'Sourcing'), ('BOOKED', 'Booked'), ('IN_WAREHOUSE', 'In Warehouse'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('RETURNED', 'Returned')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('cost_deducted', models.BooleanField(default=False)),
+                ('fiscal_year', models.PositiveIntegerField(db_index=True)),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_deals', to='tracker.partner')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedDealItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('item_name', models.CharField(max_length=300, verbose_name='Item Name')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='Quantity')),
+                ('item_price', tracker.fields.MoneyField(verbose_name='Item Price (per unit)')),
+                ('commission_per_item', tracker.fields.MoneyField(default=Decimal('0.00'), max_digits=10, verbose_name='Commission per Item')),
+                ('created_at', models.DateTimeField()),
+                ('deal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='tracker.archiveddeal')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedHistoryRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('object_id', models.BigIntegerField()),
+                ('history_id', models.BigIntegerField()),
+                ('history_date', models.DateTimeField()),
+                ('history_type', models.CharField(max_length=1)),
+                ('history_user_id', models.BigIntegerField(blank=True, null=True)),
+                ('history_change_reason', models.CharField(blank=True, max_length=100, null=True)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+            options={
+                'ordering': ['model', 'object_id', 'history_date'],
+                'indexes': [models.Index(fields=['model', 'object_id'], name='tracker_arc_model_84c331_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', tracker.fields.MoneyField()),
+                ('transaction_type', models.CharField(choices=[('ADVANCE_RECEIVED', 'Advance Received'), ('REFUND_GIVEN', 'Refund Given')], max_length=20, verbose_name='Transaction Type')),
+                ('date', models.DateField(db_index=True)),
+                ('evidence_file', models.FileField(blank=True, null=True, upload_to='transaction_evidence/', verbose_name='Evidence (Bank Screenshot)')),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('fiscal_year', models.PositiveIntegerField(db_index=True)),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_transactions', to='tracker.partner')),
+            ],
+            options={
+                'ordering': ['-date', '-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OpeningBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fiscal_year', models.PositiveIntegerField()),
+                ('amount', tracker.fields.MoneyField(verbose_name='Opening Balance')),
+                ('fiscal_year_close', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_balances', to='tracker.fiscalyearclose')),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_balances', to='tracker.partner')),
+            ],
+            options={
+                'ordering': ['-fiscal_year', 'partner__name'],
+                'unique_together': {('partner', 'fiscal_year')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:05
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    """Existing items were last changed when they were created."""
+    for name in ('DealItem', 'HistoricalDealItem', 'ArchivedDealItem'):
+        apps.get_model('tracker', name).objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_fiscal_year_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archiveddealitem',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='dealitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='historicaldealitem',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:34
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_dealitem_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(unique=True)),
+                ('generated_at', models.DateTimeField()),
+                ('partner_count', models.PositiveIntegerField(default=0)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+            options={
+                'ordering': ['-as_of'],
+                'get_latest_by': 'as_of',
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:36
+
+import django.db.models.deletion
+import tracker.fields
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0009_agingsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPartnerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('advances', tracker.fields.MoneyField(default=Decimal('0.00'))),
+                ('refunds', tracker.fields.MoneyField(default=Decimal('0.00'))),
+                ('deal_spend', tracker.fields.MoneyField(default=Decimal('0.00'))),
+                ('commission', tracker.fields.MoneyField(default=Decimal('0.00'))),
+                ('advance_count', models.IntegerField(default=0)),
+                ('refund_count', models.IntegerField(default=0)),
+                ('deal_count', models.IntegerField(default=0)),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tracker.partner')),
+            ],
+            options={
+                'ordering': ['day'],
+                'abstract': False,
+                'unique_together': {('partner', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyPartnerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('advances', tracker.fields.MoneyField(default=Decimal('0.00'))),
+                ('refunds', tracker.fields.MoneyField(default=Decimal('0.00'))),
+                ('deal_spend', tracker.fields.MoneyField(default=Decimal('0.00'))),
+                ('commission', tracker.fields.MoneyField(default=Decimal('0.00'))),
+                ('advance_count', models.IntegerField(default=0)),
+                ('refund_count', models.IntegerField(default=0)),
+                ('deal_count', models.IntegerField(default=0)),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tracker.partner')),
+            ],
+            options={
+                'ordering': ['day'],
+                'abstract': False,
+                'unique_together': {('partner', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:07
+
+import tracker.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0012_migrationcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archiveddeal',
+            name='reference',
+            field=models.CharField(max_length=24, unique=True, verbose_name='Reference'),
+        ),
+        migrations.AlterField(
+            model_name='deal',
+            name='reference',
+            field=models.CharField(default=tracker.models.generate_reference, editable=False, max_length=24, unique=True, verbose_name='Reference'),
+        ),
+        migrations.AlterField(
+            model_name='historicaldeal',
+            name='reference',
+            field=models.CharField(db_index=True, default=tracker.models.generate_reference, editable=False, max_length=24, verbose_name='Reference'),
+        ),
+    ]
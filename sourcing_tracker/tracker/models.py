@@ -1,7 +1,14 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from simple_history.models import HistoricalRecords
+from .fields import MoneyField
+
+
+def normalize_partner_name(name):
+    """Normalize a partner name for prefix search (case-folded, single-spaced)."""
+    return ' '.join((name or '').split()).casefold()
 
 
 class Partner(models.Model):
@@ -9,15 +16,15 @@ class Partner(models.Model):
     
     name = models.CharField(max_length=200)
     gst_number = models.CharField(max_length=15, unique=True, verbose_name="GST Number")
+    # Normalized copy of name, indexed for typeahead prefix lookups
+    search_name = models.CharField(max_length=200, db_index=True, editable=False, default='')
     contact_info = models.TextField(blank=True, verbose_name="Contact Information")
-    current_balance = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2, 
+    current_balance = MoneyField(
         default=Decimal('0.00'),
         verbose_name="Current Balance"
     )
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     history = HistoricalRecords()
     
@@ -26,6 +33,13 @@ class Partner(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.gst_number})"
+    
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_partner_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'search_name'}
+        super().save(*args, **kwargs)
 
 
 class Transaction(models.Model):
@@ -36,14 +50,15 @@ class Transaction(models.Model):
         ('REFUND_GIVEN', 'Refund Given'),
     ]
     
+    # Rows from closed fiscal years live in ArchivedTransaction
+    is_archived = False
+    
     partner = models.ForeignKey(
         Partner, 
         on_delete=models.CASCADE, 
         related_name='transactions'
     )
-    amount = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2,
+    amount = MoneyField(
         validators=[MinValueValidator(Decimal('0.01'))]
     )
     transaction_type = models.CharField(
@@ -60,6 +75,7 @@ class Transaction(models.Model):
     )
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     history = HistoricalRecords()
     
@@ -76,7 +92,8 @@ from django.utils import timezone as tz
 def generate_reference():
     """Generate a unique reference number for deals."""
     date_str = tz.now().strftime('%Y%m%d')
-    return f"DEAL-{date_str}-{uuid.uuid4().hex[:4].upper()}"
+    # 8 hex digits: collisions stay rare at tens of thousands of deals a day
+    return f"DEAL-{date_str}-{uuid.uuid4().hex[:8].upper()}"
 
 
 class Deal(models.Model):
@@ -93,7 +110,7 @@ class Deal(models.Model):
     
     # Auto-generated reference number
     reference = models.CharField(
-        max_length=20, 
+        max_length=24, 
         unique=True, 
         default=generate_reference,
         editable=False,
@@ -111,16 +128,12 @@ class Deal(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     
     # Financials (legacy - now calculated from DealItems)
-    estimated_cost = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2, 
+    estimated_cost = MoneyField(
         null=True, 
         blank=True,
         verbose_name="Estimated Cost"
     )
-    actual_cost = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2, 
+    actual_cost = MoneyField(
         null=True, 
         blank=True,
         verbose_name="Actual Cost"
@@ -162,7 +175,7 @@ class Deal(models.Model):
     )
     
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     # Track if actual_cost has been deducted from balance
     cost_deducted = models.BooleanField(default=False)
@@ -218,19 +231,17 @@ class DealItem(models.Model):
     )
     item_name = models.CharField(max_length=300, verbose_name="Item Name")
     quantity = models.PositiveIntegerField(default=1, verbose_name="Quantity")
-    item_price = models.DecimalField(
-        max_digits=12,
-        decimal_places=2,
+    item_price = MoneyField(
         verbose_name="Item Price (per unit)"
     )
-    commission_per_item = models.DecimalField(
+    commission_per_item = MoneyField(
         max_digits=10,
-        decimal_places=2,
         default=Decimal('0.00'),
         verbose_name="Commission per Item"
     )
     
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     history = HistoricalRecords()
     
@@ -249,3 +260,335 @@ class DealItem(models.Model):
     def commission_total(self):
         """Calculate total commission: commission_per_item * quantity"""
         return self.commission_per_item * self.quantity
+
+
+class PartnerEvent(models.Model):
+    """
+    A change to a partner's balance or deal count, used by the database event bus
+    to fan dashboard updates out across worker processes.
+    """
+    
+    partner_id = models.BigIntegerField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"Partner {self.partner_id} changed at {self.created_at}"
+
+
+class FiscalYearClose(models.Model):
+    """
+    A closed Indian fiscal year (1 April - 31 March). Closing a year archives its
+    settled transactions and deals and records each partner's opening balance for
+    the next year.
+    """
+    
+    # Starting calendar year, e.g. 2024 for FY 2024-25
+    fiscal_year = models.PositiveIntegerField(unique=True)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    closed_at = models.DateTimeField(auto_now_add=True)
+    transactions_archived = models.PositiveIntegerField(default=0)
+    deals_archived = models.PositiveIntegerField(default=0)
+    deal_items_archived = models.PositiveIntegerField(default=0)
+    history_archived = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-fiscal_year']
+    
+    def __str__(self):
+        return f"FY {self.label}"
+    
+    @property
+    def label(self):
+        return f"{self.fiscal_year}-{(self.fiscal_year + 1) % 100:02d}"
+
+
+class OpeningBalance(models.Model):
+    """A partner's balance at the start of a fiscal year, recorded when the previous year closed."""
+    
+    partner = models.ForeignKey(
+        Partner,
+        on_delete=models.CASCADE,
+        related_name='opening_balances'
+    )
+    fiscal_year = models.PositiveIntegerField()
+    amount = MoneyField(verbose_name="Opening Balance")
+    fiscal_year_close = models.ForeignKey(
+        FiscalYearClose,
+        on_delete=models.CASCADE,
+        related_name='opening_balances'
+    )
+    
+    class Meta:
+        ordering = ['-fiscal_year', 'partner__name']
+        unique_together = [('partner', 'fiscal_year')]
+    
+    def __str__(self):
+        return f"{self.partner.name} - FY {self.fiscal_year}: ₹{self.amount}"
+
+
+class ArchivedTransaction(models.Model):
+    """A Transaction from a closed fiscal year. Read-only; keeps the original id."""
+    
+    is_archived = True
+    
+    id = models.BigIntegerField(primary_key=True)
+    partner = models.ForeignKey(
+        Partner,
+        on_delete=models.PROTECT,
+        related_name='archived_transactions'
+    )
+    amount = MoneyField()
+    transaction_type = models.CharField(
+        max_length=20,
+        choices=Transaction.TRANSACTION_TYPES,
+        verbose_name="Transaction Type"
+    )
+    date = models.DateField(db_index=True)
+    evidence_file = models.FileField(
+        upload_to='transaction_evidence/',
+        blank=True,
+        null=True,
+        verbose_name="Evidence (Bank Screenshot)"
+    )
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    fiscal_year = models.PositiveIntegerField(db_index=True)
+    
+    class Meta:
+        ordering = ['-date', '-created_at']
+    
+    def __str__(self):
+        return f"{self.partner.name} - {self.get_transaction_type_display()} - ₹{self.amount} (archived)"
+
+
+class ArchivedDeal(models.Model):
+    """A delivered or returned Deal from a closed fiscal year. Read-only; keeps the original id."""
+    
+    is_archived = True
+    
+    id = models.BigIntegerField(primary_key=True)
+    reference = models.CharField(max_length=24, unique=True, verbose_name="Reference")
+    partner = models.ForeignKey(
+        Partner,
+        on_delete=models.PROTECT,
+        related_name='archived_deals'
+    )
+    item_name = models.CharField(max_length=300, verbose_name="Item Name", blank=True)
+    quantity = models.PositiveIntegerField(default=1)
+    estimated_cost = MoneyField(null=True, blank=True, verbose_name="Estimated Cost")
+    actual_cost = MoneyField(null=True, blank=True, verbose_name="Actual Cost")
+    commission_percent = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="Commission %"
+    )
+    vendor_invoice = models.FileField(
+        upload_to='vendor_invoices/',
+        blank=True,
+        null=True,
+        verbose_name="Vendor Invoice"
+    )
+    client_name = models.CharField(max_length=200, blank=True, verbose_name="End Client Name")
+    tracking_id = models.CharField(max_length=100, blank=True, verbose_name="Tracking ID")
+    courier_partner = models.CharField(max_length=100, blank=True, verbose_name="Courier Partner")
+    status = models.CharField(max_length=20, choices=Deal.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    cost_deducted = models.BooleanField(default=False)
+    fiscal_year = models.PositiveIntegerField(db_index=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.reference} - {self.partner.name} (archived)"
+
+
+class ArchivedDealItem(models.Model):
+    """A DealItem belonging to an ArchivedDeal."""
+    
+    id = models.BigIntegerField(primary_key=True)
+    deal = models.ForeignKey(
+        ArchivedDeal,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    item_name = models.CharField(max_length=300, verbose_name="Item Name")
+    quantity = models.PositiveIntegerField(default=1, verbose_name="Quantity")
+    item_price = MoneyField(verbose_name="Item Price (per unit)")
+    commission_per_item = MoneyField(
+        max_digits=10,
+        default=Decimal('0.00'),
+        verbose_name="Commission per Item"
+    )
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['created_at']
+    
+    def __str__(self):
+        return f"{self.item_name} x{self.quantity} (archived)"
+    
+    @property
+    def total(self):
+        return self.item_price * self.quantity
+    
+    @property
+    def commission_total(self):
+        return self.commission_per_item * self.quantity
+
+
+class ArchivedHistoryRecord(models.Model):
+    """
+    A django-simple-history row for an archived object, kept as JSON so one table
+    holds the audit trail of every archived model.
+    """
+    
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    history_id = models.BigIntegerField()
+    history_date = models.DateTimeField()
+    history_type = models.CharField(max_length=1)
+    history_user_id = models.BigIntegerField(null=True, blank=True)
+    history_change_reason = models.CharField(max_length=100, null=True, blank=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    
+    class Meta:
+        ordering = ['model', 'object_id', 'history_date']
+        indexes = [models.Index(fields=['model', 'object_id'])]
+    
+    def __str__(self):
+        return f"{self.model} #{self.object_id} {self.history_type} at {self.history_date}"
+
+
+class AgingSnapshot(models.Model):
+    """Advance aging of every partner on one date, stored nightly by `manage.py snapshot_aging`."""
+    
+    as_of = models.DateField(unique=True)
+    generated_at = models.DateTimeField()
+    partner_count = models.PositiveIntegerField(default=0)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    
+    class Meta:
+        ordering = ['-as_of']
+        get_latest_by = 'as_of'
+    
+    def __str__(self):
+        return f"Aging as of {self.as_of}"
+
+
+class PartnerRollup(models.Model):
+    """Per-partner totals for one period, starting on `day`; kept current by tracker.rollups."""
+    
+    partner = models.ForeignKey(
+        Partner,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    day = models.DateField(db_index=True)
+    advances = MoneyField(default=Decimal('0.00'))
+    refunds = MoneyField(default=Decimal('0.00'))
+    deal_spend = MoneyField(default=Decimal('0.00'))
+    commission = MoneyField(default=Decimal('0.00'))
+    advance_count = models.IntegerField(default=0)
+    refund_count = models.IntegerField(default=0)
+    deal_count = models.IntegerField(default=0)
+    
+    class Meta:
+        abstract = True
+        ordering = ['day']
+        unique_together = [('partner', 'day')]
+
+
+class DailyPartnerRollup(PartnerRollup):
+    """A partner's advances, refunds, deal spend and commission on one day."""
+
+
+class MonthlyPartnerRollup(PartnerRollup):
+    """The same totals per calendar month; `day` is the first of the month."""
+
+
+class ExportJob(models.Model):
+    """An export requested from the site and written in the background by `manage.py run_workers`."""
+    
+    KIND_CHOICES = [
+        ('ledger_csv', 'Ledger (CSV)'),
+        ('ledger_xlsx', 'Ledger (Excel)'),
+        ('deals_xlsx', 'Deals and Items (Excel)'),
+        ('statements', 'Monthly Statements'),
+        ('invoices', 'Commission Invoices'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    # Digest of kind and params, for reusing an identical export
+    key = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.FileField(upload_to='exports/', max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    # tracker.exports.data_version() when the job started
+    data_version = models.CharField(max_length=32, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} export #{self.pk} ({self.get_status_display()})"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('DONE', 'FAILED')
+    
+    @property
+    def percent(self):
+        if self.status == 'DONE':
+            return 100
+        if not self.total:
+            return 0
+        return min(100, self.progress * 100 // self.total)
+    
+    @property
+    def filename(self):
+        return self.result.name.rsplit('/', 1)[-1] if self.result else ''
+
+
+class MigrationCheckpoint(models.Model):
+    """Progress of a resumable data migration run in batches by a management command."""
+    
+    name = models.CharField(max_length=100, unique=True)
+    # Highest primary key processed so far; the next batch starts after it
+    last_id = models.BigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    converted = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        state = 'finished' if self.finished_at else f'at id {self.last_id}'
+        return f"{self.name} ({state})"
@@ -0,0 +1,241 @@
+"""
+Columnar Parquet snapshots of the tracker's tables for offline analysis.
+
+`manage.py snapshot_parquet` writes each table to TRACKER_PARQUET_DIR/<table>/ as
+Parquet part files with real column types: money and other decimals as decimal128,
+dates as date32, timestamps in UTC, JSON as text. Rows are read with values_list()
+in chunks of `batch_size` and each chunk is written as one row group, so memory
+stays bounded by the batch size however large the table is.
+
+A full snapshot replaces every table's files. An incremental one adds a part file
+per table holding only the rows changed since the previous run, as recorded in
+manifest.json:
+
+- tables with updated_at: rows updated since the previous run started;
+- append-only history tables: rows with a higher primary key;
+- archive tables: rows of fiscal years closed since the previous run.
+
+Deletions are not carried over, so readers keep the latest row per id (highest
+updated_at) and a periodic full snapshot starts over. A table's directory reads as
+one dataset, e.g. pandas.read_parquet('parquet/transaction').
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Max
+from django.utils import timezone
+
+from .fields import MoneyField
+from .models import (
+    Partner, Transaction, Deal, DealItem, ArchivedTransaction, ArchivedDeal, ArchivedDealItem,
+    ArchivedHistoryRecord, FiscalYearClose,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+
+MANIFEST = 'manifest.json'
+COMPRESSIONS = ('zstd', 'snappy', 'gzip', 'brotli', 'none')
+
+
+class Table:
+    """A model written as one Parquet dataset; `incremental` is 'updated', 'append' or 'closed'."""
+
+    def __init__(self, name, model, incremental, fiscal_year='fiscal_year'):
+        self.name = name
+        self.model = model
+        self.incremental = incremental
+        # Lookup of an archive row's fiscal year
+        self.fiscal_year = fiscal_year
+        self.fields = [field for field in model._meta.concrete_fields]
+
+    @property
+    def columns(self):
+        return [field.attname for field in self.fields]
+
+    def changed(self, since, state):
+        """Rows to add to an incremental snapshot (all rows when the table has no previous state)."""
+        rows = self.model.objects.all()
+        if state is None:
+            return rows
+        if self.incremental == 'updated':
+            return rows.filter(updated_at__gte=since)
+        if self.incremental == 'append':
+            return rows.filter(pk__gt=state.get('max_pk') or 0)
+        closed = FiscalYearClose.objects.filter(closed_at__gte=since).values('fiscal_year')
+        return rows.filter(**{f'{self.fiscal_year}__in': closed})
+
+
+def tables(history=False):
+    selected = [
+        Table('partner', Partner, 'updated'),
+        Table('transaction', Transaction, 'updated'),
+        Table('deal', Deal, 'updated'),
+        Table('deal_item', DealItem, 'updated'),
+        Table('archived_transaction', ArchivedTransaction, 'closed'),
+        Table('archived_deal', ArchivedDeal, 'closed'),
+        Table('archived_deal_item', ArchivedDealItem, 'closed', fiscal_year='deal__fiscal_year'),
+    ]
+    if history:
+        selected += [
+            Table(f'historical_{name}', model.history.model, 'append')
+            for name, model in (('partner', Partner), ('transaction', Transaction), ('deal', Deal), ('deal_item', DealItem))
+        ]
+        selected.append(Table('archived_history_record', ArchivedHistoryRecord, 'append'))
+    return selected
+
+
+def parquet_dir():
+    return Path(getattr(settings, 'TRACKER_PARQUET_DIR', Path(settings.BASE_DIR) / 'parquet'))
+
+
+def arrow_type(field):
+    if field.is_relation:
+        return arrow_type(field.target_field)
+    if isinstance(field, MoneyField):
+        # Decimal rupees, as the model returns them (stored in paise)
+        return pa.decimal128(field.max_digits, 2)
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return pa.int64()
+    return pa.string()
+
+
+def _converter(field):
+    if isinstance(field, models.JSONField):
+        return lambda value: None if value is None else json.dumps(value, cls=DjangoJSONEncoder)
+    return None
+
+
+def schema(table):
+    return pa.schema([
+        pa.field(field.attname, arrow_type(field), nullable=field.null)
+        for field in table.fields
+    ])
+
+
+def write_table(table, queryset, path, batch_size, compression):
+    """Write `queryset` ordered by primary key to `path`, one row group per batch; returns the row count."""
+    table_schema = schema(table)
+    converters = [_converter(field) for field in table.fields]
+    rows = queryset.order_by('pk').values_list(*table.columns).iterator(chunk_size=batch_size)
+    count = 0
+    with pq.ParquetWriter(path, table_schema, compression=None if compression == 'none' else compression) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_batch(_record_batch(batch, table_schema, converters))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(_record_batch(batch, table_schema, converters))
+            count += len(batch)
+    return count
+
+
+def _record_batch(batch, table_schema, converters):
+    columns = list(zip(*batch)) if batch else [()] * len(table_schema)
+    arrays = []
+    for values, field, convert in zip(columns, table_schema, converters):
+        if convert:
+            values = [convert(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=table_schema)
+
+
+def read_manifest(directory):
+    path = Path(directory) / MANIFEST
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def _write_manifest(directory, manifest):
+    path = Path(directory) / MANIFEST
+    temporary = path.with_name(f'.{MANIFEST}.tmp')
+    temporary.write_text(json.dumps(manifest, indent=2, cls=DjangoJSONEncoder))
+    os.replace(temporary, path)
+
+
+def snapshot(directory=None, incremental=False, history=False, batch_size=50000, compression='zstd'):
+    """
+    Write a full or incremental snapshot of every table into `directory`.
+    Returns {table name: rows written}.
+    """
+    if pa is None:
+        raise RuntimeError('Parquet snapshots need the pyarrow package.')
+    directory = Path(directory or parquet_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(directory) if incremental else None
+    incremental = manifest is not None
+    started = timezone.now()
+    since = manifest['last_run'] if incremental else None
+    part = f'part-{started:%Y%m%dT%H%M%S%f}.parquet'
+
+    written, states, staged = {}, {}, []
+    for table in tables(history):
+        state = manifest['tables'].get(table.name) if incremental else None
+        queryset = table.changed(since, state)
+        if table.incremental == 'append':
+            # Rows added while we read wait for the next run
+            max_pk = table.model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+            queryset = queryset.filter(pk__lte=max_pk)
+            states[table.name] = {'max_pk': max_pk}
+        else:
+            states[table.name] = {}
+
+        if state is None:
+            # Full table: write it beside the current one and swap it in below
+            target = directory / f'.{table.name}.partial'
+            shutil.rmtree(target, ignore_errors=True)
+            target.mkdir()
+            path = target / part
+        else:
+            target = directory / table.name
+            target.mkdir(exist_ok=True)
+            path = target / f'.{part}.tmp'
+        written[table.name] = write_table(table, queryset, path, batch_size, compression)
+        if state is not None and not written[table.name]:
+            path.unlink()
+            continue
+        staged.append((table.name, state is None, path))
+
+    # Publish only once every table is written, then record the run
+    for name, replaces, path in staged:
+        final = directory / name
+        if replaces:
+            shutil.rmtree(final, ignore_errors=True)
+            path.parent.rename(final)
+        else:
+            os.replace(path, final / part)
+
+    runs = manifest['runs'] if incremental else []
+    runs.append({
+        'started_at': started,
+        'finished_at': timezone.now(),
+        'mode': 'incremental' if incremental else 'full',
+        'since': since,
+        'rows': written,
+    })
+    _write_manifest(directory, {
+        'last_run': started,
+        'tables': {**(manifest['tables'] if incremental else {}), **states},
+        'runs': runs,
+    })
+    return written
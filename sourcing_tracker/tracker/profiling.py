@@ -0,0 +1,231 @@
+"""
+On-demand profiling of single requests for staff users.
+
+Add `?_profile=1` (or the `X-Tracker-Profile: 1` header) to any tracker URL while
+logged in as staff. The request runs under a profiler and the result is written to
+TRACKER_PROFILE_DIR:
+- `<name>.prof`: pstats data, for snakeviz / `python -m pstats`
+- `<name>.txt` or `<name>.html`: the rendered call tree with a SQL/render summary
+
+The response carries an `X-Tracker-Profile` header pointing at the rendered result,
+and HTML pages get a small link injected before </body>.
+
+`?_profile=pyinstrument` uses the sampling profiler when it is installed (the default
+when available); `?_profile=cprofile` forces the deterministic one. Requests without
+the trigger only pay for one dict lookup.
+
+In async views the ORM runs in worker threads that the profiler does not follow; their
+time shows up under the awaiting frame and in the SQL summary.
+"""
+import cProfile
+import io
+import pstats
+import re
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+
+from .instrumentation import RequestStats, _stats
+
+try:
+    import pyinstrument
+except ImportError:  # optional dependency
+    pyinstrument = None
+
+TRIGGER_PARAM = '_profile'
+TRIGGER_HEADER = 'HTTP_X_TRACKER_PROFILE'
+PROFILE_NAME = re.compile(r'^[\w-]+$')
+
+
+def get_profile_dir():
+    return Path(getattr(settings, 'TRACKER_PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def _requested_profiler(request):
+    """Return 'cprofile' / 'pyinstrument' when the request asks to be profiled, else None."""
+    value = request.GET.get(TRIGGER_PARAM) or request.META.get(TRIGGER_HEADER)
+    if not value or value in ('0', 'false'):
+        return None
+    if value == 'cprofile' or pyinstrument is None:
+        return 'cprofile'
+    return 'pyinstrument'
+
+
+class _CProfileRun:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def save(self, base_path, summary):
+        self.profiler.dump_stats(f'{base_path}.prof')
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(80)
+        stats.print_callees(30)
+        Path(f'{base_path}.txt').write_text(summary + '\n\n' + out.getvalue())
+        return f'{base_path.name}.txt'
+
+
+class _PyinstrumentRun:
+    def __init__(self, is_async):
+        self.profiler = pyinstrument.Profiler(async_mode='enabled' if is_async else 'disabled')
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def save(self, base_path, summary):
+        session = self.profiler.last_session
+        try:
+            from pyinstrument.renderers import PstatsRenderer
+            data = PstatsRenderer().render(session)
+            if isinstance(data, str):
+                data = data.encode('utf-8', errors='surrogateescape')
+            Path(f'{base_path}.prof').write_bytes(data)
+        except (ImportError, AttributeError):  # older pyinstrument without the pstats renderer
+            pass
+        html = self.profiler.output_html()
+        banner = f'<pre style="margin:1em;font-size:14px">{escape(summary)}</pre>'
+        Path(f'{base_path}.html').write_text(html.replace('<body>', '<body>' + banner, 1))
+        return f'{base_path.name}.html'
+
+
+def _summary(request, response, stats, duration, profiler_name):
+    lines = [
+        f'{request.method} {request.get_full_path()} -> {response.status_code}',
+        f'profiler: {profiler_name}',
+        f'total: {duration * 1000:.1f} ms',
+        f'sql: {stats.sql_time * 1000:.1f} ms in {stats.query_count} queries',
+        f'template render: {stats.render_time * 1000:.1f} ms',
+    ]
+    for sql, count in stats.duplicates()[:5]:
+        lines.append(f'  repeated x{count}: {sql[:200]}')
+    return '\n'.join(lines)
+
+
+class ProfilingMiddleware:
+    """Profile requests carrying the trigger parameter or header when the user is staff."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profiler_name = _requested_profiler(request)
+        if profiler_name is None or not request.user.is_staff:
+            return self.get_response(request)
+        run = _CProfileRun() if profiler_name == 'cprofile' else _PyinstrumentRun(is_async=False)
+        return self._profile(request, run, profiler_name)
+
+    async def __acall__(self, request):
+        profiler_name = _requested_profiler(request)
+        if profiler_name is None or not (await request.auser()).is_staff:
+            return await self.get_response(request)
+        run = _CProfileRun() if profiler_name == 'cprofile' else _PyinstrumentRun(is_async=True)
+        stats, token, start = self._start(run)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(run, stats, token)
+        return self._finish(request, response, run, stats, time.perf_counter() - start, profiler_name)
+
+    def _start(self, run):
+        stats = RequestStats()
+        token = _stats.set(stats)
+        start = time.perf_counter()
+        run.start()
+        return stats, token, start
+
+    def _stop(self, run, stats, token):
+        run.stop()
+        _stats.reset(token)
+        # The profile keeps its own counters; the instrumentation middleware still
+        # needs them for its log record and metrics
+        outer = _stats.get()
+        if outer is not None:
+            outer.add(stats)
+
+    def _profile(self, request, run, profiler_name):
+        stats, token, start = self._start(run)
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(run, stats, token)
+        return self._finish(request, response, run, stats, time.perf_counter() - start, profiler_name)
+
+    def _finish(self, request, response, run, stats, duration, profiler_name):
+        directory = get_profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        match = getattr(request, 'resolver_match', None)
+        view = re.sub(r'[^\w-]', '-', match.view_name) if match else 'request'
+        base_path = directory / f"{timezone.now():%Y%m%d-%H%M%S}-{view}-{uuid.uuid4().hex[:8]}"
+
+        rendered = run.save(base_path, _summary(request, response, stats, duration, profiler_name))
+        url = reverse('profile_detail', args=[rendered.rsplit('.', 1)[0]])
+        response['X-Tracker-Profile'] = url
+        if not response.streaming and response.get('Content-Type', '').startswith('text/html'):
+            link = (
+                f'<a href="{url}" target="_blank" style="position:fixed;bottom:1rem;left:1rem;z-index:9999" '
+                f'class="btn btn-sm btn-warning">Profile: {duration * 1000:.0f} ms</a>'
+            )
+            response.content = response.content.replace(b'</body>', link.encode() + b'</body>', 1)
+            if 'Content-Length' in response:
+                response['Content-Length'] = len(response.content)
+        return response
+
+
+@staff_member_required
+def profile_list(request):
+    """List stored request profiles, newest first."""
+    directory = get_profile_dir()
+    profiles = []
+    if directory.exists():
+        for path in sorted(directory.iterdir(), reverse=True):
+            if path.suffix in ('.txt', '.html'):
+                profiles.append({
+                    'name': path.stem,
+                    'has_pstats': path.with_suffix('.prof').exists(),
+                    'size_kb': round(path.stat().st_size / 1024, 1),
+                })
+    return render(request, 'tracker/profile_list.html', {'profiles': profiles})
+
+
+@staff_member_required
+def profile_detail(request, name):
+    """Serve a rendered call tree, or its pstats file with ?format=pstats."""
+    if not PROFILE_NAME.match(name):
+        raise Http404
+    directory = get_profile_dir()
+    if request.GET.get('format') == 'pstats':
+        candidates = [(directory / f'{name}.prof', 'application/octet-stream')]
+    else:
+        candidates = [(directory / f'{name}.html', 'text/html'), (directory / f'{name}.txt', 'text/plain; charset=utf-8')]
+    for path, content_type in candidates:
+        if path.exists():
+            response = FileResponse(path.open('rb'), content_type=content_type)
+            if path.suffix == '.prof':
+                response['Content-Disposition'] = f'attachment; filename="{path.name}"'
+            return response
+    raise Http404
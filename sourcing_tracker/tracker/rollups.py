@@ -0,0 +1,235 @@
+"""
+Per-partner analytics rollups for the trend charts.
+
+DailyPartnerRollup holds each partner's advances, refunds, deal spend and commission
+(with counts) per day, and MonthlyPartnerRollup the same per calendar month. The
+signals turn every change to a transaction, deal or deal item into deltas and add
+them to both rows with a single UPDATE ... SET x = x + delta each, so charts never
+aggregate the Transaction or Deal tables. Weeks are summed from the daily rows.
+
+Dating follows the ledger: transactions by their date; deal spend, commission and
+deal count by the deal's creation day. Deal spend counts deals whose cost has been
+deducted from the balance; commission is the deal items' commission.
+
+`manage.py rebuild_rollups` recomputes both tables from the hot and archived rows,
+e.g. after migrating or after bulk changes made without signals.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum, Count, Value, ExpressionWrapper
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .fields import MoneyField
+from .models import (
+    Transaction, Deal, DealItem, ArchivedTransaction, ArchivedDeal, ArchivedDealItem,
+    DailyPartnerRollup, MonthlyPartnerRollup,
+)
+
+MONEY_METRICS = ('advances', 'refunds', 'deal_spend', 'commission')
+COUNT_METRICS = ('advance_count', 'refund_count', 'deal_count')
+METRICS = MONEY_METRICS + COUNT_METRICS
+
+GRAINS = ('day', 'week', 'month')
+ZERO = Decimal('0.00')
+BATCH_SIZE = 2000
+
+_suspended = ContextVar('tracker_rollups_suspended', default=False)
+
+
+@contextmanager
+def suspended():
+    """Ignore model changes inside the block, e.g. rows moved to the archive rather than removed."""
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def is_suspended():
+    return _suspended.get()
+
+
+def local_day(value):
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+def as_date(value):
+    """Model date fields hold whatever was assigned, e.g. the raw string from a form post."""
+    return parse_date(value) if isinstance(value, str) else value
+
+
+def deleted_with(origin, model):
+    """True when a post_delete signal comes from deleting `model` rows (a cascade)."""
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+class Deltas:
+    """Metric changes keyed by (partner id, day), applied to the daily and monthly rows together."""
+
+    def __init__(self):
+        self.rows = defaultdict(lambda: defaultdict(int))
+
+    def add(self, partner_id, day, sign=1, **values):
+        row = self.rows[partner_id, day]
+        for name, value in values.items():
+            row[name] += sign * value
+
+    def add_transaction(self, partner_id, day, transaction_type, amount, sign=1):
+        if transaction_type == 'ADVANCE_RECEIVED':
+            self.add(partner_id, day, sign, advances=amount, advance_count=1)
+        else:
+            self.add(partner_id, day, sign, refunds=amount, refund_count=1)
+
+    def apply(self):
+        monthly = Deltas()
+        for (partner_id, day), values in self.rows.items():
+            monthly.add(partner_id, month_start(day), **values)
+        for model, rows in ((DailyPartnerRollup, self.rows), (MonthlyPartnerRollup, monthly.rows)):
+            for (partner_id, day), values in rows.items():
+                _add(model, partner_id, day, {name: value for name, value in values.items() if value})
+
+
+def _add(model, partner_id, day, values):
+    if not values:
+        return
+    changes = {
+        name: F(name) + (Value(value, output_field=MoneyField()) if name in MONEY_METRICS else value)
+        for name, value in values.items()
+    }
+    rows = model.objects.filter(partner_id=partner_id, day=day)
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(partner_id=partner_id, day=day, **values)
+    except IntegrityError:
+        # Created concurrently since the UPDATE above
+        rows.update(**changes)
+
+
+def _item_commission():
+    # paise x quantity is still paise
+    return ExpressionWrapper(Sum(F('commission_per_item') * F('quantity')), output_field=MoneyField())
+
+
+def deal_commission(deal_id):
+    return DealItem.objects.filter(deal_id=deal_id).aggregate(total=_item_commission())['total'] or ZERO
+
+
+def _rebuild_sources():
+    """Querysets grouped by (partner_id, day) for every source of rollup metrics, hot and archived."""
+    for model in (Transaction, ArchivedTransaction):
+        yield model.objects.values('partner_id', day=F('date')).annotate(
+            advances=Sum('amount', filter=Q(transaction_type='ADVANCE_RECEIVED')),
+            refunds=Sum('amount', filter=Q(transaction_type='REFUND_GIVEN')),
+            advance_count=Count('id', filter=Q(transaction_type='ADVANCE_RECEIVED')),
+            refund_count=Count('id', filter=Q(transaction_type='REFUND_GIVEN')),
+        )
+    for model in (Deal, ArchivedDeal):
+        yield model.objects.values('partner_id', day=TruncDate('created_at')).annotate(
+            deal_spend=Sum('actual_cost', filter=Q(cost_deducted=True)),
+            deal_count=Count('id'),
+        )
+    for model in (DealItem, ArchivedDealItem):
+        yield model.objects.values(partner_id=F('deal__partner_id'), day=TruncDate('deal__created_at')).annotate(
+            commission=_item_commission(),
+        )
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute both rollup tables from scratch; returns the number of daily rows."""
+    totals = defaultdict(lambda: defaultdict(int))
+    for rows in _rebuild_sources():
+        for row in rows.order_by():
+            target = totals[row.pop('partner_id'), row.pop('day')]
+            for name, value in row.items():
+                target[name] += value or 0
+
+    monthly = defaultdict(lambda: defaultdict(int))
+    for (partner_id, day), values in totals.items():
+        target = monthly[partner_id, month_start(day)]
+        for name, value in values.items():
+            target[name] += value
+
+    for model, rows in ((DailyPartnerRollup, totals), (MonthlyPartnerRollup, monthly)):
+        model.objects.all().delete()
+        model.objects.bulk_create(
+            (model(partner_id=partner_id, day=day, **values) for (partner_id, day), values in rows.items()),
+            batch_size=BATCH_SIZE,
+        )
+    return len(totals)
+
+
+def default_range(grain, today=None):
+    """The period a chart covers when no dates are given."""
+    today = today or timezone.localdate()
+    if grain == 'day':
+        return today - timedelta(days=89), today
+    if grain == 'week':
+        return week_start(today) - timedelta(weeks=51), today
+    return month_start(today).replace(year=today.year - 3), today
+
+
+def _periods(grain, start, end):
+    if grain == 'day':
+        day = start
+        step = lambda current: current + timedelta(days=1)
+    elif grain == 'week':
+        day = week_start(start)
+        step = lambda current: current + timedelta(weeks=1)
+    else:
+        day = month_start(start)
+        step = lambda current: (current + timedelta(days=32)).replace(day=1)
+    while day <= end:
+        yield day
+        day = step(day)
+
+
+def trend(grain, start, end, partner_id=None, metrics=METRICS):
+    """
+    {'periods': [...], metric: [...]} with one value per day, week or month in
+    `start`..`end`, zero-filled. Reads only the rollup tables: monthly rows for
+    months, daily rows (summed per week) otherwise.
+    """
+    if grain == 'month':
+        model, first, to_period = MonthlyPartnerRollup, month_start(start), None
+    else:
+        # Weeks are folded here: SQLite's week truncation runs per row in Python
+        model, first, to_period = DailyPartnerRollup, start, week_start if grain == 'week' else None
+        if to_period:
+            first = week_start(start)
+    rows = model.objects.filter(day__range=(first, end))
+    if partner_id is not None:
+        rows = rows.filter(partner_id=partner_id)
+    rows = rows.values('day').annotate(**{name: Sum(name) for name in metrics}).order_by()
+
+    by_period = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        target = by_period[to_period(row.pop('day')) if to_period else row.pop('day')]
+        for name, value in row.items():
+            # `value or 0` would turn a Decimal('0.00') total into an int
+            if value is not None:
+                target[name] += value
+    periods = list(_periods(grain, start, end))
+    series = {'periods': [day.isoformat() for day in periods]}
+    for name in metrics:
+        zero = Decimal('0.00') if name in MONEY_METRICS else 0
+        series[name] = [by_period[day].get(name, zero) if day in by_period else zero for day in periods]
+    return series
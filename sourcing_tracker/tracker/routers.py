@@ -0,0 +1,87 @@
+"""
+Database routing for the PostgreSQL profile with a read replica.
+
+Reads go to the `replica` alias and writes to `default` (the primary). Once a
+request performs a write, or arrives shortly after one from the same client, its
+reads are pinned to the primary so users always see their own changes.
+"""
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+PIN_COOKIE = 'tracker_pin_primary'
+
+_pinned = contextvars.ContextVar('tracker_pinned_to_primary', default=False)
+
+
+def pin_to_primary():
+    """Send the rest of the current request's reads to the primary."""
+    _pinned.set(True)
+
+
+class PrimaryReplicaRouter:
+    """Route reads to the replica unless pinned, and all writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if REPLICA not in settings.DATABASES:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if _pinned.get() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replica hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class PrimaryPinningMiddleware:
+    """
+    Pin reads to the primary for unsafe requests, and for a short window after them
+    (TRACKER_REPLICA_PIN_SECONDS) so the redirect that follows a POST sees the write.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'TRACKER_REPLICA_PIN_SECONDS', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _should_pin(self, request):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS') or PIN_COOKIE in request.COOKIES
+
+    def _process_response(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _pinned.set(self._should_pin(request))
+        try:
+            return self._process_response(request, self.get_response(request))
+        finally:
+            _pinned.reset(token)
+
+    async def __acall__(self, request):
+        token = _pinned.set(self._should_pin(request))
+        try:
+            return self._process_response(request, await self.get_response(request))
+        finally:
+            _pinned.reset(token)
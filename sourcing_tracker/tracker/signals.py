@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from decimal import Decimal
-from .models import Transaction, Deal
+from .models import Partner, Transaction, Deal, DealItem
+from .events import publish_partner_change
+from . import metrics, rollups
 
 
 @receiver(post_save, sender=Transaction)
@@ -17,23 +20,34 @@ def update_partner_balance_on_transaction(sender, instance, created, **kwargs):
             partner.current_balance += instance.amount
         elif instance.transaction_type == 'REFUND_GIVEN':
             partner.current_balance -= instance.amount
-        partner.save(update_fields=['current_balance'])
+        partner.save(update_fields=['current_balance', 'updated_at'])
+        metrics.TRANSACTIONS_CREATED.inc_on_commit(type=instance.transaction_type)
+        metrics.BALANCE_UPDATES.inc_on_commit(source='transaction')
 
 
 @receiver(pre_save, sender=Deal)
-def store_previous_actual_cost(sender, instance, **kwargs):
-    """Store the previous actual_cost value before saving."""
+def store_previous_actual_cost(sender, instance, using, **kwargs):
+    """Store the previous actual_cost, status and partner values before saving."""
     if instance.pk:
         try:
-            old_instance = Deal.objects.get(pk=instance.pk)
+            # Read from the database being written to, never from a lagging replica
+            old_instance = Deal.objects.using(using).only(
+                'actual_cost', 'cost_deducted', 'status', 'partner'
+            ).get(pk=instance.pk)
             instance._previous_actual_cost = old_instance.actual_cost
             instance._previous_cost_deducted = old_instance.cost_deducted
+            instance._previous_status = old_instance.status
+            instance._previous_partner_id = old_instance.partner_id
         except Deal.DoesNotExist:
             instance._previous_actual_cost = None
             instance._previous_cost_deducted = False
+            instance._previous_status = None
+            instance._previous_partner_id = None
     else:
         instance._previous_actual_cost = None
         instance._previous_cost_deducted = False
+        instance._previous_status = None
+        instance._previous_partner_id = None
 
 
 @receiver(post_save, sender=Deal)
@@ -48,7 +62,8 @@ def update_partner_balance_on_deal(sender, instance, created, **kwargs):
     if instance.actual_cost and not instance.cost_deducted:
         # Deduct the actual_cost from partner balance
         partner.current_balance -= instance.actual_cost
-        partner.save(update_fields=['current_balance'])
+        partner.save(update_fields=['current_balance', 'updated_at'])
+        metrics.BALANCE_UPDATES.inc_on_commit(source='deal_cost')
         
         # Mark as deducted (avoid recursive save by using update)
         Deal.objects.filter(pk=instance.pk).update(cost_deducted=True)
@@ -60,4 +75,162 @@ def update_partner_balance_on_deal(sender, instance, created, **kwargs):
             # Refund the old cost and deduct the new cost
             cost_difference = instance.actual_cost - previous_cost
             partner.current_balance -= cost_difference
-            partner.save(update_fields=['current_balance'])
+            partner.save(update_fields=['current_balance', 'updated_at'])
+            metrics.BALANCE_UPDATES.inc_on_commit(source='deal_cost_change')
+
+
+@receiver(post_save, sender=Deal)
+def count_deal_status_transition(sender, instance, created, **kwargs):
+    """Count status changes, including the initial status of new deals."""
+    previous = getattr(instance, '_previous_status', None)
+    if created or previous != instance.status:
+        metrics.DEAL_STATUS_TRANSITIONS.inc_on_commit(**{'from': previous or 'NEW', 'to': instance.status})
+
+
+@receiver(post_save, sender=Partner)
+@receiver(post_delete, sender=Partner)
+def publish_partner_saved(sender, instance, **kwargs):
+    """Push the partner's new balance to live dashboards after commit."""
+    publish_partner_change(instance.pk)
+
+
+@receiver(post_save, sender=Deal)
+def publish_deal_created(sender, instance, created, **kwargs):
+    """A new deal changes the partner's deal count."""
+    if created:
+        publish_partner_change(instance.partner_id)
+
+
+@receiver(post_delete, sender=Deal)
+def publish_deal_deleted(sender, instance, **kwargs):
+    """A deleted deal changes the partner's deal count."""
+    publish_partner_change(instance.partner_id)
+
+
+@receiver(post_save, sender=DealItem)
+@receiver(post_delete, sender=DealItem)
+def touch_deal_on_item_change(sender, instance, origin=None, **kwargs):
+    """An item change updates its deal, so the API's updated_since sync picks the deal up."""
+    if rollups.deleted_with(origin, Deal) or rollups.deleted_with(origin, Partner):
+        return
+    Deal.objects.filter(pk=instance.deal_id).update(updated_at=timezone.now())
+
+
+# Analytics rollups: every change becomes a delta on the (partner, day) rollup rows.
+# Deletions cascading from a partner are skipped; its rollup rows go with it.
+
+@receiver(pre_save, sender=Transaction)
+def store_previous_transaction(sender, instance, using, **kwargs):
+    """Store the rollup key and amount of an edited transaction before saving."""
+    instance._previous_rollup = None
+    if instance.pk:
+        instance._previous_rollup = Transaction.objects.using(using).filter(pk=instance.pk).values_list(
+            'partner_id', 'date', 'transaction_type', 'amount'
+        ).first()
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollups_on_transaction(sender, instance, created, **kwargs):
+    if rollups.is_suspended():
+        return
+    deltas = rollups.Deltas()
+    previous = getattr(instance, '_previous_rollup', None)
+    if previous:
+        deltas.add_transaction(*previous, sign=-1)
+    deltas.add_transaction(
+        instance.partner_id, rollups.as_date(instance.date), instance.transaction_type, Decimal(instance.amount)
+    )
+    deltas.apply()
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollups_on_transaction_delete(sender, instance, origin=None, **kwargs):
+    if rollups.is_suspended() or rollups.deleted_with(origin, Partner):
+        return
+    deltas = rollups.Deltas()
+    deltas.add_transaction(
+        instance.partner_id, rollups.as_date(instance.date), instance.transaction_type, instance.amount, sign=-1
+    )
+    deltas.apply()
+
+
+@receiver(post_save, sender=Deal)
+def update_rollups_on_deal(sender, instance, created, **kwargs):
+    """
+    Deal spend follows the balance: the actual cost counts once it has been deducted.
+    A deal moved to another partner takes its count and item commission along.
+    """
+    if rollups.is_suspended():
+        return
+    day = rollups.local_day(instance.created_at)
+    previous_partner_id = getattr(instance, '_previous_partner_id', None) or instance.partner_id
+    previous_spend = (
+        getattr(instance, '_previous_actual_cost', None) or Decimal('0.00')
+        if getattr(instance, '_previous_cost_deducted', False) else Decimal('0.00')
+    )
+    # update_partner_balance_on_deal has just marked the deal deducted if it set a cost
+    deducted = instance.cost_deducted or bool(instance.actual_cost)
+    spend = (instance.actual_cost or Decimal('0.00')) if deducted else Decimal('0.00')
+
+    deltas = rollups.Deltas()
+    deltas.add(previous_partner_id, day, -1, deal_spend=previous_spend)
+    deltas.add(instance.partner_id, day, deal_spend=spend)
+    if created:
+        deltas.add(instance.partner_id, day, deal_count=1)
+    elif previous_partner_id != instance.partner_id:
+        commission = rollups.deal_commission(instance.pk)
+        deltas.add(previous_partner_id, day, -1, deal_count=1, commission=commission)
+        deltas.add(instance.partner_id, day, deal_count=1, commission=commission)
+    deltas.apply()
+
+
+@receiver(post_delete, sender=Deal)
+def update_rollups_on_deal_delete(sender, instance, origin=None, **kwargs):
+    """The items' commission is removed by their own delete signals."""
+    if rollups.is_suspended() or rollups.deleted_with(origin, Partner):
+        return
+    deltas = rollups.Deltas()
+    spend = (instance.actual_cost or Decimal('0.00')) if instance.cost_deducted else Decimal('0.00')
+    deltas.add(instance.partner_id, rollups.local_day(instance.created_at), -1, deal_spend=spend, deal_count=1)
+    deltas.apply()
+
+
+def _deal_rollup_key(deal):
+    return deal.partner_id, rollups.local_day(deal.created_at)
+
+
+@receiver(pre_save, sender=DealItem)
+def store_previous_deal_item(sender, instance, using, **kwargs):
+    """Store the deal and commission of an edited item before saving."""
+    instance._previous_rollup = None
+    if instance.pk:
+        previous = DealItem.objects.using(using).only('deal', 'quantity', 'commission_per_item').filter(
+            pk=instance.pk
+        ).first()
+        if previous:
+            instance._previous_rollup = (previous.deal_id, previous.commission_total)
+
+
+@receiver(post_save, sender=DealItem)
+def update_rollups_on_deal_item(sender, instance, created, **kwargs):
+    if rollups.is_suspended():
+        return
+    deltas = rollups.Deltas()
+    previous = getattr(instance, '_previous_rollup', None)
+    if previous:
+        deal_id, commission = previous
+        deal = instance.deal if deal_id == instance.deal_id else Deal.objects.only('partner', 'created_at').get(pk=deal_id)
+        deltas.add(*_deal_rollup_key(deal), -1, commission=commission)
+    deltas.add(*_deal_rollup_key(instance.deal), commission=Decimal(instance.commission_per_item) * instance.quantity)
+    deltas.apply()
+
+
+@receiver(post_delete, sender=DealItem)
+def update_rollups_on_deal_item_delete(sender, instance, origin=None, **kwargs):
+    if rollups.is_suspended() or rollups.deleted_with(origin, Partner):
+        return
+    # Cascading from a deal: that deal is the origin; otherwise it still exists
+    deal = origin if isinstance(origin, Deal) else Deal.objects.only('partner', 'created_at').get(pk=instance.deal_id)
+    deltas = rollups.Deltas()
+    deltas.add(*_deal_rollup_key(deal), -1, commission=instance.commission_total)
+    deltas.apply()
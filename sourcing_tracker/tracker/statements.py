@@ -0,0 +1,279 @@
+"""
+Monthly partner statements.
+
+A statement shows a partner's opening balance, every advance, refund and deal cost
+deduction in the period with the running balance after each, and the closing balance.
+`build_statements` computes every partner's statement for a period in one go:
+opening balances are the current balances minus everything dated on or after the
+period start (a few grouped sums), and the period's entries are read sorted by
+partner and date from the hot and archived tables, merged, and walked once.
+Deal costs are dated by the deal's creation day, as in the fiscal-year close.
+
+Rendering only needs the built Statement objects, so `generate_statements` hands
+them to worker processes in batches:
+
+    python manage.py generate_statements 2025-03
+"""
+import csv
+import heapq
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils.html import escape
+from django.utils.text import slugify
+
+from .models import Partner, Transaction, Deal, ArchivedTransaction, ArchivedDeal
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+except ImportError:  # optional dependency
+    A4 = None
+
+ZERO = Decimal('0.00')
+CHUNK_SIZE = 2000
+
+KIND_LABELS = {
+    'ADVANCE_RECEIVED': 'Advance Received',
+    'REFUND_GIVEN': 'Refund Given',
+    'DEAL_COST': 'Deal Cost',
+}
+# Same-day order: money in before money out
+KIND_ORDER = {'ADVANCE_RECEIVED': 0, 'REFUND_GIVEN': 1, 'DEAL_COST': 2}
+
+CSV_HEADER = ['Date', 'Type', 'Reference', 'Notes', 'Credit', 'Debit', 'Balance']
+
+
+def statements_dir():
+    return Path(getattr(settings, 'TRACKER_STATEMENTS_DIR', settings.BASE_DIR / 'statements'))
+
+
+def month_bounds(year, month):
+    start = date(year, month, 1)
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+class Statement:
+    """One partner's statement for a period; plain data, so it pickles cheaply to workers."""
+
+    def __init__(self, partner_id, name, gst_number, start, end, opening):
+        self.partner_id = partner_id
+        self.name = name
+        self.gst_number = gst_number
+        self.start = start
+        self.end = end
+        self.opening = opening
+        self.closing = opening
+        self.credits = ZERO
+        self.debits = ZERO
+        # (date, kind, reference, notes, signed amount, balance after)
+        self.lines = []
+
+    @property
+    def filename(self):
+        return f'{self.gst_number}_{slugify(self.name)[:60] or self.partner_id}'
+
+    def add(self, day, kind, reference, notes, amount):
+        self.closing += amount
+        if amount >= 0:
+            self.credits += amount
+        else:
+            self.debits -= amount
+        self.lines.append((day, kind, reference, notes, amount, self.closing))
+
+
+def _signed(kind, amount):
+    return amount if kind == 'ADVANCE_RECEIVED' else -amount
+
+
+def _flows_since(day):
+    """Net change of every partner's balance from entries dated on or after `day`."""
+    flows = defaultdict(Decimal)
+    for model in (Transaction, ArchivedTransaction):
+        rows = (
+            model.objects.filter(date__gte=day)
+            .values('partner_id', 'transaction_type').annotate(total=Sum('amount')).order_by()
+        )
+        for row in rows:
+            flows[row['partner_id']] += _signed(row['transaction_type'], row['total'])
+    for model in (Deal, ArchivedDeal):
+        rows = (
+            model.objects.filter(created_at__date__gte=day, cost_deducted=True)
+            .values('partner_id').annotate(total=Sum('actual_cost')).order_by()
+        )
+        for row in rows:
+            flows[row['partner_id']] -= row['total'] or ZERO
+    return flows
+
+
+def opening_balances(day):
+    """Every partner's balance at the start of `day`."""
+    later = _flows_since(day)
+    return {
+        partner_id: balance - later[partner_id]
+        for partner_id, balance in Partner.objects.values_list('id', 'current_balance')
+    }
+
+
+def _kind_order():
+    """KIND_ORDER in SQL, so each stream is sorted by the key ledger_entries() merges on."""
+    return Case(
+        *(When(transaction_type=kind, then=Value(order)) for kind, order in KIND_ORDER.items()),
+        output_field=IntegerField(),
+    )
+
+
+def _transaction_entries(model, start, end):
+    rows = model.objects.filter(date__lte=end)
+    if start is not None:
+        rows = rows.filter(date__gte=start)
+    rows = (
+        rows.order_by('partner_id', 'date', _kind_order(), 'created_at', 'id')
+        .values_list('partner_id', 'date', 'transaction_type', 'id', 'notes', 'amount')
+    )
+    for partner_id, day, kind, pk, notes, amount in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield partner_id, day, KIND_ORDER[kind], kind, f'TXN-{pk}', notes, _signed(kind, amount)
+
+
+def _deal_entries(model, start, end):
+    rows = model.objects.filter(created_at__date__lte=end, cost_deducted=True, actual_cost__isnull=False)
+    if start is not None:
+        rows = rows.filter(created_at__date__gte=start)
+    rows = (
+        rows.annotate(day=TruncDate('created_at'))
+        .order_by('partner_id', 'created_at', 'id')
+        .values_list('partner_id', 'day', 'reference', 'client_name', 'actual_cost')
+    )
+    order = KIND_ORDER['DEAL_COST']
+    for partner_id, day, reference, client_name, cost in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield partner_id, day, order, 'DEAL_COST', reference, client_name, -cost
+
+
+def ledger_entries(start, end):
+    """
+    Every balance movement dated `start`..`end` (start None: from the beginning) as
+    (partner id, date, same-day order, kind, reference, notes, signed amount) tuples,
+    sorted by partner and date. Streams four ordered queries; nothing is held in memory.
+    """
+    # Each source is sorted by (partner, date, kind); merging keeps that order
+    return heapq.merge(
+        _transaction_entries(Transaction, start, end),
+        _transaction_entries(ArchivedTransaction, start, end),
+        _deal_entries(Deal, start, end),
+        _deal_entries(ArchivedDeal, start, end),
+        key=lambda entry: entry[:3],
+    )
+
+
+def build_statements(start, end, include_inactive=False):
+    """
+    Statements of all partners for `start`..`end`, ordered by partner name.
+    Partners with no entries and a zero opening balance are left out unless
+    `include_inactive` is set.
+    """
+    openings = opening_balances(start)
+    partners = {
+        pk: (name, gst_number)
+        for pk, name, gst_number in Partner.objects.values_list('id', 'name', 'gst_number')
+    }
+    statements = {}
+    current = None
+    for partner_id, day, _, kind, reference, notes, amount in ledger_entries(start, end):
+        if current is None or current.partner_id != partner_id:
+            name, gst_number = partners[partner_id]
+            current = statements[partner_id] = Statement(
+                partner_id, name, gst_number, start, end, openings.get(partner_id, ZERO),
+            )
+        current.add(day, kind, reference, notes, amount)
+
+    for partner_id, (name, gst_number) in partners.items():
+        opening = openings.get(partner_id, ZERO)
+        if partner_id not in statements and (include_inactive or opening):
+            statements[partner_id] = Statement(partner_id, name, gst_number, start, end, opening)
+    return sorted(statements.values(), key=lambda statement: (statement.name.lower(), statement.partner_id))
+
+
+def format_amount(amount):
+    return f'{amount:.2f}'
+
+
+def statement_rows(statement, notes=str):
+    """Opening line, one line per entry and the closing totals, as table cells."""
+    yield [statement.start.isoformat(), 'Opening Balance', '', '', '', '', format_amount(statement.opening)]
+    for day, kind, reference, note, amount, balance in statement.lines:
+        yield [
+            day.isoformat(), KIND_LABELS[kind], reference, notes(note or ''),
+            format_amount(amount) if amount >= 0 else '',
+            format_amount(-amount) if amount < 0 else '',
+            format_amount(balance),
+        ]
+    yield [
+        statement.end.isoformat(), 'Closing Balance', '', '',
+        format_amount(statement.credits), format_amount(statement.debits), format_amount(statement.closing),
+    ]
+
+
+def write_csv(statement, path):
+    with open(path, 'w', newline='', encoding='utf-8') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['Partner', statement.name])
+        writer.writerow(['GST Number', statement.gst_number])
+        writer.writerow(['Period', statement.start.isoformat(), statement.end.isoformat()])
+        writer.writerow([])
+        writer.writerow(CSV_HEADER)
+        writer.writerows(statement_rows(statement))
+
+
+def write_pdf(statement, path):
+    """Render the statement as an A4 PDF; needs the optional reportlab package."""
+    if A4 is None:
+        raise RuntimeError('PDF statements need the reportlab package.')
+    styles = getSampleStyleSheet()
+    # Paragraph wraps long notes inside their column
+    rows = [CSV_HEADER, *statement_rows(statement, notes=lambda note: Paragraph(escape(note), styles['BodyText']))]
+    table = Table(rows, repeatRows=1, colWidths=[62, 78, 70, 140, 55, 55, 60])
+    table.setStyle(TableStyle([
+        ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (4, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.grey),
+        ('LINEABOVE', (0, -1), (-1, -1), 0.5, colors.grey),
+        ('FONT', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    document = SimpleDocTemplate(str(path), pagesize=A4, title=f'Statement {statement.name}')
+    document.build([
+        Paragraph(f'Statement of Account: {escape(statement.name)}', styles['Title']),
+        Paragraph(
+            f'GST {statement.gst_number} &middot; {statement.start:%d %b %Y} to {statement.end:%d %b %Y} '
+            f'&middot; amounts in INR',
+            styles['Normal'],
+        ),
+        Spacer(1, 12),
+        table,
+    ])
+
+
+WRITERS = {'csv': write_csv, 'pdf': write_pdf}
+
+
+def render_statements(statements, directory, formats):
+    """Write each statement in every format to `directory`; returns (partner id, [file names]) pairs."""
+    directory = Path(directory)
+    written = []
+    for statement in statements:
+        files = []
+        for fmt in formats:
+            path = directory / f'{statement.filename}.{fmt}'
+            WRITERS[fmt](statement, path)
+            files.append(path.name)
+        written.append((statement.partner_id, files))
+    return written
@@ -0,0 +1,126 @@
+// Partner typeahead: selects marked with data-partner-typeahead only ship the
+// selected partner; matching partners are fetched as the user types.
+document.querySelectorAll('select[data-partner-typeahead]').forEach(select => {
+    const search = document.createElement('input');
+    search.type = 'search';
+    search.className = 'form-control form-control-sm mb-1';
+    search.placeholder = 'Search partner name or GST...';
+    search.autocomplete = 'off';
+    select.parentNode.insertBefore(search, select);
+
+    let timer = null;
+    search.addEventListener('input', () => {
+        clearTimeout(timer);
+        const query = search.value.trim();
+        if (!query) return;
+        timer = setTimeout(() => {
+            fetch(`${select.dataset.partnerTypeahead}?q=${encodeURIComponent(query)}`)
+                .then(response => response.json())
+                .then(data => {
+                    const selected = select.value;
+                    [...select.options].forEach(option => {
+                        if (option.value && option.value !== selected) option.remove();
+                    });
+                    data.results.forEach(partner => {
+                        if (String(partner.id) === selected) return;
+                        select.add(new Option(partner.label, partner.id));
+                    });
+                });
+        }, 200);
+    });
+});
+
+// Shared modal: rows carry a data-modal-url instead of rendering their own modal.
+// Links inside a loaded fragment (e.g. Delete on the deal form) swap the content in place.
+const sharedModal = document.getElementById('sharedModal');
+const sharedDialog = sharedModal.querySelector('.modal-dialog');
+const sharedContent = sharedModal.querySelector('.modal-content');
+const sharedPlaceholder = sharedContent.innerHTML;
+let sharedRequest = 0;
+const loadSharedModal = trigger => {
+    const request = ++sharedRequest;
+    sharedDialog.classList.toggle('modal-lg', trigger.dataset.modalSize === 'lg');
+    sharedContent.innerHTML = sharedPlaceholder;
+    fetch(trigger.dataset.modalUrl)
+        .then(response => {
+            if (!response.ok) throw new Error(response.statusText);
+            return response.text();
+        })
+        .then(html => {
+            if (request === sharedRequest) sharedContent.innerHTML = html;
+        })
+        .catch(() => {
+            if (request !== sharedRequest) return;
+            sharedContent.innerHTML = '<div class="modal-body text-danger">Could not load this form. Reload the page and try again.</div>';
+        });
+};
+sharedModal.addEventListener('show.bs.modal', event => {
+    if (event.relatedTarget && event.relatedTarget.dataset.modalUrl) loadSharedModal(event.relatedTarget);
+});
+sharedModal.addEventListener('click', event => {
+    const trigger = event.target.closest('[data-modal-url]');
+    if (trigger) loadSharedModal(trigger);
+});
+
+// Forms marked data-fragment-form post in the background and swap the changed
+// card or row (and any messages) into the page instead of reloading it.
+// data-fragment-form="reset" clears the form after a successful post.
+const applyFragment = html => {
+    const response = document.createElement('template');
+    response.innerHTML = html;
+    response.content.querySelectorAll(':scope > template').forEach(part => {
+        if (part.dataset.remove) {
+            document.getElementById(part.dataset.remove)?.remove();
+            return;
+        }
+        [...part.content.children].forEach(node => {
+            const existing = node.id && document.getElementById(node.id);
+            if (part.dataset.prependTo) {
+                existing?.remove();
+                document.getElementById(part.dataset.prependTo)?.prepend(node);
+            } else if (existing) {
+                existing.replaceWith(node);
+            }
+        });
+    });
+};
+document.addEventListener('submit', event => {
+    const form = event.target.closest('form[data-fragment-form]');
+    if (!form) return;
+    event.preventDefault();
+    form.querySelectorAll('[type="submit"]').forEach(button => button.disabled = true);
+    fetch(form.action, {method: 'POST', body: new FormData(form), headers: {'X-Tracker-Fragment': '1'}})
+        .then(response => {
+            if (!response.ok) throw new Error(response.statusText);
+            return response.text();
+        })
+        .then(html => {
+            applyFragment(html);
+            const modal = form.closest('.modal');
+            if (modal) bootstrap.Modal.getInstance(modal)?.hide();
+            if (form.dataset.fragmentForm === 'reset') form.reset();
+        })
+        // The post may have gone through; reload rather than submit it twice
+        .catch(() => window.location.reload())
+        .finally(() => form.querySelectorAll('[type="submit"]').forEach(button => button.disabled = false));
+});
+
+// Export jobs still queued or running poll their status; the page reloads to show
+// the download link once one finishes.
+const exportJobs = document.querySelectorAll('[data-export-job]');
+if (exportJobs.length) {
+    const pollExports = () => Promise.all([...exportJobs].map(row =>
+        fetch(row.dataset.exportJob)
+            .then(response => response.json())
+            .then(job => {
+                row.querySelector('.progress-bar').style.width = `${job.percent}%`;
+                row.querySelector('[data-export-label]').textContent =
+                    job.status === 'RUNNING' ? `${job.status_label} ${job.percent}%` : job.status_label;
+                return job.status === 'DONE' || job.status === 'FAILED';
+            })
+    )).then(finished => {
+        if (finished.some(Boolean)) window.location.reload();
+        else setTimeout(pollExports, 2000);
+    });
+    setTimeout(pollExports, 2000);
+}
@@ -1,3 +1,1480 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.http import HttpResponse, QueryDict
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import assets, events, exports, legacy, loadgen, metrics, parquet, rollups, routers, views, xlsx
+from .aging import AgingReport, compute_aging, save_snapshot
+from .archive import FiscalYearError, close_fiscal_year
+from .forms import TransactionForm
+from .instrumentation import RequestInstrumentationMiddleware
+from .statements import build_statements, month_bounds
+from .models import (
+    Partner, Transaction, Deal, DealItem, DailyPartnerRollup, MonthlyPartnerRollup,
+    ArchivedTransaction, ArchivedDeal, ArchivedDealItem, OpeningBalance, ExportJob,
+    PartnerEvent,
+)
+
+
+def make_partner(name='Acme Traders', gst_number='27AAAAA0000A1Z5', **kwargs):
+    return Partner.objects.create(name=name, gst_number=gst_number, **kwargs)
+
+
+def make_transaction(partner, amount, transaction_type='ADVANCE_RECEIVED', date=None, **kwargs):
+    return Transaction.objects.create(
+        partner=partner, amount=Decimal(amount), transaction_type=transaction_type,
+        date=date or timezone.localdate(), **kwargs
+    )
+
+
+def rollup_rows():
+    """Both rollup tables as sorted tuples, leaving out rows that net to zero."""
+    fields = ('partner_id', 'day', *rollups.METRICS)
+    return {
+        model.__name__: sorted(row for row in model.objects.values_list(*fields) if any(row[2:]))
+        for model in (DailyPartnerRollup, MonthlyPartnerRollup)
+    }
+
+
+def raw_value(table, column, pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {column} FROM {table} WHERE id = %s', [pk])
+        return cursor.fetchone()[0]
+
+
+class MoneyFieldTests(TestCase):
+    def test_round_trip_stores_paise(self):
+        partner = make_partner(current_balance=Decimal('1234.56'))
+        self.assertEqual(raw_value('tracker_partner', 'current_balance', partner.pk), 123456)
+        partner.refresh_from_db()
+        self.assertEqual(partner.current_balance, Decimal('1234.56'))
+
+    def test_rounds_half_up_to_the_paisa(self):
+        partner = make_partner(current_balance=Decimal('0.005'))
+        partner.refresh_from_db()
+        self.assertEqual(partner.current_balance, Decimal('0.01'))
+
+    def test_aggregates_are_exact_decimals(self):
+        partner = make_partner()
+        for _ in range(10):
+            make_transaction(partner, '0.10')
+        total = Transaction.objects.aggregate(total=Sum('amount'))['total']
+        self.assertEqual(total, Decimal('1.00'))
+        partner.refresh_from_db()
+        self.assertEqual(partner.current_balance, Decimal('1.00'))
+
+
+class MoneyMigrationTests(TransactionTestCase):
+    """0006 turns the decimal money columns into paise and back without losing a paisa."""
+
+    databases = {'default', 'replica'}
+    before = [('tracker', '0005_partnerevent')]
+    after = [('tracker', '0006_money_in_paise')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_forward_and_reverse(self):
+        apps = self.migrate(self.before)
+        partner = apps.get_model('tracker', 'Partner').objects.create(
+            name='Acme', gst_number='27AAAAA0000A1Z5', current_balance=Decimal('123456789.99'),
+        )
+        deal = apps.get_model('tracker', 'Deal').objects.create(
+            partner_id=partner.pk, reference='DEAL-1', estimated_cost=Decimal('0.05'), actual_cost=None,
+        )
+        item = apps.get_model('tracker', 'DealItem').objects.create(
+            deal_id=deal.pk, item_name='Widget', quantity=3,
+            item_price=Decimal('9999999.99'), commission_per_item=Decimal('1234567.89'),
+        )
+
+        apps = self.migrate(self.after)
+        self.assertEqual(raw_value('tracker_partner', 'current_balance', partner.pk), 12345678999)
+        self.assertEqual(raw_value('tracker_dealitem', 'commission_per_item', item.pk), 123456789)
+        self.assertEqual(raw_value('tracker_deal', 'estimated_cost', deal.pk), 5)
+        self.assertIsNone(raw_value('tracker_deal', 'actual_cost', deal.pk))
+        migrated = apps.get_model('tracker', 'DealItem').objects.get(pk=item.pk)
+        self.assertEqual(migrated.item_price, Decimal('9999999.99'))
+
+        apps = self.migrate(self.before)
+        self.assertEqual(
+            apps.get_model('tracker', 'Partner').objects.get(pk=partner.pk).current_balance,
+            Decimal('123456789.99'),
+        )
+        reverted = apps.get_model('tracker', 'DealItem').objects.get(pk=item.pk)
+        self.assertEqual(
+            (reverted.item_price, reverted.commission_per_item),
+            (Decimal('9999999.99'), Decimal('1234567.89')),
+        )
+        self.assertEqual(apps.get_model('tracker', 'Deal').objects.get(pk=deal.pk).estimated_cost, Decimal('0.05'))
+
+
+@override_settings(TRACKER_INGEST_TOKEN='secret')
+class BulkIngestTests(TestCase):
+    def setUp(self):
+        self.partner = make_partner()
+
+    def ingest(self, *lines, token='secret'):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        response = self.client.post(
+            reverse('api_bulk_ingest'), '\n'.join(json.dumps(line) for line in lines),
+            content_type='application/x-ndjson', **headers,
+        )
+        if not response.streaming:
+            return response, None
+        return response, [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_disabled_without_a_token(self):
+        with override_settings(TRACKER_INGEST_TOKEN=None):
+            response, _ = self.ingest({'type': 'transaction'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_rejects_a_wrong_token(self):
+        response, _ = self.ingest({'type': 'transaction'}, token='wrong')
+        self.assertEqual(response.status_code, 401)
+        response, _ = self.ingest({'type': 'transaction'}, token=None)
+        self.assertEqual(response.status_code, 401)
+
+    def test_balance_history_and_rollups(self):
+        day = date(2025, 4, 1)
+        response, results = self.ingest(
+            {'type': 'transaction', 'partner': self.partner.gst_number, 'transaction_type': 'ADVANCE_RECEIVED',
+             'amount': '1000.00', 'date': day.isoformat()},
+            {'type': 'transaction', 'partner': str(self.partner.pk), 'transaction_type': 'ADVANCE_RECEIVED',
+             'amount': '500.50', 'date': day.isoformat()},
+            {'type': 'transaction', 'partner': self.partner.gst_number, 'transaction_type': 'REFUND_GIVEN',
+             'amount': '200.25', 'date': day.isoformat()},
+            {'type': 'transaction', 'partner': self.partner.gst_number, 'transaction_type': 'REFUND_GIVEN',
+             'amount': '-5', 'date': day.isoformat()},
+            {'type': 'deal', 'partner': self.partner.gst_number, 'client_name': 'Client',
+             'items': [{'item_name': 'Widget', 'quantity': 3, 'item_price': '100.00', 'commission_per_item': '2.50'}]},
+        )
+        self.assertEqual(response.status_code, 200)
+        # Invalid lines are answered at once, valid ones when their batch commits
+        statuses = {result['line']: result for result in results[:-1]}
+        self.assertEqual([statuses[line]['status'] for line in range(1, 6)],
+                         ['created', 'created', 'created', 'error', 'created'])
+        self.assertEqual(results[-1]['summary'], {'lines': 5, 'created': 4, 'errors': 1})
+
+        self.partner.refresh_from_db()
+        self.assertEqual(self.partner.current_balance, Decimal('1300.25'))
+        latest = self.partner.history.first()
+        self.assertEqual((latest.history_type, latest.history_change_reason), ('~', 'Bulk ingest'))
+        self.assertEqual(latest.current_balance, Decimal('1300.25'))
+
+        rollup = DailyPartnerRollup.objects.get(partner=self.partner, day=day)
+        self.assertEqual(
+            (rollup.advances, rollup.refunds, rollup.advance_count, rollup.refund_count),
+            (Decimal('1500.50'), Decimal('200.25'), 2, 1),
+        )
+        deal = Deal.objects.get(pk=statuses[5]['id'])
+        self.assertEqual(deal.reference, statuses[5]['reference'])
+        deal_rollup = DailyPartnerRollup.objects.get(partner=self.partner, day=rollups.local_day(deal.created_at))
+        self.assertEqual((deal_rollup.commission, deal_rollup.deal_count), (Decimal('7.50'), 1))
+
+        incremental = rollup_rows()
+        rollups.rebuild()
+        self.assertEqual(rollup_rows(), incremental)
+
+
+class IncrementalRollupTests(TestCase):
+    """The signal-maintained rollups always equal a rebuild from the source rows."""
+
+    def setUp(self):
+        self.partner = make_partner()
+        self.other = make_partner(name='Beta Exports', gst_number='29BBBBB1111B1Z5')
+
+    def assertMatchesRebuild(self):
+        incremental = rollup_rows()
+        rollups.rebuild()
+        self.assertEqual(incremental, rollup_rows())
+
+    def test_transactions(self):
+        advance = make_transaction(self.partner, '1000.00', date=date(2025, 3, 31))
+        refund = make_transaction(self.partner, '250.00', 'REFUND_GIVEN', date=date(2025, 4, 2))
+        self.assertMatchesRebuild()
+
+        advance.amount = Decimal('1200.00')
+        advance.date = date(2025, 4, 1)
+        advance.save()
+        refund.partner = self.other
+        refund.transaction_type = 'ADVANCE_RECEIVED'
+        refund.save()
+        self.assertMatchesRebuild()
+
+        advance.delete()
+        self.assertMatchesRebuild()
+
+    def test_deals_and_items(self):
+        deal = Deal.objects.create(partner=self.partner, client_name='Client')
+        item = DealItem.objects.create(deal=deal, item_name='Widget', quantity=4,
+                                       item_price=Decimal('100.00'), commission_per_item=Decimal('2.50'))
+        DealItem.objects.create(deal=deal, item_name='Gadget', quantity=1,
+                                item_price=Decimal('80.00'), commission_per_item=Decimal('1.25'))
+        self.assertMatchesRebuild()
+
+        deal.actual_cost = Decimal('480.00')
+        deal.save()
+        self.assertMatchesRebuild()
+        deal.refresh_from_db()
+        deal.actual_cost = Decimal('500.00')
+        deal.save()
+        self.assertMatchesRebuild()
+
+        item.quantity = 6
+        item.save()
+        item.delete()
+        self.assertMatchesRebuild()
+
+        deal.refresh_from_db()
+        deal.partner = self.other
+        deal.save()
+        self.assertMatchesRebuild()
+
+        deal.delete()
+        self.assertMatchesRebuild()
+
+    def test_partner_delete(self):
+        make_transaction(self.partner, '10.00')
+        make_transaction(self.other, '20.00')
+        deal = Deal.objects.create(partner=self.partner, actual_cost=Decimal('5.00'))
+        DealItem.objects.create(deal=deal, item_name='Widget', item_price=Decimal('5.00'),
+                                commission_per_item=Decimal('0.50'))
+        self.partner.delete()
+        self.assertMatchesRebuild()
+
+
+class LedgerMixin:
+    """A small ledger over the last few months; statements and aging must land on current_balance."""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.partner = make_partner()
+        self.other = make_partner(name='Beta Exports', gst_number='29BBBBB1111B1Z5')
+        make_transaction(self.partner, '1000.00', date=self.today - timedelta(days=100))
+        make_transaction(self.partner, '500.00', date=self.today - timedelta(days=10))
+        make_transaction(self.partner, '1200.00', 'REFUND_GIVEN', date=self.today - timedelta(days=5))
+        Deal.objects.create(partner=self.partner, actual_cost=Decimal('50.00'))
+        make_transaction(self.other, '100.00', date=self.today - timedelta(days=40))
+        Deal.objects.create(partner=self.other, actual_cost=Decimal('130.00'))
+
+    def balances(self):
+        return dict(Partner.objects.values_list('id', 'current_balance'))
+
+
+class StatementTests(LedgerMixin, TestCase):
+    def test_statement_closes_on_the_current_balance(self):
+        start = self.today - timedelta(days=60)
+        statements = {statement.partner_id: statement for statement in build_statements(start, self.today)}
+        for partner_id, balance in self.balances().items():
+            statement = statements[partner_id]
+            self.assertEqual(statement.closing, balance)
+            self.assertEqual(statement.opening + statement.credits - statement.debits, statement.closing)
+        self.assertEqual(statements[self.partner.pk].opening, Decimal('1000.00'))
+
+    def test_consecutive_months_chain(self):
+        first = month_bounds(self.today.year, self.today.month)[0] - timedelta(days=1)
+        previous_start, previous_end = month_bounds(first.year, first.month)
+        this_start, this_end = month_bounds(self.today.year, self.today.month)
+        closing = {s.partner_id: s.closing for s in build_statements(previous_start, previous_end, include_inactive=True)}
+        opening = {s.partner_id: s.opening for s in build_statements(this_start, this_end, include_inactive=True)}
+        self.assertEqual(closing, opening)
+
+    def test_money_in_before_money_out_on_the_same_day(self):
+        day = self.today - timedelta(days=2)
+        make_transaction(self.other, '30.00', 'REFUND_GIVEN', date=day)
+        make_transaction(self.other, '30.00', date=day)
+        statement = next(s for s in build_statements(day, day) if s.partner_id == self.other.pk)
+        self.assertEqual([line[1] for line in statement.lines], ['ADVANCE_RECEIVED', 'REFUND_GIVEN'])
+
+
+class AgingTests(LedgerMixin, TestCase):
+    def test_aging_totals_match_balances(self):
+        report = compute_aging(self.today)
+        rows = {row.partner_id: row for row in report.partners}
+        for partner_id, balance in self.balances().items():
+            self.assertEqual(rows[partner_id].balance, balance)
+        self.assertEqual(report.balance, sum(self.balances().values()))
+
+        # FIFO: the refund used the 100-day advance and 200 of the 10-day one, the deal 50 more
+        aged = rows[self.partner.pk]
+        self.assertEqual(aged.buckets, [Decimal('250.00'), Decimal('0.00'), Decimal('0.00'), Decimal('0.00')])
+        self.assertEqual(aged.oldest, self.today - timedelta(days=10))
+        self.assertEqual(rows[self.other.pk].overdrawn, Decimal('30.00'))
+
+    def test_snapshot_round_trip(self):
+        report = compute_aging(self.today)
+        restored = AgingReport.from_snapshot(save_snapshot(report))
+        self.assertEqual(restored.total_rows, report.total_rows)
+        self.assertEqual(restored.balance, sum(self.balances().values()))
+
+
+class APITests(TestCase):
+    def setUp(self):
+        self.partners = [
+            make_partner(name=f'Partner {index}', gst_number=f'27AAAAA000{index}A1Z5') for index in range(5)
+        ]
+
+    def get(self, name, **params):
+        return self.client.get(reverse(name), params)
+
+    def pages(self, name, cursor=None, **params):
+        seen = []
+        while True:
+            body = self.get(name, **params, **({'cursor': cursor} if cursor else {})).json()
+            seen.append([row['id'] for row in body['results']])
+            cursor = body['next_cursor']
+            if cursor is None:
+                return seen
+
+    def test_cursor_pages_cover_every_row_once(self):
+        pages = self.pages('api_partner_list', limit=2, fields='id,name')
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), [partner.pk for partner in self.partners])
+
+    def test_rows_updated_while_paging_come_later(self):
+        body = self.get('api_partner_list', limit=2).json()
+        self.partners[0].save()
+        rest = self.pages('api_partner_list', limit=2, cursor=body['next_cursor'])
+        self.assertEqual(sum(rest, []), [partner.pk for partner in self.partners[2:] + self.partners[:1]])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.get('api_partner_list', cursor='not-a-cursor').status_code, 400)
+        self.assertEqual(self.get('api_partner_list', fields='id,secret').status_code, 400)
+        self.assertEqual(self.get('api_partner_list', updated_since='yesterday').status_code, 400)
+
+    def test_not_modified_until_the_data_changes(self):
+        first = self.get('api_transaction_list')
+        self.assertEqual(first.status_code, 200)
+        again = self.client.get(reverse('api_transaction_list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        make_transaction(self.partners[0], '10.00')
+        changed = self.client.get(reverse('api_transaction_list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(len(changed.json()['results']), 1)
+
+    def test_item_edit_marks_the_deal_updated(self):
+        deal = Deal.objects.create(partner=self.partners[0])
+        item = DealItem.objects.create(deal=deal, item_name='Widget', item_price=Decimal('5.00'))
+        since = timezone.now().isoformat()
+        self.assertEqual(self.get('api_deal_list', updated_since=since).json()['results'], [])
+        item.quantity = 2
+        item.save()
+        results = self.get('api_deal_list', updated_since=since).json()['results']
+        self.assertEqual([row['id'] for row in results], [deal.pk])
+        self.assertEqual(results[0]['items'][0]['quantity'], 2)
+
+    def test_archived_rows_are_listed_as_tombstones(self):
+        txn = make_transaction(self.partners[0], '10.00', date=date(2023, 5, 1))
+        since = timezone.now().isoformat()
+        close_fiscal_year(2023)
+        self.assertEqual(self.get('api_transaction_list').json()['results'], [])
+        tombstones = self.get('api_archived_transaction_list', updated_since=since).json()['results']
+        self.assertEqual([(row['id'], row['fiscal_year']) for row in tombstones], [(txn.pk, 2023)])
+        later = timezone.now().isoformat()
+        self.assertEqual(self.get('api_archived_transaction_list', updated_since=later).json()['results'], [])
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        self.partner = make_partner()
+        self.txn = make_transaction(self.partner, '10.00')
+
+    def get(self, path, etag=None):
+        return self.client.get(path, **({'HTTP_IF_NONE_MATCH': etag} if etag else {}))
+
+    def test_unchanged_page_answers_304(self):
+        first = self.get(reverse('ledger'))
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/'))
+        self.assertIn('no-cache', first['Cache-Control'])
+        again = self.get(reverse('ledger'), first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+
+    def test_query_string_is_part_of_the_etag(self):
+        etag = self.get(reverse('ledger'))['ETag']
+        filtered = self.get(f"{reverse('ledger')}?partner={self.partner.pk}", etag)
+        self.assertEqual(filtered.status_code, 200)
+        self.assertNotEqual(filtered['ETag'], etag)
+
+    def test_data_changes_invalidate(self):
+        etag = self.get(reverse('ledger'))['ETag']
+        self.txn.notes = 'Edited'
+        self.txn.save()
+        edited = self.get(reverse('ledger'), etag)
+        self.assertEqual(edited.status_code, 200)
+
+        etag = edited['ETag']
+        self.txn.delete()
+        self.assertEqual(self.get(reverse('ledger'), etag).status_code, 200)
+
+    def test_other_pages(self):
+        for name in ('dashboard', 'logistics'):
+            etag = self.get(reverse(name))['ETag']
+            self.assertEqual(self.get(reverse(name), etag).status_code, 304)
+            Deal.objects.create(partner=self.partner, client_name=name)
+            self.assertEqual(self.get(reverse(name), etag).status_code, 200)
+
+
+class FiscalYearCloseTests(TestCase):
+    """Closing a year moves rows to the archive without changing any figure derived from them."""
+
+    def setUp(self):
+        self.partner = make_partner()
+        self.other = make_partner(name='Beta Exports', gst_number='29BBBBB1111B1Z5')
+        make_transaction(self.partner, '1000.00', date=date(2023, 4, 10))
+        make_transaction(self.partner, '300.00', 'REFUND_GIVEN', date=date(2024, 3, 31))
+        make_transaction(self.partner, '50.00', date=date(2024, 4, 1))
+        make_transaction(self.other, '700.00', date=date(2023, 12, 1))
+        self.delivered = self.old_deal(self.partner, 'DELIVERED', '200.00', date(2023, 6, 1))
+        self.open_deal = self.old_deal(self.other, 'SOURCING', '100.00', date(2023, 7, 1))
+        rollups.rebuild()
+
+    def old_deal(self, partner, status, cost, day):
+        deal = Deal.objects.create(partner=partner, status=status, actual_cost=Decimal(cost))
+        DealItem.objects.create(deal=deal, item_name='Widget', quantity=2,
+                                item_price=Decimal(cost) / 2, commission_per_item=Decimal('5.00'))
+        created_at = timezone.make_aware(datetime.combine(day, time(12)))
+        Deal.objects.filter(pk=deal.pk).update(created_at=created_at)
+        return deal
+
+    def figures(self):
+        return {
+            'balances': dict(Partner.objects.values_list('id', 'current_balance')),
+            'statements': [
+                (s.partner_id, s.opening, s.closing, s.credits, s.debits, s.lines)
+                for start, end in ((date(2023, 4, 1), date(2024, 3, 31)), (date(2024, 4, 1), timezone.localdate()))
+                for s in build_statements(start, end, include_inactive=True)
+            ],
+            'aging': [(row.partner_id, row.buckets, row.overdrawn) for row in compute_aging().partners],
+            'rollups': rollup_rows(),
+        }
+
+    def test_close_preserves_statements_and_rollups(self):
+        before = self.figures()
+        close = close_fiscal_year(2023)
+        self.assertEqual((close.transactions_archived, close.deals_archived, close.deal_items_archived), (3, 1, 1))
+        self.assertEqual(self.figures(), before)
+
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertFalse(Deal.objects.filter(pk=self.delivered.pk).exists())
+        self.assertTrue(Deal.objects.filter(pk=self.open_deal.pk).exists())
+        self.assertEqual(ArchivedTransaction.objects.count(), 3)
+        self.assertEqual(ArchivedDeal.objects.get().pk, self.delivered.pk)
+        self.assertEqual(ArchivedDealItem.objects.count(), 1)
+        self.assertGreater(close.history_archived, 0)
+
+        closing = {s.partner_id: s.closing for s in build_statements(date(2023, 4, 1), date(2024, 3, 31),
+                                                                       include_inactive=True)}
+        opening = dict(OpeningBalance.objects.filter(fiscal_year=2024).values_list('partner_id', 'amount'))
+        self.assertEqual(opening, closing)
+
+        rollups.rebuild()
+        self.assertEqual(rollup_rows(), before['rollups'])
+
+    def test_years_close_in_order_and_only_when_over(self):
+        close_fiscal_year(2023)
+        with self.assertRaises(FiscalYearError):
+            close_fiscal_year(2023)
+        current = timezone.localdate().year
+        with self.assertRaises(FiscalYearError):
+            close_fiscal_year(current)
+
+
+class LegacyConversionTests(TestCase):
+    def setUp(self):
+        self.partner = make_partner()
+        self.even = self.legacy_deal('Bolts', 4, actual_cost='100.00')
+        self.uneven = self.legacy_deal('Nuts', 3, actual_cost='100.00')
+        self.estimate_only = self.legacy_deal('Screws', 2, estimated_cost='80.00')
+        self.converted = Deal.objects.create(partner=self.partner, item_name='Washers')
+        DealItem.objects.create(deal=self.converted, item_name='Washers', item_price=Decimal('1.00'))
+
+    def legacy_deal(self, name, quantity, **costs):
+        costs = {field: Decimal(value) for field, value in costs.items()}
+        return Deal.objects.create(
+            partner=self.partner, item_name=name, quantity=quantity, commission_percent=Decimal('5.00'), **costs
+        )
+
+    def commission_by_partner(self):
+        totals = {}
+        for deal in Deal.objects.all():
+            totals[deal.partner_id] = totals.get(deal.partner_id, Decimal('0.00')) + deal.commission_amount
+        return totals
+
+    def run_conversion(self, batch_size=500):
+        checkpoint = legacy.get_checkpoint(restart=True)
+        while legacy.convert_batch(checkpoint, batch_size):
+            pass
+        return checkpoint
+
+    def test_items_match_the_legacy_fields(self):
+        before = self.commission_by_partner()
+        checkpoint = self.run_conversion(batch_size=1)
+        self.assertEqual(self.commission_by_partner(), before)
+        self.assertFalse(legacy.legacy_deals().exists())
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.processed, checkpoint.converted), (3, 3))
+
+        even = self.even.items.get()
+        self.assertEqual((even.quantity, even.item_price, even.commission_per_item),
+                         (4, Decimal('25.00'), Decimal('1.25')))
+        uneven = self.uneven.items.get()
+        self.assertEqual((uneven.item_name, uneven.quantity, uneven.item_price, uneven.commission_total),
+                         ('Nuts (x3)', 1, Decimal('100.00'), Decimal('5.00')))
+        estimate = self.estimate_only.items.get()
+        self.assertEqual((estimate.quantity, estimate.item_price, estimate.commission_per_item),
+                         (2, Decimal('40.00'), Decimal('0.00')))
+        self.assertEqual(self.converted.items.count(), 1)
+        self.assertEqual(even.history.first().history_change_reason, legacy.CHANGE_REASON)
+
+    def test_rollups_and_updated_at(self):
+        rollups.rebuild()
+        started = timezone.now()
+        self.run_conversion()
+        self.assertGreaterEqual(Deal.objects.get(pk=self.even.pk).updated_at, started)
+        incremental = rollup_rows()
+        rollups.rebuild()
+        self.assertEqual(rollup_rows(), incremental)
+
+    def test_commission_mismatch_rolls_the_batch_back(self):
+        def off_by_a_paisa(deal):
+            item = original(deal)
+            item.commission_per_item += Decimal('0.01')
+            return item
+
+        original = legacy.legacy_item
+        checkpoint = legacy.get_checkpoint()
+        with mock.patch.object(legacy, 'legacy_item', off_by_a_paisa):
+            with self.assertRaises(legacy.CommissionMismatch):
+                legacy.convert_batch(checkpoint, 500)
+        self.assertEqual(legacy.legacy_deals().count(), 3)
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.last_id, checkpoint.converted), (0, 0))
+
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.jobs = [ExportJob.objects.create(kind='ledger_csv', key=f'key-{index}') for index in range(3)]
+
+    def test_workers_claim_each_job_once_oldest_first(self):
+        claimed = [exports.claim_job(worker) for worker in ('a', 'b', 'a', 'b')]
+        self.assertEqual([job and job.pk for job in claimed], [job.pk for job in self.jobs] + [None])
+        self.assertEqual(
+            list(ExportJob.objects.order_by('pk').values_list('status', 'worker')),
+            [('RUNNING', 'a'), ('RUNNING', 'b'), ('RUNNING', 'a')],
+        )
+
+    def test_worker_that_loses_the_race_takes_the_next_job(self):
+        real_now = timezone.now
+        raced = []
+
+        def other_worker_claims_first():
+            # Runs between the queued select and the claiming UPDATE
+            if not raced:
+                raced.append(ExportJob.objects.filter(pk=self.jobs[0].pk).update(status='RUNNING', worker='b'))
+            return real_now()
+
+        with mock.patch.object(exports.timezone, 'now', other_worker_claims_first):
+            job = exports.claim_job('a')
+        self.assertEqual(job.pk, self.jobs[1].pk)
+        self.assertEqual(ExportJob.objects.get(pk=self.jobs[0].pk).worker, 'b')
+
+    def test_stale_jobs_are_requeued(self):
+        stale, fresh = exports.claim_job('a'), exports.claim_job('b')
+        ExportJob.objects.filter(pk=stale.pk).update(
+            heartbeat_at=timezone.now() - timedelta(seconds=exports.STALE_AFTER + 1),
+        )
+        self.assertEqual(exports.requeue_stale(), 1)
+        self.assertEqual(ExportJob.objects.get(pk=stale.pk).status, 'QUEUED')
+        self.assertEqual(ExportJob.objects.get(pk=fresh.pk).status, 'RUNNING')
+        self.assertEqual(exports.claim_job('c').pk, stale.pk)
+
+    def test_submit_reuses_pending_and_fresh_jobs(self):
+        ExportJob.objects.all().delete()
+        partner = make_partner()
+        make_transaction(partner, '10.00')
+        job, reused = exports.submit('ledger_csv', QueryDict(''))
+        self.assertFalse(reused)
+        self.assertEqual(exports.submit('ledger_csv', QueryDict('')), (job, True))
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            self.assertTrue(exports.run_job(exports.claim_job('a')))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.progress), ('DONE', 1))
+            with job.result.open('rb') as fh:
+                self.assertIn(b'Acme Traders', fh.read())
+            self.assertEqual(exports.submit('ledger_csv', QueryDict('')), (job, True))
+
+            make_transaction(partner, '5.00')
+            newer, reused = exports.submit('ledger_csv', QueryDict(''))
+            self.assertFalse(reused)
+            self.assertNotEqual(newer.pk, job.pk)
+
+
+class PartnerSearchTests(TestCase):
+    def setUp(self):
+        self.partners = [
+            make_partner(name=f'Supplier {index:02d}', gst_number=f'27SUPPL{index:04d}Z5') for index in range(30)
+        ]
+        self.acme = make_partner(name='Acme  Traders', gst_number='29ACMEA0000A1Z5')
+
+    def search(self, **params):
+        return self.client.get(reverse('partner_search'), params).json()['results']
+
+    def test_name_prefix_ignores_case_and_spacing(self):
+        results = self.search(q='  ACME   tr')
+        self.assertEqual([row['id'] for row in results], [self.acme.pk])
+        self.assertEqual(results[0]['label'], 'Acme  Traders (29ACMEA0000A1Z5)')
+        self.assertEqual(self.search(q='traders'), [])
+
+    def test_gst_prefix(self):
+        self.assertEqual([row['id'] for row in self.search(q='29acme')], [self.acme.pk])
+
+    def test_limit(self):
+        self.assertEqual(len(self.search(q='supplier')), 20)
+        self.assertEqual([row['name'] for row in self.search(q='supplier', limit=3)],
+                         ['Supplier 00', 'Supplier 01', 'Supplier 02'])
+        self.assertEqual(len(self.search(q='s', limit=500)), 30)
+        self.assertEqual(len(self.search(q='supplier', limit='many')), 20)
+        self.assertEqual(self.search(q=''), [])
+
+    def test_form_renders_only_the_selected_partner(self):
+        form = TransactionForm()
+        self.assertEqual(list(form.fields['partner'].widget.choices), [('', form.fields['partner'].empty_label)])
+
+        last = self.partners[-1]
+        form = TransactionForm(data={
+            'partner': str(last.pk), 'amount': '10.00', 'transaction_type': 'ADVANCE_RECEIVED',
+            'date': '2025-04-01',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['partner'], last)
+        self.assertEqual([value for value, _ in form.fields['partner'].widget.choices], ['', last.pk])
+
+        form = TransactionForm(data={'partner': '999999', 'amount': '10.00',
+                                     'transaction_type': 'ADVANCE_RECEIVED', 'date': '2025-04-01'})
+        self.assertIn('partner', form.errors)
+
+
+class AsyncViewTests(TestCase):
+    """The async views render under ASGI (AsyncClient) as well as WSGI (Client)."""
+
+    def setUp(self):
+        self.async_client = AsyncClient()
+        partner = make_partner()
+        make_transaction(partner, '1500.00', notes='First, "quoted"')
+        make_transaction(partner, '200.00', 'REFUND_GIVEN')
+        deal = Deal.objects.create(partner=partner, client_name='Client', status='BOOKED')
+        DealItem.objects.create(deal=deal, item_name='Widget', item_price=Decimal('5.00'))
+
+    async def test_pages_render(self):
+        for name in ('dashboard', 'ledger', 'logistics', 'procurement'):
+            response = await self.async_client.get(reverse(name))
+            self.assertEqual(response.status_code, 200, name)
+        response = await self.async_client.get(reverse('partner_search'), {'q': 'acme'})
+        self.assertEqual(len(response.json()['results']), 1)
+
+    async def test_async_export_streams_from_the_async_orm(self):
+        response = await self.async_client.get(reverse('export_ledger_csv'))
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(body.count(b'\r\n'), 3)
+        self.assertIn(b'"First, ""quoted"""', body)
+
+    def test_sync_export_streams_from_a_sync_iterator(self):
+        response = self.client.get(reverse('export_ledger_csv'))
+        self.assertFalse(response.is_async)
+        chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(chunks[0].startswith(b'Date,Partner'))
+
+    async def test_both_branches_send_the_same_csv(self):
+        response = await self.async_client.get(reverse('export_ledger_csv'))
+        async_body = b''.join([chunk async for chunk in response.streaming_content])
+        sync_response = await sync_to_async(self.client.get)(reverse('export_ledger_csv'))
+        sync_body = await sync_to_async(lambda: b''.join(sync_response.streaming_content))()
+        self.assertEqual(async_body, sync_body)
+
+
+class LocalEventBusTests(TestCase):
+
+    async def test_subscriber_receives_published_event(self):
+        bus = events.LocalEventBus()
+        stream = bus.subscribe(timeout=1)
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        bus.publish([3, 4])
+        self.assertEqual(await pending, (1, {3, 4}))
+        await stream.aclose()
+        self.assertFalse(bus._subscribers)
+
+    async def test_timeout_yields_none(self):
+        stream = events.LocalEventBus().subscribe(timeout=0.01)
+        self.assertIsNone(await anext(stream))
+        await stream.aclose()
+
+    def test_subscriber_with_closed_loop_is_dropped(self):
+        bus = events.LocalEventBus()
+        loop = asyncio.new_event_loop()
+        loop.close()
+        bus._subscribers.add((loop, asyncio.Queue()))
+        bus.publish([1])
+        self.assertFalse(bus._subscribers)
+
+
+@override_settings(TRACKER_EVENT_POLL_INTERVAL=0)
+class DatabaseEventBusTests(TestCase):
+
+    def test_subscribe_replays_events_after_last_event_id(self):
+        bus = events.DatabaseEventBus()
+        bus.publish([1])
+        first = PartnerEvent.objects.get().pk
+        bus.publish([2, 3])
+
+        async def receive(**kwargs):
+            stream = bus.subscribe(**kwargs)
+            try:
+                return await anext(stream)
+            finally:
+                await stream.aclose()
+
+        self.assertEqual(async_to_sync(receive)(last_event_id=first), (first + 2, {2, 3}))
+        self.assertEqual(async_to_sync(receive)(last_event_id=0), (first + 2, {1, 2, 3}))
+        # A new subscriber starts from the newest event and waits for the next one
+        self.assertIsNone(async_to_sync(receive)(timeout=0))
+
+    def test_publish_prunes_events_beyond_retention(self):
+        bus = events.DatabaseEventBus()
+        bus.RETENTION, bus.PRUNE_EVERY = 3, 2
+        bus.publish([1])
+        first = PartnerEvent.objects.get().pk
+        bus._pruned_at = first
+        for partner_id in range(2, 7):
+            bus.publish([partner_id])
+        newest = first + 5
+        # Pruned at first + 2 and first + 4; the prune due at first + 6 hasn't happened
+        self.assertEqual(bus._pruned_at, first + 4)
+        self.assertEqual(
+            list(PartnerEvent.objects.values_list('pk', flat=True).order_by('pk')),
+            list(range(first + 2, newest + 1)),
+        )
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Reads go to the replica unless a write, a transaction or the pin cookie needs the primary."""
+
+    databases = {'default', 'replica'}
+
+    def queries(self, callback):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                callback()
+        return len(primary), len(replica)
+
+    def test_reads_writes_and_transactions(self):
+        partner = make_partner()
+        self.assertEqual(self.queries(lambda: Partner.objects.count()), (0, 1))
+
+        def in_transaction():
+            with transaction.atomic():
+                Partner.objects.count()
+        self.assertEqual(self.queries(in_transaction)[1], 0)
+        self.assertEqual(self.queries(lambda: Partner.objects.filter(pk=partner.pk).update(name='Acme'))[1], 0)
+
+    def test_post_pins_the_follow_up_get(self):
+        self.assertEqual(self.queries(lambda: self.client.get(reverse('procurement')))[0], 0)
+
+        response = self.client.post(reverse('add_partner'), {'name': 'Beta', 'gst_number': '27BBBBB0000B1Z5'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertTrue(Partner.objects.filter(name='Beta').exists())
+
+        primary, replica = self.queries(lambda: self.client.get(reverse('procurement')))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+
+@override_settings(TRACKER_INSTRUMENTATION={'SAMPLE_RATE': 1.0, 'N_PLUS_ONE_THRESHOLD': 5})
+class InstrumentationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(8):
+            partner = make_partner(f'Partner {index}', f'27PARTN{index:04d}Z5')
+            make_transaction(partner, '100.00')
+            Deal.objects.create(partner=partner, client_name='Client', status='SOURCING')
+
+    def events(self, logs):
+        return [json.loads(line.split(':', 2)[2])['event'] for line in logs.output]
+
+    def test_per_row_queries_warn_n_plus_one(self):
+        def per_row(request):
+            return HttpResponse(', '.join(
+                Partner.objects.get(pk=pk).name for pk in Partner.objects.values_list('pk', flat=True)
+            ))
+
+        middleware = RequestInstrumentationMiddleware(per_row)
+        with self.assertLogs('tracker.instrumentation', 'INFO') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertEqual(self.events(logs), ['n_plus_one'])
+        record = json.loads(logs.output[0].split(':', 2)[2])
+        self.assertEqual(record['duplicate_queries'][0]['count'], 8)
+
+    def test_list_views_do_not_warn(self):
+        for name in ('dashboard', 'ledger', 'procurement', 'logistics'):
+            with self.assertLogs('tracker.instrumentation', 'INFO') as logs:
+                self.client.get(reverse(name))
+            self.assertEqual(self.events(logs), ['request'], name)
+
+
+class LoadGenerationTests(TestCase):
+
+    def test_generate_is_seeded_and_consistent(self):
+        rows = loadgen.generate(partners=3, transactions=40, deals=12, days=60, seed=7)
+        self.assertEqual((rows['partners'], rows['transactions'], rows['deals']), (3, 40, 12))
+        self.assertEqual(DealItem.objects.count(), rows['deal_items'])
+        amounts = list(Transaction.objects.order_by('pk').values_list('amount', flat=True))
+
+        for partner in Partner.objects.all():
+            expected = sum(
+                (txn.amount if txn.transaction_type == 'ADVANCE_RECEIVED' else -txn.amount
+                 for txn in partner.transactions.all()),
+                Decimal('0.00'),
+            ) - sum((deal.actual_cost for deal in partner.deals.filter(cost_deducted=True)), Decimal('0.00'))
+            self.assertEqual(partner.current_balance, expected)
+        generated = rollup_rows()
+        rollups.rebuild()
+        self.assertEqual(rollup_rows(), generated)
+
+        loadgen.flush()
+        self.assertFalse(Partner.objects.exists() or Partner.history.exists())
+        loadgen.generate(partners=3, transactions=40, deals=12, days=60, seed=7)
+        self.assertEqual(list(Transaction.objects.order_by('pk').values_list('amount', flat=True)), amounts)
+
+
+class BenchmarkViewsCommandTests(TransactionTestCase):
+    """benchmark_views builds its own throwaway database; run it at a tiny size."""
+
+    databases = {'default', 'replica'}
+
+    def test_reports_every_view(self):
+        from tracker.management.commands import benchmark_views
+
+        tiny = {'tiny': {'partners': 2, 'transactions': 20, 'deals': 10}}
+        baseline = {'sizes': {'tiny': {'views': {'ledger': {'p50_ms': 1.0, 'queries': 1}}}}}
+        stdout = StringIO()
+        with tempfile.TemporaryDirectory() as directory, mock.patch.dict(benchmark_views.SIZES, tiny):
+            path, before = os.path.join(directory, 'run.json'), os.path.join(directory, 'before.json')
+            with open(before, 'w') as fh:
+                json.dump(baseline, fh)
+            call_command('benchmark_views', sizes='tiny', iterations=2, json_path=path, compare=before, stdout=stdout)
+            with open(path) as fh:
+                report = json.load(fh)
+
+        result = report['sizes']['tiny']
+        self.assertEqual(result['rows']['partners'], 2)
+        self.assertIn('ledger', result['views'])
+        for name, view in result['views'].items():
+            self.assertEqual(view['status'], 200, name)
+            self.assertGreater(view['queries'], 0, name)
+        self.assertIn('ledger  ', stdout.getvalue().split('Change against')[1])
+
+
+class ProfilingTests(TestCase):
+
+    def test_profiled_request_still_reports_its_queries(self):
+        from types import SimpleNamespace
+        from .profiling import ProfilingMiddleware
+
+        make_transaction(make_partner(), '100.00')
+
+        def view(request):
+            for _ in range(3):
+                list(Transaction.objects.all())
+            return HttpResponse('<html><body></body></html>')
+
+        request = RequestFactory().get('/', {'_profile': 'cprofile'})
+        request.user = SimpleNamespace(is_staff=True)
+        with tempfile.TemporaryDirectory() as directory:
+            settings = {'TRACKER_PROFILE_DIR': directory, 'TRACKER_INSTRUMENTATION': {'SAMPLE_RATE': 1.0}}
+            with override_settings(**settings), self.assertLogs('tracker.instrumentation', 'INFO') as logs:
+                middleware = RequestInstrumentationMiddleware(ProfilingMiddleware(view))
+                response = middleware(request)
+            name = response['X-Tracker-Profile'].rstrip('/').rsplit('/', 1)[1]
+            with open(os.path.join(directory, f'{name}.txt')) as fh:
+                summary = fh.read()
+            self.assertTrue(os.path.exists(os.path.join(directory, f'{name}.prof')))
+
+        self.assertIn('in 3 queries', summary)
+        record = json.loads(logs.output[-1].split(':', 2)[2])
+        self.assertEqual(record['query_count'], 3)
+        self.assertEqual(record['duplicate_queries'][0]['count'], 3)
+        self.assertIn(b'Profile: ', response.content)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        # Start every metric empty, without losing what the rest of the suite recorded
+        for metric in metrics._registry.values():
+            patcher = mock.patch.object(metric, 'values', {})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_text_format(self):
+        metrics.EXPORT_ROWS.inc(5, export='ledger "csv"')
+        metrics.REQUEST_QUERIES.observe(3, view='ledger')
+        metrics.REQUEST_QUERIES.observe(600, view='ledger')
+        with override_settings(TRACKER_METRICS_DIR=None):
+            lines = metrics.render_metrics().splitlines()
+
+        self.assertIn('# TYPE tracker_export_rows_total counter', lines)
+        self.assertIn('tracker_export_rows_total{export="ledger \\"csv\\""} 5', lines)
+        self.assertIn('# HELP tracker_request_queries SQL queries per request by view.', lines)
+        self.assertIn('# TYPE tracker_request_queries histogram', lines)
+        self.assertIn('tracker_request_queries_bucket{view="ledger",le="2"} 0', lines)
+        self.assertIn('tracker_request_queries_bucket{view="ledger",le="5"} 1', lines)
+        self.assertIn('tracker_request_queries_bucket{view="ledger",le="500"} 1', lines)
+        self.assertIn('tracker_request_queries_bucket{view="ledger",le="+Inf"} 2', lines)
+        self.assertIn('tracker_request_queries_sum{view="ledger"} 603.0', lines)
+        self.assertIn('tracker_request_queries_count{view="ledger"} 2', lines)
+
+    def test_token(self):
+        with override_settings(TRACKER_METRICS_TOKEN='s3cret', TRACKER_METRICS_DIR=None):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            wrong = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer nope'})
+            self.assertEqual(wrong.status_code, 403)
+            response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'# TYPE tracker_request_duration_seconds histogram', response.content)
+        with override_settings(TRACKER_METRICS_TOKEN=None, TRACKER_METRICS_DIR=None):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_exited_processes_are_folded_into_the_totals(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name)
+
+        def exited(name, rows):
+            (path / name).write_text(json.dumps({metrics.EXPORT_ROWS.name: [[[['export', 'ledger']], rows]]}))
+
+        def scrape(compact):
+            if compact:
+                metrics._last_compact = float('-inf')
+            text = metrics.render_metrics()
+            return int(text.split('tracker_export_rows_total{export="ledger"} ')[1].split()[0])
+
+        alive = mock.patch.object(metrics, '_pid_alive', lambda pid: pid == os.getpid())
+        with override_settings(TRACKER_METRICS_DIR=directory.name), alive, \
+                mock.patch.object(metrics, '_last_compact', metrics._last_compact):
+            metrics.EXPORT_ROWS.inc(1, export='ledger')
+            exited('999991-1.json', 2)
+            exited('999992-1.json', 3)
+            self.assertEqual(scrape(compact=True), 6)
+            self.assertEqual(
+                sorted(item.name for item in path.iterdir()),
+                sorted(['exited.json', f'{metrics._process_name()}.json']),
+            )
+            self.assertEqual(json.loads((path / 'exited.json').read_text())['folded'], [])
+            # Between compactions the folded totals still count
+            self.assertEqual(scrape(compact=False), 6)
+
+            # A crash after writing exited.json but before deleting what it folded
+            exited('999993-1.json', 4)
+            self.assertEqual(scrape(compact=True), 10)
+            exited('999993-1.json', 4)
+            data = json.loads((path / 'exited.json').read_text())
+            (path / 'exited.json').write_text(json.dumps({**data, 'folded': ['999993-1.json']}))
+            self.assertEqual(scrape(compact=False), 10)
+            self.assertEqual(scrape(compact=True), 10)
+            self.assertFalse((path / '999993-1.json').exists())
+
+
+class ModalAndPagingTests(TestCase):
+
+    def setUp(self):
+        self.partner = make_partner()
+        self.txn = make_transaction(self.partner, '750.00')
+        self.deal = Deal.objects.create(partner=self.partner, client_name='Client', status='IN_WAREHOUSE')
+        DealItem.objects.create(deal=self.deal, item_name='Widget', item_price=Decimal('5.00'))
+
+    def test_transaction_modals(self):
+        expected = {'edit': reverse('edit_transaction', args=[self.txn.pk]), 'delete': 'Delete Transaction'}
+        for action, text in expected.items():
+            response = self.client.get(reverse('transaction_modal', args=[self.txn.pk, action]))
+            self.assertEqual(response.status_code, 200, action)
+            self.assertTemplateUsed(response, views.TRANSACTION_MODALS[action])
+            self.assertContains(response, text)
+            self.assertContains(response, 'Acme Traders')
+        self.assertEqual(self.client.get(reverse('transaction_modal', args=[self.txn.pk, 'ship'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('transaction_modal', args=[self.txn.pk + 1, 'edit'])).status_code, 404)
+
+    def test_deal_modals(self):
+        expected = {
+            'update': reverse('update_deal', args=[self.deal.pk]),
+            'delete': f'{self.deal.reference}</strong>',
+            'ship': reverse('mark_shipped', args=[self.deal.pk]),
+        }
+        for action, text in expected.items():
+            response = self.client.get(reverse('deal_modal', args=[self.deal.pk, action]))
+            self.assertEqual(response.status_code, 200, action)
+            self.assertTemplateUsed(response, views.DEAL_MODALS[action])
+            self.assertContains(response, text)
+        self.assertEqual(self.client.get(reverse('deal_modal', args=[self.deal.pk, 'edit'])).status_code, 404)
+
+    def test_ledger_pages_neither_overlap_nor_skip(self):
+        today = timezone.localdate()
+        for index in range(9):
+            make_transaction(self.partner, '10.00', date=today - timedelta(days=index % 3))
+        # Ties on date and created_at leave only the id to order by
+        moment = timezone.now()
+        Transaction.objects.filter(date=today).update(created_at=moment)
+        expected = list(Transaction.objects.order_by('-date', '-created_at', '-pk').values_list('pk', flat=True))
+
+        seen, url = [], reverse('ledger')
+        with mock.patch.object(views, 'LEDGER_PAGE_SIZE', 4):
+            while url:
+                response = self.client.get(url)
+                page = [txn.pk for txn in response.context['transactions']]
+                self.assertLessEqual(len(page), 4)
+                seen += page
+                url = response.context['older_url']
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 10)
+
+
+class FragmentCacheTests(TestCase):
+    """Cached partner cards and deal rows re-render once what they show changes."""
+
+    def setUp(self):
+        caches['template_fragments'].clear()
+        self.addCleanup(caches['template_fragments'].clear)
+        self.partner = make_partner()
+        self.deal = Deal.objects.create(partner=self.partner, client_name='Client', status='SOURCING')
+        self.item = DealItem.objects.create(deal=self.deal, item_name='Widget', item_price=Decimal('5.00'))
+
+    def page(self, name):
+        return self.client.get(reverse(name)).content.decode()
+
+    def test_partner_card(self):
+        self.assertIn('1 deals', self.page('dashboard'))
+        self.partner.name = 'Acme Renamed'
+        self.partner.save()
+        self.assertIn('Acme Renamed', self.page('dashboard'))
+        make_transaction(self.partner, '1234.00')
+        self.assertIn('1234.00', self.page('dashboard'))
+        Deal.objects.create(partner=self.partner, client_name='Other')
+        self.assertIn('2 deals', self.page('dashboard'))
+
+    def test_procurement_row(self):
+        self.assertIn('@ ₹5.00', self.page('procurement'))
+        self.item.item_price = Decimal('7.50')
+        self.item.save()
+        self.assertIn('@ ₹7.50', self.page('procurement'))
+        DealItem.objects.create(deal=self.deal, item_name='Gadget', item_price=Decimal('1.00'))
+        self.assertIn('Gadget', self.page('procurement'))
+        self.item.delete()
+        self.assertNotIn('Widget', self.page('procurement'))
+        self.deal.client_name = 'New Client'
+        self.deal.save()
+        self.assertIn('New Client', self.page('procurement'))
+        self.partner.name = 'Acme Renamed'
+        self.partner.save()
+        self.assertIn('Acme Renamed', self.page('procurement'))
+
+    def test_logistics_and_delivered_rows(self):
+        self.deal.status = 'IN_WAREHOUSE'
+        self.deal.save()
+        self.assertIn('Not set', self.page('logistics'))
+        self.deal.status, self.deal.tracking_id = 'SHIPPED', 'TRK123'
+        self.deal.save()
+        self.assertIn('<code>TRK123</code>', self.page('logistics'))
+        self.partner.name = 'Acme Renamed'
+        self.partner.save()
+        self.assertIn('Acme Renamed', self.page('logistics'))
+
+        self.deal.status = 'DELIVERED'
+        self.deal.save()
+        self.assertIn('<span class="text-success">\n            ₹0.00', self.page('logistics'))
+        self.item.commission_per_item = Decimal('2.00')
+        self.item.save()
+        self.assertIn('<span class="text-success">\n            ₹2.00', self.page('logistics'))
+
+
+class StaticAssetTests(TestCase):
+    """collectstatic writes hashed, precompressed files that serve_static caches forever."""
+
+    name = 'tracker/vendor/bootstrap/bootstrap.min.css'
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        storages = {
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'tracker.assets.CompressedManifestStaticFilesStorage'},
+        }
+        override = override_settings(DEBUG=False, STATIC_ROOT=self.root, STORAGES=storages)
+        override.enable()
+        self.addCleanup(override.disable)
+        assets._hashed_names.cache_clear()
+        self.addCleanup(assets._hashed_names.cache_clear)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        hashed = staticfiles_storage.stored_name(self.name)
+        self.assertNotEqual(hashed, self.name)
+        original = (self.root / hashed).read_bytes()
+        self.assertEqual(gzip.decompress((self.root / f'{hashed}.gz').read_bytes()), original)
+        self.assertTrue((self.root / f'{self.name}.gz').exists())
+        # Binary fonts are already compressed
+        self.assertFalse(list(self.root.glob('tracker/vendor/inter/*.gz')))
+
+    def test_serve_static_caches_hashed_names_forever(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        hashed = staticfiles_storage.stored_name(self.name)
+        response = self.client.get(f'/static/{hashed}', headers={'Accept-Encoding': 'gzip, br;q=0'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], assets.IMMUTABLE)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(body, (self.root / hashed).read_bytes())
+
+        plain = self.client.get(f'/static/{self.name}')
+        self.assertEqual(plain['Cache-Control'], assets.REVALIDATE)
+        self.assertNotIn('Content-Encoding', plain)
+        b''.join(plain.streaming_content)
+
+        not_modified = self.client.get(f'/static/{hashed}', headers={'If-Modified-Since': response['Last-Modified']})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.client.get(f'/static/{hashed}.gz').status_code, 404)
+        self.assertEqual(self.client.get('/static/../settings.py').status_code, 404)
+
+
+class FragmentResponseTests(TestCase):
+    """Forms posted with X-Tracker-Fragment get the changed row back; plain posts still redirect."""
+
+    fragment = {'X-Tracker-Fragment': '1'}
+
+    def setUp(self):
+        self.partner = make_partner()
+        self.deal = Deal.objects.create(partner=self.partner, client_name='Client', status='IN_WAREHOUSE')
+
+    def post(self, name, data, fragment=True, args=()):
+        return self.client.post(reverse(name, args=args), data, headers=self.fragment if fragment else {})
+
+    def test_quick_advance(self):
+        data = {'partner': self.partner.pk, 'amount': '2500.00', 'date': timezone.localdate().isoformat()}
+        response = self.post('dashboard', data)
+        self.assertTemplateUsed(response, 'tracker/fragments/swap.html')
+        self.assertContains(response, f'id="partner-card-{self.partner.pk}"')
+        self.assertContains(response, '₹2500.00')
+        self.assertContains(response, 'Advance added successfully!')
+
+        response = self.post('dashboard', {**data, 'amount': ''})
+        self.assertTemplateUsed(response, 'tracker/fragments/swap.html')
+        self.assertContains(response, 'Error adding advance.')
+        self.assertNotContains(response, 'partner-card-')
+
+        self.assertRedirects(self.post('dashboard', data, fragment=False), reverse('dashboard'))
+        self.partner.refresh_from_db()
+        self.assertEqual(self.partner.current_balance, Decimal('5000.00'))
+
+    def test_ship_and_deliver(self):
+        response = self.post('mark_shipped', {'tracking_id': ''}, args=[self.deal.pk])
+        self.assertContains(response, 'Tracking ID is required')
+        self.assertNotContains(response, '<tr')
+
+        response = self.post('mark_shipped', {'tracking_id': 'TRK9', 'courier_partner': 'DTDC'}, args=[self.deal.pk])
+        self.assertTemplateUsed(response, 'tracker/fragments/logistics_row.html')
+        self.assertContains(response, f'id="deal-row-{self.deal.pk}"')
+        self.assertContains(response, '<code>TRK9</code>')
+
+        response = self.post('mark_delivered', {}, args=[self.deal.pk])
+        self.assertContains(response, f'data-remove="deal-row-{self.deal.pk}"')
+        self.assertContains(response, 'data-prepend-to="delivered-deals"')
+        self.assertContains(response, f'id="delivered-row-{self.deal.pk}"')
+
+    def test_update_and_move_to_warehouse(self):
+        self.deal.status = 'SOURCING'
+        self.deal.save()
+        data = {'client_name': 'Renamed Client', 'status': 'SOURCING'}
+        response = self.post('update_deal', data, args=[self.deal.pk])
+        self.assertTemplateUsed(response, 'tracker/fragments/procurement_row.html')
+        self.assertContains(response, 'Renamed Client')
+
+        response = self.post('move_to_warehouse', {}, args=[self.deal.pk])
+        self.assertContains(response, 'Vendor invoice is required')
+        self.assertRedirects(
+            self.post('move_to_warehouse', {}, fragment=False, args=[self.deal.pk]), reverse('procurement'),
+        )
+        self.assertRedirects(self.post('update_deal', data, fragment=False, args=[self.deal.pk]), reverse('procurement'))
+
+
+class TrendTests(TestCase):
+
+    def setUp(self):
+        self.partner = make_partner()
+        self.monday = rollups.week_start(timezone.localdate()) - timedelta(weeks=2)
+        make_transaction(self.partner, '100.50', date=self.monday)
+        make_transaction(self.partner, '20.00', date=self.monday + timedelta(days=2))
+        make_transaction(self.partner, '5.25', 'REFUND_GIVEN', date=self.monday + timedelta(days=8))
+
+    def trends(self, **params):
+        return self.client.get(reverse('dashboard_trends'), params)
+
+    def test_weeks_are_summed_and_gaps_zero_filled(self):
+        series = rollups.trend('week', self.monday - timedelta(weeks=1), self.monday + timedelta(weeks=2))
+        self.assertEqual(series['advances'], [Decimal('0.00'), Decimal('120.50'), Decimal('0.00'), Decimal('0.00')])
+        self.assertEqual(series['refunds'], [Decimal('0.00'), Decimal('0.00'), Decimal('5.25'), Decimal('0.00')])
+        self.assertEqual(series['advance_count'], [0, 2, 0, 0])
+        for name in rollups.MONEY_METRICS:
+            self.assertTrue(all(isinstance(value, Decimal) for value in series[name]), name)
+        for name in rollups.COUNT_METRICS:
+            self.assertTrue(all(type(value) is int for value in series[name]), name)
+
+    def test_json_types(self):
+        start = self.monday - timedelta(days=1)
+        response = self.trends(grain='day', start=start, end=self.monday + timedelta(days=1), partner=self.partner.pk)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['periods'][0], start.isoformat())
+        self.assertEqual(data['series']['advances'], ['0.00', '100.50', '0.00'])
+        self.assertEqual(data['series']['advance_count'], [0, 1, 0])
+
+        other = make_partner(name='Beta', gst_number='29BBBBB1111B1Z5')
+        data = self.trends(grain='month', metrics='advances', partner=other.pk).json()
+        self.assertEqual(list(data['series']), ['advances'])
+        self.assertEqual(set(data['series']['advances']), {'0.00'})
+
+    def test_validation(self):
+        today = timezone.localdate()
+        for params in (
+            {'grain': 'year'},
+            {'metrics': 'advances,profit'},
+            {'partner': 'acme'},
+            {'start': 'yesterday'},
+            {'start': '2026-02-30'},
+            {'start': today.isoformat(), 'end': (today - timedelta(days=1)).isoformat()},
+        ):
+            response = self.trends(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+    def test_daily_range_is_capped(self):
+        end = timezone.localdate()
+        longest = end - timedelta(days=views.TREND_MAX_DAYS - 1)
+        response = self.trends(grain='day', start=longest, end=end, metrics='deal_count')
+        self.assertEqual(len(response.json()['periods']), views.TREND_MAX_DAYS)
+        too_long = self.trends(grain='day', start=longest - timedelta(days=1), end=end)
+        self.assertEqual(too_long.status_code, 400)
+        # Coarser grains aren't capped
+        self.assertEqual(self.trends(grain='month', start=longest - timedelta(days=1), end=end).status_code, 200)
+
+
+SHEET_NS = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+def read_sheets(data):
+    """{sheet file: {cell ref: element}} for an .xlsx file's bytes, after checking the zip."""
+    with zipfile.ZipFile(BytesIO(data)) as book:
+        assert book.testzip() is None
+        ElementTree.fromstring(book.read('xl/workbook.xml'))
+        ElementTree.fromstring(book.read('[Content_Types].xml'))
+        return {
+            name: {cell.get('r'): cell for cell in ElementTree.fromstring(book.read(name)).iter(f"{{{SHEET_NS['x']}}}c")}
+            for name in book.namelist() if name.startswith('xl/worksheets/')
+        }
+
+
+def cell_text(cell):
+    value = cell.find('x:v', SHEET_NS)
+    if value is None:
+        value = cell.find('x:is/x:t', SHEET_NS)
+    return value.text
+
+
+class StreamingWorkbookTests(TestCase):
+
+    def test_cell_types_and_styles(self):
+        book = xlsx.StreamingWorkbook()
+        with mock.patch.object(xlsx, 'BUFFER_SIZE', 100):
+            chunks = [book.start_sheet('Ledger & <Co>', [('Amount', 12), ('Day', 12), ('At', 18), ('Text', 20), ('Empty', 8)])]
+            chunks.append(book.write_row([
+                Decimal('1234.50'), date(2026, 1, 2), datetime(2026, 1, 2, 6, 30, tzinfo=dt_timezone.utc),
+                'Fish & <Chips> "x"\x01', None,
+            ]))
+            chunks.append(book.write_row([7, True, datetime(2026, 1, 2, 18, 0), ' padded ', '']))
+            # Random text, so deflate can't hold everything back until the end
+            for index in range(3000):
+                chunks.append(book.write_row([Decimal(index), None, None, f'row {index} {os.urandom(24).hex()}', None]))
+            chunks.append(book.start_sheet('Second', [('Only', 10)]))
+            chunks.append(book.close())
+        # Rows are sent while the sheet is being written, not all at the end
+        self.assertGreater(sum(1 for chunk in chunks[1:-2] if chunk), 1)
+
+        data = b''.join(chunks)
+        sheets = read_sheets(data)
+        self.assertEqual(sorted(sheets), ['xl/worksheets/sheet1.xml', 'xl/worksheets/sheet2.xml'])
+        cells = sheets['xl/worksheets/sheet1.xml']
+
+        self.assertEqual((cells['A1'].get('s'), cells['A1'].get('t'), cell_text(cells['A1'])), ('1', 'inlineStr', 'Amount'))
+        self.assertEqual((cells['A2'].get('s'), cells['A2'].get('t'), cell_text(cells['A2'])), ('2', None, '1234.50'))
+        self.assertEqual((cells['B2'].get('s'), cell_text(cells['B2'])), ('3', '46024'))
+        # 06:30 UTC is noon in Asia/Kolkata
+        self.assertEqual((cells['C2'].get('s'), cell_text(cells['C2'])), ('4', '46024.500000'))
+        self.assertEqual((cells['D2'].get('t'), cell_text(cells['D2'])), ('inlineStr', 'Fish & <Chips> "x"'))
+        self.assertNotIn('E2', cells)
+        self.assertEqual((cells['A3'].get('s'), cell_text(cells['A3'])), (None, '7'))
+        self.assertEqual((cells['B3'].get('t'), cell_text(cells['B3'])), ('b', '1'))
+        self.assertEqual(cell_text(cells['C3']), '46024.750000')
+        self.assertEqual(cell_text(cells['D3']), ' padded ')
+        self.assertEqual(cells['D3'].find('x:is/x:t', SHEET_NS).get('{http://www.w3.org/XML/1998/namespace}space'), 'preserve')
+        self.assertTrue(cell_text(cells['D3003']).startswith('row 2999 '))
+        self.assertEqual(list(sheets['xl/worksheets/sheet2.xml']), ['A1'])
+
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        names = [sheet.get('name') for sheet in workbook.iter(f"{{{SHEET_NS['x']}}}sheet")]
+        self.assertEqual(names, ['Ledger & <Co>', 'Second'])
+
+
+class WorkbookExportViewTests(TestCase):
+    """The XLSX exports stream a valid workbook under WSGI and ASGI alike."""
+
+    def setUp(self):
+        self.async_client = AsyncClient()
+        partner = make_partner()
+        make_transaction(partner, '1500.00', notes='<b>&</b>')
+        make_transaction(partner, '200.00', 'REFUND_GIVEN')
+        deal = Deal.objects.create(partner=partner, client_name='Client', status='BOOKED')
+        DealItem.objects.create(deal=deal, item_name='Widget', item_price=Decimal('5.00'), quantity=3)
+
+    def check_ledger(self, data):
+        cells = read_sheets(data)['xl/worksheets/sheet1.xml']
+        amounts = sorted(cell_text(cell) for ref, cell in cells.items() if cell.get('s') == str(xlsx.STYLE_MONEY))
+        self.assertEqual(amounts, ['-200.00', '1500.00'])
+        self.assertEqual({ref.lstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for ref in cells}, {'1', '2', '3'})
+
+    def test_sync(self):
+        response = self.client.get(reverse('export_ledger_xlsx'))
+        self.assertEqual(response['Content-Type'], xlsx.CONTENT_TYPE)
+        self.assertFalse(response.is_async)
+        self.check_ledger(b''.join(response.streaming_content))
+
+        response = self.client.get(reverse('export_deals_xlsx'))
+        sheets = read_sheets(b''.join(response.streaming_content))
+        self.assertEqual(len(sheets), 2)
+        self.assertIn('Widget', [cell_text(cell) for cell in sheets['xl/worksheets/sheet2.xml'].values()])
+
+    async def test_async(self):
+        response = await self.async_client.get(reverse('export_ledger_xlsx'))
+        self.assertEqual(response['Content-Type'], xlsx.CONTENT_TYPE)
+        self.assertTrue(response.is_async)
+        self.assertTrue(response['Content-Disposition'].endswith('.xlsx"'))
+        self.check_ledger(b''.join([chunk async for chunk in response.streaming_content]))
+
+        response = await self.async_client.get(reverse('export_deals_xlsx'))
+        sheets = read_sheets(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual(len(sheets), 2)
+
+
+@skipUnless(parquet.pa, 'needs pyarrow')
+class ParquetSnapshotTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.partner = make_partner()
+        self.txn = make_transaction(self.partner, '1500.25', date=date(2026, 4, 1))
+        make_transaction(self.partner, '99.99', 'REFUND_GIVEN')
+        deal = Deal.objects.create(partner=self.partner, client_name='Client', actual_cost=Decimal('10.00'))
+        DealItem.objects.create(deal=deal, item_name='Widget', item_price=Decimal('5.00'))
+
+    def snapshot(self, *args):
+        call_command('snapshot_parquet', *args, '--history', '--batch-size', '1', '--output', self.directory,
+                     stdout=StringIO())
+
+    def dataset(self, name):
+        import pyarrow.dataset as ds
+
+        return ds.dataset(self.directory / name, format='parquet')
+
+    def test_full_then_incremental(self):
+        import pyarrow as pa
+
+        self.snapshot()
+        transactions = self.dataset('transaction')
+        schema = transactions.schema
+        self.assertEqual(schema.field('amount').type, pa.decimal128(12, 2))
+        self.assertEqual(schema.field('date').type, pa.date32())
+        self.assertEqual(schema.field('created_at').type, pa.timestamp('us', tz='UTC'))
+        self.assertEqual(schema.field('partner_id').type, pa.int64())
+        rows = {row['id']: row for row in transactions.to_table().to_pylist()}
+        self.assertEqual(rows[self.txn.pk]['amount'], Decimal('1500.25'))
+        self.assertEqual(rows[self.txn.pk]['date'], date(2026, 4, 1))
+        self.assertEqual(rows[self.txn.pk]['created_at'], self.txn.created_at)
+        self.assertEqual(rows[self.txn.pk]['created_at'].utcoffset(), timedelta(0))
+        # One row group per batch of one row
+        fragment = next(transactions.get_fragments())
+        self.assertEqual(fragment.metadata.num_row_groups, 2)
+
+        manifest = parquet.read_manifest(self.directory)
+        history_max = Transaction.history.order_by('-pk').values_list('pk', flat=True).first()
+        self.assertEqual(manifest['tables']['historical_transaction'], {'max_pk': history_max})
+
+        self.txn.amount = Decimal('1600.75')
+        self.txn.save()
+        self.snapshot('--incremental')
+
+        rows = self.dataset('transaction').to_table().to_pylist()
+        self.assertEqual(len(rows), 3)
+        latest = max((row for row in rows if row['id'] == self.txn.pk), key=lambda row: row['updated_at'])
+        self.assertEqual(latest['amount'], Decimal('1600.75'))
+        self.assertEqual(len(list((self.directory / 'transaction').glob('*.parquet'))), 2)
+        # Untouched tables get no new part file
+        self.assertEqual(len(list((self.directory / 'deal').glob('*.parquet'))), 1)
+
+        history = self.dataset('historical_transaction').to_table().to_pylist()
+        self.assertEqual([row['history_id'] for row in history].count(history_max), 1)
+        self.assertEqual(max(row['history_id'] for row in history), history_max + 1)
+        self.assertEqual(history[-1]['amount'], Decimal('1600.75'))
+        manifest = parquet.read_manifest(self.directory)
+        self.assertEqual(manifest['tables']['historical_transaction'], {'max_pk': history_max + 1})
+        self.assertEqual([run['mode'] for run in manifest['runs']], ['full', 'incremental'])
 
-# Create your tests here.
@@ -1,23 +1,31 @@
 from django.urls import path
-from . import views
+from . import views, api, ingest, metrics, profiling
 
 urlpatterns = [
     # Dashboard
     path('', views.dashboard, name='dashboard'),
+    path('events/', views.dashboard_events, name='dashboard_events'),
     path('add-partner/', views.add_partner, name='add_partner'),
     path('partner/<int:partner_id>/edit/', views.edit_partner, name='edit_partner'),
     path('partner/<int:partner_id>/delete/', views.delete_partner, name='delete_partner'),
+    path('partner/search/', views.partner_search, name='partner_search'),
+    path('trends/', views.dashboard_trends, name='dashboard_trends'),
     
     # Ledger
     path('ledger/', views.ledger, name='ledger'),
     path('transaction/<int:transaction_id>/edit/', views.edit_transaction, name='edit_transaction'),
     path('transaction/<int:transaction_id>/delete/', views.delete_transaction, name='delete_transaction'),
+    path('transaction/<int:transaction_id>/modal/<str:action>/', views.transaction_modal, name='transaction_modal'),
     path('ledger/export/', views.export_ledger_csv, name='export_ledger_csv'),
+    path('ledger/export/xlsx/', views.export_ledger_xlsx, name='export_ledger_xlsx'),
+    path('ledger/aging/', views.aging_report, name='aging_report'),
     
     # Procurement
     path('procurement/', views.procurement, name='procurement'),
+    path('deals/export/xlsx/', views.export_deals_xlsx, name='export_deals_xlsx'),
     path('deal/<int:deal_id>/update/', views.update_deal, name='update_deal'),
     path('deal/<int:deal_id>/delete/', views.delete_deal, name='delete_deal'),
+    path('deal/<int:deal_id>/modal/<str:action>/', views.deal_modal, name='deal_modal'),
     path('deal/<int:deal_id>/to-warehouse/', views.move_to_warehouse, name='move_to_warehouse'),
     
     # Logistics
@@ -25,4 +33,24 @@ urlpatterns = [
     path('deal/<int:deal_id>/mark-shipped/', views.mark_shipped, name='mark_shipped'),
     path('deal/<int:deal_id>/mark-delivered/', views.mark_delivered, name='mark_delivered'),
     path('deal/<int:deal_id>/commission-invoice/', views.generate_commission_invoice, name='commission_invoice'),
+    
+    # JSON API
+    path('api/partners/', api.partner_list, name='api_partner_list'),
+    path('api/transactions/', api.transaction_list, name='api_transaction_list'),
+    path('api/deals/', api.deal_list, name='api_deal_list'),
+    path('api/archived/transactions/', api.archived_transaction_list, name='api_archived_transaction_list'),
+    path('api/archived/deals/', api.archived_deal_list, name='api_archived_deal_list'),
+    path('api/ingest/', ingest.bulk_ingest, name='api_bulk_ingest'),
+    
+    # Background exports
+    path('exports/', views.export_jobs, name='export_jobs'),
+    path('exports/<int:job_id>/status/', views.export_job_status, name='export_job_status'),
+    path('exports/<int:job_id>/download/', views.export_job_download, name='export_job_download'),
+    
+    # Prometheus scrape endpoint
+    path('metrics', metrics.metrics_view, name='metrics'),
+    
+    # Request profiles (staff only)
+    path('profiles/', profiling.profile_list, name='profile_list'),
+    path('profiles/<str:name>/', profiling.profile_detail, name='profile_detail'),
 ]
@@ -1,36 +1,94 @@
+import json
+from datetime import date, datetime, timedelta
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import Count, Max, Q, Sum
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
 from decimal import Decimal
-from .models import Partner, Transaction, Deal, DealItem
+from .models import (
+    Partner, Transaction, Deal, DealItem, ArchivedTransaction, FiscalYearClose, AgingSnapshot, ExportJob,
+    normalize_partner_name,
+)
+from .api import APIError, decode_cursor, encode_cursor
+from .filters import apply_ledger_filters
+from .archive import aclosed_through, reaches_archive, partner_has_archive
+from .events import get_event_bus
+from .conditional import conditional_page
+from .aging import AgingReport, compute_aging
+from . import exports, metrics, rollups, xlsx
 from .forms import (
     PartnerForm, TransactionForm, DealForm, 
     QuickAdvanceForm, DealStatusUpdateForm, DealItemFormSet
 )
 
 
-def dashboard(request):
+def _wants_fragment(request):
+    """Forms posted by tracker.js ask for the changed card/row instead of a redirect."""
+    return request.method == 'POST' and request.headers.get('X-Tracker-Fragment') == '1'
+
+
+def _fragment(request, row_template=None, remove=(), prepend_to=None, **context):
+    """Messages plus the changed card or row, for the page to swap in place."""
+    return render(request, 'tracker/fragments/swap.html', {
+        'row_template': row_template, 'remove': remove, 'prepend_to': prepend_to, **context,
+    })
+
+
+def _row_deals():
+    """Deals with what the row templates read, including their fragment cache keys."""
+    return Deal.objects.select_related('partner').prefetch_related('items').annotate(
+        items_changed=Max('items__updated_at'), item_count=Count('items')
+    )
+
+
+@conditional_page((Partner, 'updated_at'), (Deal, 'updated_at'), (Transaction, 'updated_at'))
+async def dashboard(request):
     """
     Dashboard view showing partner cards with balances and quick advance form.
     """
-    partners = Partner.objects.all()
-    
-    # Calculate totals
-    total_balance = partners.aggregate(total=Sum('current_balance'))['total'] or Decimal('0.00')
-    active_deals_count = Deal.objects.exclude(status__in=['DELIVERED', 'RETURNED']).count()
-    
     if request.method == 'POST':
-        form = QuickAdvanceForm(request.POST, request.FILES)
-        if form.is_valid():
-            form.save()
+        form = await sync_to_async(QuickAdvanceForm)(request.POST, request.FILES)
+        if await sync_to_async(form.is_valid)():
+            advance = await sync_to_async(form.save)()
             messages.success(request, 'Advance added successfully!')
+            if _wants_fragment(request):
+                partner = await Partner.objects.aget(pk=advance.partner_id)
+                partner.deal_count = await Deal.objects.filter(partner=partner).acount()
+                return _fragment(request, 'tracker/fragments/partner_card.html', partner=partner)
             return redirect('dashboard')
         else:
             messages.error(request, 'Error adding advance. Please check the form.')
+            if _wants_fragment(request):
+                return _fragment(request)
     else:
         form = QuickAdvanceForm()
     
+    partners = [partner async for partner in Partner.objects.all()]
+    
+    # Per-partner counts in two grouped queries instead of one query per card
+    deal_counts = {
+        row['partner_id']: row['count']
+        async for row in Deal.objects.order_by().values('partner_id').annotate(count=Count('id'))
+    }
+    transaction_counts = {
+        row['partner_id']: row['count']
+        async for row in Transaction.objects.order_by().values('partner_id').annotate(count=Count('id'))
+    }
+    for partner in partners:
+        partner.deal_count = deal_counts.get(partner.id, 0)
+        partner.transaction_count = transaction_counts.get(partner.id, 0)
+    
+    # Calculate totals
+    totals = await Partner.objects.aaggregate(total=Sum('current_balance'))
+    total_balance = totals['total'] or Decimal('0.00')
+    active_deals_count = await Deal.objects.exclude(status__in=['DELIVERED', 'RETURNED']).acount()
+    
     context = {
         'partners': partners,
         'form': form,
@@ -40,6 +98,58 @@ def dashboard(request):
     return render(request, 'tracker/dashboard.html', context)
 
 
+async def _partner_snapshot(partner_ids):
+    """Current balance and deal count for the given partners, plus dashboard totals."""
+    balances = {
+        row['id']: row['current_balance']
+        async for row in Partner.objects.filter(pk__in=partner_ids).values('id', 'current_balance')
+    }
+    deal_counts = {
+        row['partner_id']: row['count']
+        async for row in Deal.objects.filter(partner_id__in=balances).order_by()
+        .values('partner_id').annotate(count=Count('id'))
+    }
+    totals = await Partner.objects.aaggregate(total=Sum('current_balance'), count=Count('id'))
+    return {
+        'partners': [
+            {'id': pk, 'balance': str(balance), 'deal_count': deal_counts.get(pk, 0)}
+            for pk, balance in balances.items()
+        ],
+        'removed': sorted(set(partner_ids) - set(balances)),
+        'total_balance': str(totals['total'] or Decimal('0.00')),
+        'partner_count': totals['count'],
+        'active_deals_count': await Deal.objects.exclude(status__in=['DELIVERED', 'RETURNED']).acount(),
+    }
+
+
+async def dashboard_events(request):
+    """
+    Server-Sent Events stream of partner balance and deal count changes.
+    Requires the ASGI server; under WSGI the client is told to stop reconnecting.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    last_event_id = request.headers.get('Last-Event-ID')
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    
+    async def stream():
+        yield 'retry: 5000\n\n'
+        async for event in get_event_bus().subscribe(last_event_id, timeout=15):
+            if event is None:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            event_id, partner_ids = event
+            payload = json.dumps(await _partner_snapshot(partner_ids))
+            yield f'id: {event_id}\nevent: balances\ndata: {payload}\n\n'
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def add_partner(request):
     """View for adding a new partner."""
     if request.method == 'POST':
@@ -92,7 +202,7 @@ def delete_partner(request, partner_id):
         has_transactions = partner.transactions.exists()
         has_deals = partner.deals.exists()
         
-        if has_transactions or has_deals:
+        if has_transactions or has_deals or partner_has_archive(partner):
             messages.error(
                 request, 
                 f'Cannot delete "{partner.name}" because they have existing transactions or deals. '
@@ -107,58 +217,87 @@ def delete_partner(request, partner_id):
     return redirect('dashboard')
 
 
-def ledger(request):
+async def partner_search(request):
     """
-    Ledger view showing all transactions with filtering by partner and date.
+    Typeahead endpoint returning partners whose name or GST number starts with `q`.
+    Uses range lookups on indexed columns so the prefix match can use the index.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 50))
+    except ValueError:
+        limit = 20
+    
+    results = {}
+    if query:
+        name_prefix = normalize_partner_name(query)
+        gst_prefix = query.upper()
+        lookups = [
+            ('search_name', {'search_name__gte': name_prefix, 'search_name__lt': name_prefix + '\uffff'}),
+            ('gst_number', {'gst_number__gte': gst_prefix, 'gst_number__lt': gst_prefix + '\uffff'}),
+        ]
+        for order_field, lookup in lookups:
+            matches = Partner.objects.filter(**lookup).order_by(order_field).values('id', 'name', 'gst_number')
+            async for partner in matches[:limit]:
+                partner['label'] = f"{partner['name']} ({partner['gst_number']})"
+                results.setdefault(partner['id'], partner)
+    
+    results = sorted(results.values(), key=lambda partner: partner['name'].casefold())[:limit]
+    return JsonResponse({'results': results})
+
+
+LEDGER_PAGE_SIZE = 200
+
+
+def _ledger_position(request):
+    """The (date, created_at, id) after which the requested ledger page starts, if any."""
+    cursor = request.GET.get('before')
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor, types=(date.fromisoformat, datetime.fromisoformat, int))
+    except APIError:
+        return None  # a mangled link shows the newest page
+
+
+def _ledger_page(queryset, position):
+    """Keyset page of the ledger, newest first; one row more than a page to tell if there is another."""
+    if position is not None:
+        day, created_at, pk = position
+        queryset = queryset.filter(
+            Q(date__lt=day) | Q(date=day, created_at__lt=created_at) | Q(date=day, created_at=created_at, pk__lt=pk)
+        )
+    return queryset.order_by('-date', '-created_at', '-pk')[:LEDGER_PAGE_SIZE + 1]
+
+
+def _ledger_link(request, cursor=None):
+    query = request.GET.copy()
+    query.pop('before', None)
+    if cursor:
+        query['before'] = cursor
+    return f"{reverse('ledger')}?{query.urlencode()}"
+
+
+@conditional_page((Transaction, 'updated_at'), (Partner, 'updated_at'), (FiscalYearClose, 'closed_at'))
+async def ledger(request):
+    """
+    Ledger view showing transactions with filtering by partner and date, LEDGER_PAGE_SIZE
+    at a time. "Older" links carry the position of the page's last row (keyset paging),
+    so deep pages cost the same as the first.
     """
-    from datetime import datetime, timedelta
-    from django.utils import timezone
-    
     transactions = Transaction.objects.select_related('partner').all()
-    partners = Partner.objects.all()
+    transactions, date_filter, start_date, end_date = apply_ledger_filters(request.GET, transactions)
     
-    # Filter by partner if specified
     partner_id = request.GET.get('partner')
-    if partner_id:
-        transactions = transactions.filter(partner_id=partner_id)
-    
-    # Date filtering
-    date_filter = request.GET.get('date_filter', '')
-    start_date = request.GET.get('start_date', '')
-    end_date = request.GET.get('end_date', '')
-    
-    today = timezone.now().date()
-    
-    if date_filter == 'this_month':
-        first_day = today.replace(day=1)
-        transactions = transactions.filter(date__gte=first_day, date__lte=today)
-        start_date = first_day.strftime('%Y-%m-%d')
-        end_date = today.strftime('%Y-%m-%d')
-    elif date_filter == 'last_month':
-        first_day_this_month = today.replace(day=1)
-        last_day_last_month = first_day_this_month - timedelta(days=1)
-        first_day_last_month = last_day_last_month.replace(day=1)
-        transactions = transactions.filter(date__gte=first_day_last_month, date__lte=last_day_last_month)
-        start_date = first_day_last_month.strftime('%Y-%m-%d')
-        end_date = last_day_last_month.strftime('%Y-%m-%d')
-    elif date_filter == 'last_3_months':
-        three_months_ago = today - timedelta(days=90)
-        transactions = transactions.filter(date__gte=three_months_ago, date__lte=today)
-        start_date = three_months_ago.strftime('%Y-%m-%d')
-        end_date = today.strftime('%Y-%m-%d')
-    elif date_filter == 'custom' and start_date and end_date:
-        try:
-            start = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end = datetime.strptime(end_date, '%Y-%m-%d').date()
-            transactions = transactions.filter(date__gte=start, date__lte=end)
-        except ValueError:
-            pass
+    selected_partner_obj = None
+    if partner_id and partner_id.isdigit():
+        selected_partner_obj = await Partner.objects.filter(pk=partner_id).afirst()
     
     # Add new transaction
     if request.method == 'POST':
-        form = TransactionForm(request.POST, request.FILES)
-        if form.is_valid():
-            form.save()
+        form = await sync_to_async(TransactionForm)(request.POST, request.FILES)
+        if await sync_to_async(form.is_valid)():
+            await sync_to_async(form.save)()
             messages.success(request, 'Transaction recorded successfully!')
             return redirect('ledger')
         else:
@@ -166,11 +305,28 @@ def ledger(request):
     else:
         form = TransactionForm()
     
+    position = _ledger_position(request)
+    transactions = [txn async for txn in _ledger_page(transactions, position)]
+    if reaches_archive(request.GET, await aclosed_through()):
+        archived, *_ = apply_ledger_filters(request.GET, ArchivedTransaction.objects.select_related('partner'))
+        transactions = sorted(
+            transactions + [txn async for txn in _ledger_page(archived, position)],
+            key=lambda txn: (txn.date, txn.created_at, txn.pk),
+            reverse=True,
+        )
+    older_url = None
+    if len(transactions) > LEDGER_PAGE_SIZE:
+        transactions = transactions[:LEDGER_PAGE_SIZE]
+        last = transactions[-1]
+        older_url = _ledger_link(request, encode_cursor(last.date, last.created_at, last.pk))
+    
     context = {
         'transactions': transactions,
-        'partners': partners,
+        'older_url': older_url,
+        'newest_url': _ledger_link(request) if position else None,
         'form': form,
         'selected_partner': partner_id,
+        'selected_partner_obj': selected_partner_obj,
         'date_filter': date_filter,
         'start_date': start_date,
         'end_date': end_date,
@@ -178,75 +334,159 @@ def ledger(request):
     return render(request, 'tracker/ledger.html', context)
 
 
-def export_ledger_csv(request):
-    """Export ledger transactions to CSV with applied filters."""
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output."""
+    
+    def write(self, value):
+        return value
+
+
+def _export_stream(request, steps, export):
+    """
+    Iterate an export's chunks without holding the file in memory. `steps` are
+    callables returning a chunk and (queryset, row -> chunk) pairs. Under ASGI the
+    rows come from the async ORM; under WSGI the iterator must be synchronous, since
+    Django would otherwise read an async one to the end before sending anything.
+    """
+    if isinstance(request, ASGIRequest):
+        async def stream():
+            count = 0
+            try:
+                for step in steps:
+                    if callable(step):
+                        yield step()
+                        continue
+                    async for row in step[0].aiterator(chunk_size=exports.CHUNK_SIZE):
+                        count += 1
+                        chunk = step[1](row)
+                        if chunk:
+                            yield chunk
+            finally:
+                metrics.EXPORT_ROWS.inc(count, export=export)
+    else:
+        def stream():
+            count = 0
+            try:
+                for step in steps:
+                    if callable(step):
+                        yield step()
+                        continue
+                    for row in step[0].iterator(chunk_size=exports.CHUNK_SIZE):
+                        count += 1
+                        chunk = step[1](row)
+                        if chunk:
+                            yield chunk
+            finally:
+                metrics.EXPORT_ROWS.inc(count, export=export)
+    return stream()
+
+
+async def export_ledger_csv(request):
+    """Export ledger transactions to CSV with applied filters, streamed in chunks."""
     import csv
-    from datetime import datetime, timedelta
-    from django.utils import timezone
-    from django.http import HttpResponse
     
-    transactions = Transaction.objects.select_related('partner').all()
+    filename = exports.export_filename('ledger', request.GET)
+    rows = exports.ledger_rows(request.GET, await aclosed_through())
+    writer = csv.writer(Echo())
+    steps = [
+        lambda: writer.writerow(exports.LEDGER_CSV_HEADER),
+        (rows, lambda row: writer.writerow(exports.ledger_csv_row(row))),
+    ]
     
-    # Apply same filters as ledger view
-    partner_id = request.GET.get('partner')
-    if partner_id:
-        transactions = transactions.filter(partner_id=partner_id)
-    
-    date_filter = request.GET.get('date_filter', '')
-    start_date = request.GET.get('start_date', '')
-    end_date = request.GET.get('end_date', '')
-    
-    today = timezone.now().date()
-    
-    if date_filter == 'this_month':
-        first_day = today.replace(day=1)
-        transactions = transactions.filter(date__gte=first_day, date__lte=today)
-        start_date = first_day.strftime('%Y-%m-%d')
-        end_date = today.strftime('%Y-%m-%d')
-    elif date_filter == 'last_month':
-        first_day_this_month = today.replace(day=1)
-        last_day_last_month = first_day_this_month - timedelta(days=1)
-        first_day_last_month = last_day_last_month.replace(day=1)
-        transactions = transactions.filter(date__gte=first_day_last_month, date__lte=last_day_last_month)
-        start_date = first_day_last_month.strftime('%Y-%m-%d')
-        end_date = last_day_last_month.strftime('%Y-%m-%d')
-    elif date_filter == 'last_3_months':
-        three_months_ago = today - timedelta(days=90)
-        transactions = transactions.filter(date__gte=three_months_ago, date__lte=today)
-        start_date = three_months_ago.strftime('%Y-%m-%d')
-        end_date = today.strftime('%Y-%m-%d')
-    elif date_filter == 'custom' and start_date and end_date:
-        try:
-            start = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end = datetime.strptime(end_date, '%Y-%m-%d').date()
-            transactions = transactions.filter(date__gte=start, date__lte=end)
-        except ValueError:
-            pass
-    
-    # Create CSV response
-    filename = f"ledger_export_{today.strftime('%Y%m%d')}"
-    if start_date and end_date:
-        filename = f"ledger_{start_date}_to_{end_date}"
-    
-    response = HttpResponse(content_type='text/csv')
+    response = StreamingHttpResponse(_export_stream(request, steps, 'ledger_csv'), content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Partner', 'GST Number', 'Transaction Type', 'Amount', 'Notes'])
-    
-    for txn in transactions:
-        writer.writerow([
-            txn.date.strftime('%Y-%m-%d'),
-            txn.partner.name,
-            txn.partner.gst_number,
-            txn.get_transaction_type_display(),
-            f"{'+' if txn.transaction_type == 'ADVANCE_RECEIVED' else '-'}{txn.amount}",
-            txn.notes or '',
-        ])
-    
     return response
 
 
+def _xlsx_response(stream, filename):
+    response = StreamingHttpResponse(stream, content_type=xlsx.CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
+    return response
+
+
+async def export_ledger_xlsx(request):
+    """Export the filtered ledger as an Excel workbook, written and streamed row by row."""
+    rows = exports.ledger_rows(request.GET, await aclosed_through())
+    book = xlsx.StreamingWorkbook()
+    steps = [
+        lambda: book.start_sheet('Ledger', exports.LEDGER_SHEET),
+        (rows, lambda row: book.write_row(exports.ledger_cells(row))),
+        book.close,
+    ]
+    return _xlsx_response(_export_stream(request, steps, 'ledger_xlsx'), exports.export_filename('ledger', request.GET))
+
+
+async def export_deals_xlsx(request):
+    """
+    Export deals and their items as an Excel workbook with a Deals and an Items sheet,
+    filtered by ?partner, the ledger date filter (on creation date) and ?status.
+    """
+    sources = exports.deal_sources(request.GET, await aclosed_through())
+    book = xlsx.StreamingWorkbook()
+    steps = [
+        lambda: book.start_sheet('Deals', exports.DEAL_SHEET),
+        *[(deals, lambda row: book.write_row(exports.deal_cells(row))) for deals, _ in sources],
+        lambda: book.start_sheet('Items', exports.ITEM_SHEET),
+        *[(items, lambda row: book.write_row(exports.item_cells(row))) for _, items in sources],
+        book.close,
+    ]
+    return _xlsx_response(_export_stream(request, steps, 'deals_xlsx'), exports.export_filename('deals', request.GET))
+
+
+def export_jobs(request):
+    """
+    Background exports: POST queues one (or reuses an identical fresh one) and returns
+    at once; the page lists recent jobs with their progress and download links.
+    """
+    if request.method == 'POST':
+        data = request.POST.copy()
+        kind = data.pop('kind', [''])[-1]
+        try:
+            job, reused = exports.submit(kind, data)
+        except ValueError as exc:
+            messages.error(request, str(exc))
+        else:
+            if reused and job.status == 'DONE':
+                messages.success(request, f'{job.get_kind_display()} export is ready (no changes since it was made).')
+            elif reused:
+                messages.info(request, f'{job.get_kind_display()} export is already in progress.')
+            else:
+                messages.success(request, f'{job.get_kind_display()} export queued. It will appear below when ready.')
+        return redirect('export_jobs')
+    
+    today = timezone.localdate()
+    context = {
+        'jobs': ExportJob.objects.all()[:50],
+        'last_month': (today.replace(day=1) - timedelta(days=1)).strftime('%Y-%m'),
+        'pdf_available': exports.statements.A4 is not None,
+    }
+    return render(request, 'tracker/exports.html', context)
+
+
+@require_GET
+def export_job_status(request, job_id):
+    """Progress of one export job, polled by the exports page."""
+    job = get_object_or_404(ExportJob, pk=job_id)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'status_label': job.get_status_display(),
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'error': job.error,
+        'download_url': reverse('export_job_download', args=[job.pk]) if job.status == 'DONE' else None,
+    })
+
+
+@require_GET
+def export_job_download(request, job_id):
+    job = get_object_or_404(ExportJob, pk=job_id, status='DONE')
+    if not job.result or not job.result.storage.exists(job.result.name):
+        raise Http404('Export file no longer available.')
+    return FileResponse(job.result.open('rb'), as_attachment=True, filename=job.filename)
+
+
 def edit_transaction(request, transaction_id):
     """View for editing an existing transaction."""
     transaction = get_object_or_404(Transaction, id=transaction_id)
@@ -280,6 +520,7 @@ def edit_transaction(request, transaction_id):
             partner.current_balance -= new_amount
         
         partner.save()
+        metrics.BALANCE_UPDATES.inc_on_commit(source='transaction_edit')
         
         # Update the transaction
         transaction.amount = new_amount
@@ -310,6 +551,7 @@ def delete_transaction(request, transaction_id):
             partner.current_balance += transaction.amount
         
         partner.save()
+        metrics.BALANCE_UPDATES.inc_on_commit(source='transaction_delete')
         
         item_description = f"{transaction.get_transaction_type_display()} - ₹{transaction.amount}"
         transaction.delete()
@@ -318,15 +560,25 @@ def delete_transaction(request, transaction_id):
     return redirect('ledger')
 
 
+TRANSACTION_MODALS = {
+    'edit': 'tracker/fragments/transaction_edit.html',
+    'delete': 'tracker/fragments/transaction_delete.html',
+}
+
+
+def transaction_modal(request, transaction_id, action):
+    """HTML fragment for the ledger's shared modal: the edit form or the delete confirmation."""
+    if action not in TRANSACTION_MODALS:
+        raise Http404
+    transaction = get_object_or_404(Transaction.objects.select_related('partner'), id=transaction_id)
+    return render(request, TRANSACTION_MODALS[action], {'txn': transaction})
+
+
 def procurement(request):
     """
     Procurement view showing active deals (SOURCING and BOOKED status).
     """
-    active_deals = Deal.objects.filter(
-        status__in=['SOURCING', 'BOOKED']
-    ).select_related('partner').prefetch_related('items')
-    
-    partners = Partner.objects.all()
+    active_deals = _row_deals().filter(status__in=['SOURCING', 'BOOKED'])
     
     if request.method == 'POST':
         form = DealForm(request.POST, request.FILES)
@@ -358,7 +610,6 @@ def procurement(request):
     
     context = {
         'deals': active_deals,
-        'partners': partners,
         'form': form,
         'formset': formset,
     }
@@ -376,17 +627,26 @@ def update_deal(request, deal_id):
             new_status = form.cleaned_data.get('status')
             if new_status == 'BOOKED' and not deal.vendor_invoice and not form.cleaned_data.get('vendor_invoice'):
                 messages.error(request, 'Vendor invoice is required to mark deal as Booked.')
+                if _wants_fragment(request):
+                    return _fragment(request)
                 return redirect(request.META.get('HTTP_REFERER', 'procurement'))
             
             form.save()
             messages.success(request, f'Deal "{deal.item_name}" updated successfully!')
             
+            if _wants_fragment(request):
+                if deal.status in ['SOURCING', 'BOOKED']:
+                    return _fragment(request, 'tracker/fragments/procurement_row.html',
+                                     deal=_row_deals().get(pk=deal.pk))
+                return _fragment(request, remove=[f'deal-row-{deal.pk}'])
             # Redirect based on current page
             if deal.status in ['IN_WAREHOUSE', 'SHIPPED', 'DELIVERED']:
                 return redirect('logistics')
             return redirect('procurement')
         else:
             messages.error(request, 'Error updating deal.')
+            if _wants_fragment(request):
+                return _fragment(request)
     
     return redirect(request.META.get('HTTP_REFERER', 'procurement'))
 
@@ -405,7 +665,23 @@ def delete_deal(request, deal_id):
     return redirect('procurement')
 
 
-def logistics(request):
+DEAL_MODALS = {
+    'update': 'tracker/fragments/deal_update.html',
+    'delete': 'tracker/fragments/deal_delete.html',
+    'ship': 'tracker/fragments/deal_ship.html',
+}
+
+
+def deal_modal(request, deal_id, action):
+    """HTML fragment for the procurement/logistics shared modal."""
+    if action not in DEAL_MODALS:
+        raise Http404
+    deal = get_object_or_404(Deal.objects.select_related('partner').prefetch_related('items'), id=deal_id)
+    return render(request, DEAL_MODALS[action], {'deal': deal})
+
+
+@conditional_page((Deal, 'updated_at'), (DealItem, 'updated_at'), (Partner, 'updated_at'))
+async def logistics(request):
     """
     Logistics view showing deals in warehouse or shipped status.
     """
@@ -413,13 +689,11 @@ def logistics(request):
         status__in=['IN_WAREHOUSE', 'SHIPPED']
     ).select_related('partner')
     
-    delivered_deals = Deal.objects.filter(
-        status='DELIVERED'
-    ).select_related('partner').order_by('-updated_at')[:10]
+    delivered_deals = _row_deals().filter(status='DELIVERED').order_by('-updated_at')[:10]
     
     context = {
-        'deals': logistics_deals,
-        'delivered_deals': delivered_deals,
+        'deals': [deal async for deal in logistics_deals],
+        'delivered_deals': [deal async for deal in delivered_deals],
     }
     return render(request, 'tracker/logistics.html', context)
 
@@ -432,6 +706,9 @@ def mark_delivered(request, deal_id):
         deal.status = 'DELIVERED'
         deal.save()
         messages.success(request, f'Deal "{deal.item_name}" marked as delivered!')
+        if _wants_fragment(request):
+            return _fragment(request, 'tracker/fragments/delivered_row.html', remove=[f'deal-row-{deal.pk}'],
+                             prepend_to='delivered-deals', deal=_row_deals().get(pk=deal.pk))
     
     return redirect('logistics')
 
@@ -454,11 +731,15 @@ def move_to_warehouse(request, deal_id):
     if request.method == 'POST':
         if not deal.vendor_invoice:
             messages.error(request, 'Vendor invoice is required before moving to warehouse.')
+            if _wants_fragment(request):
+                return _fragment(request)
             return redirect('procurement')
         
         deal.status = 'IN_WAREHOUSE'
         deal.save()
         messages.success(request, f'Deal "{deal.item_name}" moved to warehouse!')
+        if _wants_fragment(request):
+            return _fragment(request, remove=[f'deal-row-{deal.pk}'])
     
     return redirect('logistics')
 
@@ -473,6 +754,8 @@ def mark_shipped(request, deal_id):
         
         if not tracking_id:
             messages.error(request, 'Tracking ID is required to mark as shipped.')
+            if _wants_fragment(request):
+                return _fragment(request)
             return redirect('logistics')
         
         deal.tracking_id = tracking_id
@@ -480,5 +763,90 @@ def mark_shipped(request, deal_id):
         deal.status = 'SHIPPED'
         deal.save()
         messages.success(request, f'Deal "{deal.item_name}" marked as shipped!')
+        if _wants_fragment(request):
+            return _fragment(request, 'tracker/fragments/logistics_row.html',
+                             deal=Deal.objects.select_related('partner').get(pk=deal.pk))
     
     return redirect('logistics')
+
+
+# Three years of days
+TREND_MAX_DAYS = 1100
+
+
+@require_GET
+def dashboard_trends(request):
+    """
+    Chart data: advances, refunds, deal spend and commission per day, week or month,
+    for all partners or ?partner=<id>. Reads only the rollup tables.
+    """
+    grain = request.GET.get('grain', 'month')
+    if grain not in rollups.GRAINS:
+        return JsonResponse({'error': f"grain must be one of: {', '.join(rollups.GRAINS)}."}, status=400)
+    metric_names = [name for name in request.GET.get('metrics', '').split(',') if name] or list(rollups.METRICS)
+    unknown = set(metric_names) - set(rollups.METRICS)
+    if unknown:
+        return JsonResponse({'error': f"Unknown metrics: {', '.join(sorted(unknown))}."}, status=400)
+    partner_id = request.GET.get('partner')
+    if partner_id is not None and not partner_id.isdigit():
+        return JsonResponse({'error': 'partner must be a partner id.'}, status=400)
+    
+    start, end = rollups.default_range(grain)
+    try:
+        # parse_date answers None for text that isn't a date at all
+        start = parse_date(request.GET['start']) if request.GET.get('start') else start
+        end = parse_date(request.GET['end']) if request.GET.get('end') else end
+    except ValueError:
+        start = None
+    if start is None or end is None or start > end:
+        return JsonResponse({'error': 'start and end must be YYYY-MM-DD dates, start first.'}, status=400)
+    if grain == 'day' and (end - start).days >= TREND_MAX_DAYS:
+        return JsonResponse({'error': f'Daily charts cover at most {TREND_MAX_DAYS} days.'}, status=400)
+    
+    series = rollups.trend(grain, start, end, partner_id=int(partner_id) if partner_id else None, metrics=metric_names)
+    return JsonResponse({
+        'grain': grain,
+        'start': start,
+        'end': end,
+        'partner': int(partner_id) if partner_id else None,
+        'periods': series.pop('periods'),
+        'series': series,
+    })
+
+
+def aging_report(request):
+    """
+    Unused advances per partner by age. Shows the nightly snapshot for ?as_of (default:
+    the latest one); walks the ledger live with ?live=1 or when no snapshot exists.
+    """
+    today = timezone.localdate()
+    try:
+        as_of = parse_date(request.GET.get('as_of') or '')
+    except ValueError:
+        as_of = None
+    if as_of and as_of > today:
+        as_of = today
+    snapshots = AgingSnapshot.objects.all()
+    snapshot = None
+    if not request.GET.get('live'):
+        snapshot = (snapshots.filter(as_of=as_of) if as_of else snapshots).first()
+    report = AgingReport.from_snapshot(snapshot) if snapshot else compute_aging(as_of or today)
+    
+    context = {
+        'report': report,
+        'is_live': snapshot is None,
+        'today': today,
+        'snapshot_dates': snapshots.values_list('as_of', flat=True)[:7],
+    }
+    return render(request, 'tracker/aging.html', context)
+
+
+def serve_media(request, path, document_root=None):
+    """Serve an uploaded file (development only) and count the bytes sent."""
+    from django.views.static import serve
+    
+    response = serve(request, path, document_root=document_root)
+    if response.status_code == 200 and response.has_header('Content-Length'):
+        folder = path.split('/', 1)[0] if '/' in path else ''
+        metrics.MEDIA_BYTES.inc(int(response['Content-Length']), folder=folder)
+    return response
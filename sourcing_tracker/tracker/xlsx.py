@@ -0,0 +1,244 @@
+"""
+Write-only XLSX writer that streams the workbook while rows are added.
+
+The .xlsx zip is written to an in-memory sink that the caller drains after each
+call, so a response can send the file as it is produced and memory stays flat
+however many rows there are. zipfile writes entries with data descriptors when the
+output cannot seek, which every spreadsheet application reads.
+
+Cells are typed from the Python value: Decimal amounts become numeric cells with a
+#,##0.00 format, dates and datetimes become real Excel dates, other numbers stay
+numbers and everything else is an inline string (no shared-string table to hold).
+
+    book = StreamingWorkbook()
+    yield book.start_sheet('Ledger', [('Date', 12), ('Amount', 14)])
+    for row in rows:
+        yield book.write_row(row)
+    yield book.close()
+"""
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Flush row XML into the zip stream in pieces of about this size
+BUFFER_SIZE = 64 * 1024
+
+EXCEL_EPOCH = date(1899, 12, 30)
+
+# cellXfs indexes in STYLES_XML
+STYLE_HEADER = 1
+STYLE_MONEY = 2
+STYLE_DATE = 3
+STYLE_DATETIME = 4
+
+# Characters XML 1.0 does not allow, even escaped
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2">'
+    '<numFmt numFmtId="164" formatCode="dd\\-mmm\\-yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="dd\\-mmm\\-yyyy\\ hh:mm"/>'
+    '</numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def column_letter(index):
+    """0 -> A, 25 -> Z, 26 -> AA."""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _text(value):
+    return escape(_ILLEGAL_XML.sub('', str(value)))
+
+
+def _cell(ref, value):
+    if value is None or value == '':
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, Decimal):
+        return f'<c r="{ref}" s="{STYLE_MONEY}"><v>{value}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        delta = value.replace(tzinfo=None) - datetime(1899, 12, 30)
+        serial = delta.days + delta.seconds / 86400
+        return f'<c r="{ref}" s="{STYLE_DATETIME}"><v>{serial:.6f}</v></c>'
+    if isinstance(value, date):
+        return f'<c r="{ref}" s="{STYLE_DATE}"><v>{(value - EXCEL_EPOCH).days}</v></c>'
+    text = _text(value)
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<c r="{ref}" t="inlineStr"><is><t{space}>{text}</t></is></c>'
+
+
+class _Sink:
+    """Unseekable file object collecting what zipfile writes until the caller drains it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class StreamingWorkbook:
+    """A workbook written sheet by sheet; every method returns the bytes ready to send."""
+
+    def __init__(self, compresslevel=6):
+        self.sink = _Sink()
+        self.zip = zipfile.ZipFile(self.sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel)
+        self.sheets = []
+        self.sheet = None
+        self.buffer = []
+        self.buffered = 0
+        self.row_count = 0
+        self.letters = []
+
+    def start_sheet(self, title, columns):
+        """Begin a sheet with a bold, frozen header row; `columns` is a list of (header, width)."""
+        data = self.end_sheet() if self.sheet else b''
+        self.sheets.append(title[:31])
+        self.sheet = self.zip.open(f'xl/worksheets/sheet{len(self.sheets)}.xml', 'w')
+        self.row_count = 0
+        self.letters = [column_letter(index) for index in range(len(columns))]
+        widths = ''.join(
+            f'<col min="{index}" max="{index}" width="{width}" customWidth="1"/>'
+            for index, (_, width) in enumerate(columns, start=1)
+        )
+        self._write(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            '<sheetViews><sheetView workbookViewId="0">'
+            '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+            '</sheetView></sheetViews>'
+            f'<cols>{widths}</cols><sheetData>'
+        )
+        # write_row hands back what it flushed, including this sheet's zip entry header
+        data += self.write_row([header for header, _ in columns], style=STYLE_HEADER)
+        return data + self._flush()
+
+    def write_row(self, values, style=None):
+        self.row_count += 1
+        row = self.row_count
+        if style is None:
+            cells = ''.join(_cell(f'{letter}{row}', value) for letter, value in zip(self.letters, values))
+        else:
+            cells = ''.join(
+                f'<c r="{letter}{row}" s="{style}" t="inlineStr"><is><t>{_text(value)}</t></is></c>'
+                for letter, value in zip(self.letters, values)
+            )
+        self._write(f'<row r="{row}">{cells}</row>')
+        return self._flush() if self.buffered >= BUFFER_SIZE else b''
+
+    def end_sheet(self):
+        last = f'{self.letters[-1]}{self.row_count}'
+        self._write(f'</sheetData><autoFilter ref="A1:{last}"/></worksheet>')
+        data = self._flush()
+        self.sheet.close()
+        self.sheet = None
+        return data + self.sink.drain()
+
+    def close(self):
+        """Finish the last sheet and write the workbook parts and zip directory."""
+        data = self.end_sheet() if self.sheet else b''
+        sheets = ''.join(
+            f'<sheet name="{_text(title)}" sheetId="{index}" r:id="rId{index}"/>'
+            for index, title in enumerate(self.sheets, start=1)
+        )
+        sheet_rels = ''.join(
+            f'<Relationship Id="rId{index}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{index}.xml"/>'
+            for index in range(1, len(self.sheets) + 1)
+        )
+        sheet_types = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for index in range(1, len(self.sheets) + 1)
+        )
+        header = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        self.zip.writestr('xl/workbook.xml', (
+            f'{header}<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{sheets}</sheets></workbook>'
+        ))
+        self.zip.writestr('xl/_rels/workbook.xml.rels', (
+            f'{header}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{sheet_rels}<Relationship Id="rId{len(self.sheets) + 1}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/></Relationships>'
+        ))
+        self.zip.writestr('xl/styles.xml', STYLES_XML)
+        self.zip.writestr('_rels/.rels', (
+            f'{header}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ))
+        self.zip.writestr('[Content_Types].xml', (
+            f'{header}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{sheet_types}</Types>'
+        ))
+        self.zip.close()
+        return data + self.sink.drain()
+
+    def _write(self, text):
+        self.buffer.append(text)
+        self.buffered += len(text)
+
+    def _flush(self):
+        if self.buffer:
+            self.sheet.write(''.join(self.buffer).encode())
+            self.buffer.clear()
+            self.buffered = 0
+        return self.sink.drain()